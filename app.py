@@ -1,14 +1,27 @@
 # app.py
 import re
 import time
-import random
 import os
-from dataclasses import dataclass, asdict
-from typing import Any, Dict, List, Optional
-
-
-from flask import Flask, request, jsonify
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
+import atexit
+import json
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+
+from flask import Flask, Response, request, jsonify
+from playwright.sync_api import TimeoutError as PWTimeoutError
+
+import metrics
+from browser_pool import BrowserPool, context_cache, pool_from_env
+from review_capture import capture_for
+from review_extract import APP_CARDS_SEL
+from rate_limit import HostRateLimiter
+from resource_block import policy_from_env
+from scrape_core import VerificationRequired, looks_like_verification, new_context, parse_page
+from scrape_jobs import Job, JobManager, QueueFull
+from timing import timings
+from waits import first_card_key_js, wait_cards_changed, wait_dom_quiet
 
 import sys, logging
 logging.basicConfig(
@@ -21,134 +34,119 @@ logging.basicConfig(
 
 app = Flask(__name__)
 
-# ---------- Small helpers ----------
-
-def _rand_sleep(a=0.6, b=1.1):
-    time.sleep(random.uniform(a, b))
-
-@dataclass
-class Review:
-    title: Optional[str]
-    text: Optional[str]
-    rating: Optional[float]
-    travel_date: Optional[str]
-    written_date: Optional[str]
-    language: Optional[str]
-    author: Optional[str]
-    location: Optional[str]
-    contribution_count: Optional[int]
-    helpful_votes: Optional[int]
-    url: Optional[str]
-
-    def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
-
-# Parse "... bubbles" into float rating
-_bubble_re = re.compile(r"(\d+(?:\.\d+)?)\s*bubbles", re.I)
-
-def extract_rating(label: Optional[str]) -> Optional[float]:
-    if not label:
-        return None
-    m = _bubble_re.search(label)
-    if m:
-        try:
-            return float(m.group(1))
-        except Exception:
-            return None
-    # Fallback: "5 of 5 bubbles"
-    if "of 5" in label:
-        try:
-            return float(label.split("of 5")[0].strip())
-        except Exception:
-            return None
-    return None
+# ---------- Browser pool ----------
+# 常駐 browser，/scrape 不再每次冷啟動 Chromium（TA_POOL_SIZE / TA_POOL_MAX_USES）
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+# 擋圖片/字型/追蹤（TA_BLOCK_* 可調），計數跨 request 累計
+_block_policy = policy_from_env()
+
+# 禮貌間隔：同 host 兩次導航 / 翻頁至少隔 TA_HOST_INTERVAL 秒（所有 pool worker 共用）
+# TA_PARSE_MODE=net：評論優先從網路回應 / 內嵌 state 取（見 review_capture），預設解析 DOM
+_PARSE_MODE = os.environ.get("TA_PARSE_MODE", "eval")
+
+_host_limiter = HostRateLimiter(float(os.environ.get("TA_HOST_INTERVAL", "1.0")), jitter=0.5)
+
+# 點 Next 後等第一張卡換掉的上限（毫秒）；最後一頁 Next 沒反應時不必等滿整個 page timeout
+_PAGINATION_TIMEOUT_MS = int(os.environ.get("TA_PAGINATION_TIMEOUT_MS", "8000"))
+
+# ---------- Metrics ----------
+# GET /metrics（Prometheus text format）；寫入只是加幾個數字，不影響爬取
+_m_requests = metrics.counter("ta_scrape_requests_total", "Scrape requests received, by endpoint.", ["endpoint"])
+_m_scrapes = metrics.counter(
+    "ta_scrapes_total", "Finished scrapes by outcome (ok, empty, captcha, timeout, error, cancelled).", ["outcome"])
+_m_reviews = metrics.counter("ta_reviews_extracted_total", "Reviews extracted across all scrapes.")
+_m_pages = metrics.histogram("ta_pages_per_scrape", "Review pages parsed per scrape.",
+                             buckets=(1, 2, 3, 5, 10, 20, 50, 100, 300))
+_m_page_seconds = metrics.histogram("ta_page_seconds", "Per-page latency (parse + move to the next page).",
+                                    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60))
+_m_scrape_seconds = metrics.histogram("ta_scrape_seconds", "Wall time per scrape.",
+                                      buckets=(1, 2, 5, 10, 20, 30, 60, 120, 300, 600))
+_m_verification = metrics.counter("ta_verification_pages_total", "Verification / CAPTCHA pages detected.")
+_m_timeouts = metrics.counter("ta_playwright_timeouts_total",
+                              "Scrapes that ended in a Playwright timeout (HTTP 504 on /scrape).")
+metrics.counter_func("ta_browser_launches_total", "Chromium launches by the browser pool, including recycles.",
+                     lambda: _pool.stats()["launches"] if _pool else 0)
+metrics.gauge_func("ta_pool_busy_workers", "Browser pool workers currently running a scrape.",
+                   lambda: _pool.stats()["busy"] if _pool else 0)
+metrics.gauge_func("ta_pool_queued_tasks", "Scrapes waiting for a free browser pool worker.",
+                   lambda: _pool.stats()["queued"] if _pool else 0)
+metrics.gauge_func("ta_jobs_in_flight", "Async jobs queued or running.", lambda: _jobs.in_flight())
+
+def get_browser_pool() -> BrowserPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pool_from_env()
+            atexit.register(_pool.shutdown)
+        return _pool
 
-def pick_longest_text(loc) -> Optional[str]:
-    """
-    從 locator 裡挑最長的可見文本，排除版權聲明等無效內容。
-    """
-    try:
-        n = loc.count()
-    except Exception:
-        return None
-    texts: List[str] = []
-    for j in range(min(n, 16)):
-        try:
-            t = loc.nth(j).inner_text().strip()
-            if not t:
-                continue
-            if "This review is the subjective opinion" in t:
-                continue
-            texts.append(t)
-        except Exception:
-            pass
-    return max(texts, key=len) if texts else None
+# ---------- Small helpers ----------
 
 def _human_scroll(page, steps=10):
+    # 不等 networkidle（TA 的追蹤請求會讓它一直等不到）；lazyload 的 DOM 一停就繼續
     for _ in range(steps):
         page.evaluate("window.scrollBy(0, Math.floor(window.innerHeight*0.6));")
-        page.wait_for_load_state("networkidle")
-        _rand_sleep(0.25, 0.55)
+        wait_dom_quiet(page, quiet_ms=150, timeout_ms=800)
 
 
 def _looks_like_verification(page) -> bool:
-    txt = (page.inner_text("body") or "").lower()
-    if "verification required" in txt or "slide right to complete the puzzle" in txt:
+    if looks_like_verification(page):
+        _m_verification.inc()
         return True
-    # puzzle widgets sometimes expose role/button with speaker or camera icons
-    try:
-        if page.locator("text=/Verification Required/i").count(): return True
-        if page.locator("iframe[src*='arkoselabs'], div[aria-label*='captcha']").count(): return True
-    except Exception:
-        pass
     return False
 
+
 # ---------- Core scraping ----------
-def scrape_tripadvisor_reviews(
-    url: str,
-    max_pages: int = 50,
-    page_timeout_ms: int = 15000,
-    storage_state: Optional[str] = None,
-) -> List[Dict[str, Any]]:
+def _new_scrape_context(browser, storage_state: Optional[str]):
+    """建立 /scrape 用的 context：UA / 語系 / 資源封鎖 / 反自動化指紋（見 scrape_core.new_context）。"""
+    if storage_state and os.path.exists(storage_state):
+        logging.info(f"Loading storage state from: {storage_state}")
+    return new_context(browser, storage_state, block=_block_policy)
 
-    reviews: List[Dict[str, Any]] = []
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True, args=[
-            "--no-sandbox",
-            "--disable-setuid-sandbox",
-            "--disable-dev-shm-usage",
-            "--disable-blink-features=AutomationControlled",
-        ])
-
-        context_kwargs = dict(
-            user_agent=("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                        "AppleWebKit/537.36 (KHTML, like Gecko) "
-                        "Chrome/124.0.0.0 Safari/537.36"),
-            locale="en-US",
-            viewport={"width": 1366, "height": 900},
-            extra_http_headers={"Accept-Language": "en-US,en;q=0.9"},
-        )
-        if storage_state and os.path.exists(storage_state):
-            logging.info(f"Loading storage state from: {storage_state}")
-            context_kwargs["storage_state"] = storage_state
+def _scrape_in_browser(
+    browser,
+    url: str,
+    max_pages: int,
+    page_timeout_ms: int,
+    storage_state: Optional[str],
+    on_page: Optional[Callable[[int, List[Dict[str, Any]]], None]] = None,
+    collect: bool = True,
+) -> List[Dict[str, Any]]:
+    """在 pool 提供的 browser 上爬一次，browser 保留。
 
-        context = browser.new_context(**context_kwargs)
+    worker 有 ContextCache 時，同一個 storage_state 重用同一個 context + page，
+    session 由快取合併寫回；失敗（驗證頁等）就丟掉該 context。沒有快取則 context 用完即關。
 
-        # mask common automation fingerprints
-        context.add_init_script("""
-            Object.defineProperty(navigator, 'webdriver', { get: () => undefined });
-            window.chrome = { runtime: {} };
-            Object.defineProperty(navigator, 'plugins', { get: () => [1,2,3,4,5] });
-            Object.defineProperty(navigator, 'languages', { get: () => ['en-US','en'] });
-        """)
+    on_page(page_index, page_reviews) 每解析完一頁呼叫一次（job 進度 / 串流用）。
+    collect=False 時不在記憶體累積結果（串流模式），回傳空 list。
+    """
 
+    reviews: List[Dict[str, Any]] = []
+    state_path = storage_state or "/data/shared/ta_state.json"
+    t0 = time.monotonic()
+    outcome = "error"
+    n_pages = n_reviews = 0
+
+    cache = context_cache()
+    if cache is not None:
+        context = None
+        page = cache.acquire(storage_state, lambda: _new_scrape_context(browser, storage_state),
+                             flush_path=state_path)
+    else:
+        context = _new_scrape_context(browser, storage_state)
         page = context.new_page()
+    try:
         page.set_default_timeout(page_timeout_ms)
+        if _PARSE_MODE == "net":
+            capture_for(page)      # 導航前掛上 response listener，GraphQL 回應才收得到
 
         # --- navigate ---
-        page.goto(url, wait_until="domcontentloaded")
-        _rand_sleep()
+        with timings.span("goto", url=url):
+            _host_limiter.wait_sync(url)
+            page.goto(url, wait_until="domcontentloaded")
 
         # quick CAPTCHA gate check
         if _looks_like_verification(page):
@@ -158,38 +156,40 @@ def scrape_tripadvisor_reviews(
                     f.write(page.content())
             except Exception:
                 pass
-            raise RuntimeError("Tripadvisor verification page encountered (CAPTCHA).")
+            raise VerificationRequired("Tripadvisor verification page encountered (CAPTCHA).")
 
         # Cookie/consent
-        try:
-            consent = page.get_by_role("button", name=re.compile(r"(Accept|Agree|I agree|OK)", re.I))
-            if consent.count() > 0 and consent.first.is_visible():
-                consent.first.click()
-                logging.info("Accepted cookie.")
-                _rand_sleep()
-        except Exception:
-            logging.info("No cookie banner or click failed; continue.")
+        with timings.span("consent", url=url):
+            try:
+                consent = page.get_by_role("button", name=re.compile(r"(Accept|Agree|I agree|OK)", re.I))
+                if consent.count() > 0 and consent.first.is_visible():
+                    consent.first.click()
+                    logging.info("Accepted cookie.")
+                    wait_dom_quiet(page)
+            except Exception:
+                logging.info("No cookie banner or click failed; continue.")
 
         # ensure we're on the reviews list view
-        try:
-            # try several stable entry points
-            candidates = [
-                "a[data-automation='seeAllReviews']",
-                "[data-test-target='reviews-tab']",
-                "a[href*='#REVIEWS']",
-                "a[href*='-Reviews-']",
-                "a[aria-controls*='REVIEWS']",
-            ]
-            for sel in candidates:
-                loc = page.locator(sel)
-                if loc.count() and loc.first.is_visible():
-                    logging.info(f"Clicking reviews entry: {sel}")
-                    loc.first.click()
-                    page.wait_for_load_state("domcontentloaded")
-                    _rand_sleep()
-                    break
-        except Exception:
-            pass
+        with timings.span("ensure_on_reviews", url=url):
+            try:
+                # try several stable entry points
+                candidates = [
+                    "a[data-automation='seeAllReviews']",
+                    "[data-test-target='reviews-tab']",
+                    "a[href*='#REVIEWS']",
+                    "a[href*='-Reviews-']",
+                    "a[aria-controls*='REVIEWS']",
+                ]
+                for sel in candidates:
+                    loc = page.locator(sel)
+                    if loc.count() and loc.first.is_visible():
+                        logging.info(f"Clicking reviews entry: {sel}")
+                        loc.first.click()
+                        page.wait_for_load_state("domcontentloaded")
+                        wait_dom_quiet(page)
+                        break
+            except Exception:
+                pass
 
         # If redirected to verification after clicking
         if _looks_like_verification(page):
@@ -198,14 +198,14 @@ def scrape_tripadvisor_reviews(
                     f.write(page.content())
             except Exception:
                 pass
-            raise RuntimeError("Tripadvisor verification page encountered (CAPTCHA).")
+            raise VerificationRequired("Tripadvisor verification page encountered (CAPTCHA).")
 
         # Turn off auto-translate if present
         try:
             show_original = page.get_by_role("button", name=re.compile(r"(Show original reviews|Show original)", re.I))
             if show_original.count() > 0 and show_original.first.is_visible():
                 show_original.first.click()
-                _rand_sleep()
+                wait_dom_quiet(page)
         except Exception:
             pass
 
@@ -218,12 +218,13 @@ def scrape_tripadvisor_reviews(
 
         # wait for review cards (trigger lazyload via human scroll)
         review_sel = "div[data-test-target='review-card'], [data-automation='reviewCard']"
-        found = False
-        for _ in range(12):
-            if page.locator(review_sel).count() > 0:
-                found = True
-                break
-            _human_scroll(page, steps=2)
+        with timings.span("scroll", url=url):
+            found = False
+            for _ in range(12):
+                if page.locator(review_sel).count() > 0:
+                    found = True
+                    break
+                _human_scroll(page, steps=2)
         if not found:
             try:
                 page.wait_for_selector(review_sel, timeout=8000)
@@ -231,6 +232,7 @@ def scrape_tripadvisor_reviews(
             except PWTimeoutError:
                 logging.info("reviewCard not found, dumping HTML for debug")
                 dump_html("no_reviews")
+                outcome = "empty"
                 return []
 
         logging.info(f"Found {page.locator(review_sel).count()} review cards initially")
@@ -241,153 +243,20 @@ def scrape_tripadvisor_reviews(
 
         while page_index <= max_pages:
             visited_page_urls.add(page.url)
-
-            # Expand "Read more"
-            try:
-                expanders = page.locator("text=/^(Read more|More|Show more|更多|もっと読む)$/i")
-                cnt = expanders.count()
-                for i in range(min(cnt, 20)):
-                    try:
-                        expanders.nth(i).click(timeout=1000)
-                        _rand_sleep(0.2, 0.5)
-                    except Exception:
-                        pass
-            except Exception:
-                pass
-
-            # parse cards
-            card_selectors = [
-                "[data-automation='reviewCard']",
-                "div[data-test-target='review-card']",
-                "div[data-test-target='HR_CC_CARD']",
-            ]
-            cards = page.locator(", ".join(card_selectors))
-            count = cards.count()
-
-            for i in range(count):
-                card = cards.nth(i)
-
-                # title
-                title = None
-                for sel in [
-                    "[data-automation='reviewTitle']",
-                    "a[data-test-target='review-title']",
-                    "span[data-test-target='review-title']",
-                    "h3, h4",
-                ]:
-                    loc = card.locator(sel)
-                    if loc.count():
-                        try:
-                            title = (loc.first.inner_text() or "").strip()
-                            if title:
-                                break
-                        except Exception:
-                            pass
-
-                # text
-                text = None
-                loc = card.locator("[data-automation='reviewText']")
-                if loc.count():
-                    text = pick_longest_text(loc)
-                if not text:
-                    loc = card.locator(":scope span[lang]")
-                    text = pick_longest_text(loc)
-                if not text:
-                    loc = card.locator(":scope p, :scope q, :scope div")
-                    text = pick_longest_text(loc)
-
-                # rating
-                rating = None
-                try:
-                    rate_el = card.locator("[aria-label*='bubbles']").first
-                    if rate_el.count() == 0:
-                        rate_el = card.locator("svg[aria-label*='bubbles'], span[aria-label*='bubbles']").first
-                    if rate_el and rate_el.count():
-                        label = rate_el.get_attribute("aria-label") or ""
-                        rating = extract_rating(label)
-                except Exception:
-                    pass
-
-                # dates
-                written_date = None
-                travel_date = None
-                try:
-                    wd = card.locator("span:has-text('Written')")
-                    if wd.count():
-                        written_date = (wd.first.inner_text() or "").strip()
-                except Exception:
-                    pass
-                try:
-                    exp = card.locator(":scope :text('Date of experience')")
-                    if exp.count():
-                        travel_date = (exp.first.inner_text() or "").strip()
-                    else:
-                        blob = card.inner_text()
-                        m = re.search(r"(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4}", blob, re.I)
-                        if m: travel_date = m.group(0)
-                except Exception:
-                    pass
-
-                # language
-                language = None
-                try:
-                    lang_spans = card.locator("span[lang]")
-                    if lang_spans.count():
-                        language = lang_spans.first.get_attribute("lang")
-                except Exception:
-                    pass
-
-                # author/location
-                author = None
-                location_txt = None
-                try:
-                    name_loc = card.locator("[data-automation='memberName']")
-                    if name_loc.count():
-                        author = (name_loc.first.inner_text() or "").strip() or None
-                    else:
-                        links = card.get_by_role("link")
-                        if links.count():
-                            author = (links.first.inner_text() or "").strip() or None
-                except Exception:
-                    pass
-                try:
-                    loc_loc = card.locator("[data-automation='reviewerLocation'], span[data-test-target='reviewer-location']")
-                    if loc_loc.count():
-                        location_txt = (loc_loc.first.inner_text() or "").strip()
-                except Exception:
-                    pass
-
-                # contribution/helpful
-                contribution_count = None
-                helpful_votes = None
-                try:
-                    contrib = card.locator(":scope span:has-text('contribution')")
-                    if contrib.count():
-                        m = re.search(r"(\d+)", contrib.first.inner_text() or "")
-                        if m: contribution_count = int(m.group(1))
-                except Exception:
-                    pass
-                try:
-                    helpful = card.locator(":scope span:has-text('helpful')")
-                    if helpful.count():
-                        m = re.search(r"(\d+)", helpful.first.inner_text() or "")
-                        if m: helpful_votes = int(m.group(1))
-                except Exception:
-                    pass
-
-                reviews.append({
-                    "title": title,
-                    "text": text,
-                    "rating": rating,
-                    "travel_date": travel_date,
-                    "written_date": written_date,
-                    "language": language,
-                    "author": author,
-                    "location": location_txt,
-                    "contribution_count": contribution_count,
-                    "helpful_votes": helpful_votes,
-                    "url": page.url,
-                })
+            t_page = time.monotonic()
+
+            # TA_PARSE_MODE=net：先用 GraphQL 回應 / 內嵌 state 的評論，對不上卡片才解析 DOM；
+            # eval 整頁一次抓回，失敗才退回逐卡 locator（見 scrape_core.parse_page）
+            with timings.span("parse", url=url, page=page_index):
+                batch = parse_page(page, page.url, mode=_PARSE_MODE, profile="app", cards_sel=APP_CARDS_SEL,
+                                   log=logging.info, url=url, page=page_index)
+            n_pages = page_index
+            n_reviews += len(batch)
+            if collect:
+                reviews.extend(batch)
+            with timings.span("write", url=url, page=page_index):
+                if on_page:
+                    on_page(page_index, batch)
 
             # go next page
             next_clicked = False
@@ -399,49 +268,197 @@ def scrape_tripadvisor_reviews(
                 "li[title='Next Page'] a",
                 "a[data-page-number][aria-label*='Next']",
             ]
-            for sel in next_selectors:
-                try:
-                    loc = page.locator(sel)
-                    if loc.count() and loc.first.is_visible():
-                        el = loc.first
-                        if el.is_enabled():
-                            el.click()
-                            _rand_sleep(1.0, 2.0)
-                            page.wait_for_load_state("domcontentloaded")
-                            if _looks_like_verification(page):
-                                raise RuntimeError("CAPTCHA encountered on pagination.")
-                            # loop guard
-                            if page.url in visited_page_urls:
-                                next_clicked = False
-                            else:
-                                next_clicked = True
-                                break
-                except Exception as e:
-                    logging.info(f"Next-page click via {sel} failed: {e}")
-                    pass
+            with timings.span("pagination", url=url, page=page_index + 1):
+                for sel in next_selectors:
+                    try:
+                        loc = page.locator(sel)
+                        if loc.count() and loc.first.is_visible():
+                            el = loc.first
+                            if el.is_enabled():
+                                before_key = first_card_key_js(page)
+                                _host_limiter.wait_sync(page.url)
+                                el.click()
+                                # 等第一張卡換掉（局部更新）或新頁載入，不固定睡
+                                wait_cards_changed(page, before_key, timeout_ms=min(page_timeout_ms, _PAGINATION_TIMEOUT_MS))
+                                page.wait_for_load_state("domcontentloaded")
+                                if _looks_like_verification(page):
+                                    raise VerificationRequired("CAPTCHA encountered on pagination.")
+                                # loop guard
+                                if page.url in visited_page_urls:
+                                    next_clicked = False
+                                else:
+                                    next_clicked = True
+                                    break
+                    except VerificationRequired:
+                        raise           # 不能當成這個 selector 失敗吞掉：context 要丟掉、outcome 要算 captcha
+                    except Exception as e:
+                        logging.info(f"Next-page click via {sel} failed: {e}")
+                        pass
+            _m_page_seconds.observe(time.monotonic() - t_page)
 
             if not next_clicked:
                 break
 
             page_index += 1
 
-        # persist session to re-use (reduces CAPTCHA later)
-        try:
-            context.storage_state(path=storage_state or "/data/shared/ta_state.json")
-        except Exception:
-            pass
-
-        context.close()
-        browser.close()
+        outcome = "ok"
+        # persist session to re-use (reduces CAPTCHA later)；有快取時由 ContextCache 定期寫回
+        if context is not None:
+            try:
+                context.storage_state(path=state_path)
+            except Exception:
+                pass
+    except BaseException as e:
+        outcome = "cancelled" if isinstance(e, _StreamCancelled) else _classify_error(e)
+        raise
+    finally:
+        if cache is None:
+            context.close()
+        elif outcome in ("ok", "empty"):
+            cache.release(storage_state, dirty=True)
+        else:
+            cache.discard(storage_state)
+        _m_scrapes.inc(outcome=outcome)
+        if outcome == "timeout":
+            _m_timeouts.inc()
+        _m_reviews.inc(n_reviews)
+        _m_pages.observe(n_pages)
+        _m_scrape_seconds.observe(time.monotonic() - t0)
 
     return reviews
 
 
+def scrape_tripadvisor_reviews(
+    url: str,
+    max_pages: int = 50,
+    page_timeout_ms: int = 15000,
+    storage_state: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    return get_browser_pool().run(
+        _scrape_in_browser, url, max_pages, page_timeout_ms, storage_state
+    )
+
+
+# ---------- Async jobs ----------
+# job 直接排進 browser pool，同時在跑的數量 = pool 大小；TA_JOB_MAX_PENDING 限制排隊上限
+
+def _classify_error(e: BaseException) -> str:
+    if isinstance(e, PWTimeoutError):
+        return "timeout"
+    if isinstance(e, VerificationRequired):
+        return "captcha"
+    return "error"
+
+def _run_job(browser, job: Job) -> List[Dict[str, Any]]:
+    job.mark_running()
+    # 結果只存在 job 裡（add_page 逐頁累積）；collect=False 避免 _scrape_in_browser 再留一份到 TTL 清掉
+    _scrape_in_browser(
+        browser, job.url, job.params["max_pages"], job.params["timeout_ms"],
+        job.params["storage_state"], on_page=job.add_page, collect=False,
+    )
+    return job.reviews
+
+_jobs = JobManager(
+    start=lambda job: get_browser_pool().submit(_run_job, job),
+    classify=_classify_error,
+    max_pending=int(os.environ.get("TA_JOB_MAX_PENDING", "100")),
+    ttl=float(os.environ.get("TA_JOB_TTL_S", "3600")),
+)
+
+
+# ---------- NDJSON streaming ----------
+
+class _StreamCancelled(Exception):
+    """client 斷線，停止爬取。"""
+
+def _stream_scrape(url: str, params: Dict[str, Any], per_page: bool) -> Response:
+    """
+    邊爬邊吐 NDJSON：每行一筆 review（per_page=True 時每行一頁），最後一行是
+    {"done": true, ...} 或 {"error": ...}。佇列有上限，client 讀得慢時爬蟲會等，
+    記憶體只保留幾頁。
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=int(os.environ.get("TA_STREAM_BUFFER_PAGES", "4")))
+    cancelled = threading.Event()
+
+    def on_page(page_index: int, batch: List[Dict[str, Any]]):
+        while True:
+            if cancelled.is_set():
+                raise _StreamCancelled()
+            try:
+                q.put((page_index, batch), timeout=1.0)
+                return
+            except queue.Full:
+                continue
+
+    fut = get_browser_pool().submit(
+        _scrape_in_browser, url, params["max_pages"], params["timeout_ms"], params["storage_state"],
+        on_page=on_page, collect=False,
+    )
+
+    def generate():
+        count = 0
+        pages = 0
+        try:
+            while True:
+                try:
+                    page_index, batch = q.get(timeout=0.5)
+                except queue.Empty:
+                    # on_page 在 worker 裡同步呼叫，future 完成時所有頁都已入列
+                    if fut.done() and q.empty():
+                        break
+                    continue
+                pages = page_index
+                count += len(batch)
+                if per_page:
+                    yield json.dumps({"page": page_index, "reviews": batch}, ensure_ascii=False) + "\n"
+                else:
+                    for r in batch:
+                        yield json.dumps(r, ensure_ascii=False) + "\n"
+
+            exc = fut.exception()
+            if exc is not None:
+                yield json.dumps({"error": str(exc), "type": _classify_error(exc),
+                                  "count": count, "pages": pages}, ensure_ascii=False) + "\n"
+            else:
+                yield json.dumps({"done": True, "source": url, "count": count, "pages": pages}) + "\n"
+        finally:
+            cancelled.set()
+
+    resp = Response(generate(), mimetype="application/x-ndjson")
+    resp.call_on_close(cancelled.set)  # generator 沒開始就斷線時也要放掉 worker
+    return resp
+
+
 # ---------- Flask routes ----------
 
+def _scrape_params(data: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        max_pages = int(data.get("max_pages", 50))
+    except Exception:
+        max_pages = 50
+    try:
+        timeout_ms = int(data.get("timeout_ms", 15000))
+    except Exception:
+        timeout_ms = 15000
+    return {
+        "max_pages": max_pages,
+        "timeout_ms": timeout_ms,
+        "storage_state": data.get("storage_state"),  # e.g. "/data/shared/ta_state.json"
+    }
+
 @app.get("/health")
 def health():
-    return jsonify({"ok": True})
+    return jsonify({
+        "ok": True,
+        "pool": _pool.stats() if _pool else None,
+        "blocking": _block_policy.stats(),
+        "jobs_in_flight": _jobs.in_flight(),
+        "timings": timings.summary(),
+    })
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 @app.post("/scrape")
 def scrape():
@@ -451,23 +468,22 @@ def scrape():
     if not url:
         return jsonify({"error": "Missing 'url' in JSON body"}), 400
 
-    try:
-        max_pages = int(data.get("max_pages", 50))
-    except Exception:
-        max_pages = 50
-    try:
-        timeout_ms = int(data.get("timeout_ms", 15000))
-    except Exception:
-        timeout_ms = 15000
+    params = _scrape_params(data)
+
+    # stream=true：NDJSON 邊爬邊回（stream_batch="page" 則每行一頁）
+    if str(data.get("stream", request.args.get("stream", ""))).lower() in ("1", "true", "yes"):
+        _m_requests.inc(endpoint="stream")
+        return _stream_scrape(url, params, per_page=data.get("stream_batch") == "page")
 
-    storage_state = data.get("storage_state")  # e.g. "/data/shared/ta_state.json"
+    _m_requests.inc(endpoint="scrape")
 
     try:
         results = scrape_tripadvisor_reviews(
-            url, max_pages=max_pages, page_timeout_ms=timeout_ms, storage_state=storage_state
+            url, max_pages=params["max_pages"], page_timeout_ms=params["timeout_ms"],
+            storage_state=params["storage_state"],
         )
         return jsonify({"source": url, "count": len(results), "reviews": results})
-    except RuntimeError as rexc:
+    except VerificationRequired as rexc:
         # explicit CAPTCHA detection bubbles up here
         return jsonify({"error": str(rexc), "type": "captcha"}), 403
     except PWTimeoutError as te:
@@ -476,6 +492,63 @@ def scrape():
         return jsonify({"error": str(e)}), 500
 
 
+@app.post("/jobs")
+def submit_job():
+    """同 /scrape 的 body，立即回 202 + job_id；之後 GET /jobs/<id> 看進度。"""
+    data = request.get_json(silent=True) or {}
+    url = data.get("url")
+    if not url:
+        return jsonify({"error": "Missing 'url' in JSON body"}), 400
+    _m_requests.inc(endpoint="jobs")
+    try:
+        job = _jobs.submit(url, **_scrape_params(data))
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 429
+    logging.info(f"Queued job {job.id} for URL: {url}")
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "results_url": f"/jobs/{job.id}/results",
+    }), 202
+
+@app.get("/jobs")
+def list_jobs():
+    return jsonify({"jobs": _jobs.list_jobs()})
+
+@app.get("/jobs/<job_id>")
+def job_status(job_id):
+    job = _jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(job.to_status())
+
+@app.get("/jobs/<job_id>/results")
+def job_results(job_id):
+    """?offset=&limit= 分段取；job 還在跑時回傳目前已爬到的部分。"""
+    job = _jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    try:
+        offset = max(0, int(request.args.get("offset", 0)))
+    except ValueError:
+        offset = 0
+    try:
+        limit = int(request.args["limit"]) if "limit" in request.args else None
+    except ValueError:
+        limit = None
+    reviews = job.results(offset, limit)
+    return jsonify({
+        "job_id": job.id,
+        "source": job.url,
+        "status": job.status,
+        "offset": offset,
+        "count": len(reviews),
+        "total": job.to_status()["reviews_so_far"],
+        "reviews": reviews,
+    })
+
+
 # ---- 新增：暖身用 helper ----
 def warmup_tripadvisor(storage_state: str, target_url: str, headed: bool = True, timeout_ms: int = 30000):
     from playwright.sync_api import sync_playwright
@@ -0,0 +1,369 @@
+# async_review_crawler.py
+"""
+並行版評論爬蟲（playwright.async_api）。
+
+warmup_and_scrape.cli() 一次只跑一個 URL；這裡同一個 context 開 N 個 page，
+以 semaphore 限制同時處理的景點/餐廳數，同 host 的請求再經 HostRateLimiter 節流。
+沿用 processed_urls_*.txt 的續跑語意：整個景點爬完、CSV 追加完才記為已處理。
+
+    python async_review_crawler.py --kind att --concurrency 4
+    python async_review_crawler.py --kind food --input TripAdv_Foods_List.json --only Luang_Prabang
+"""
+import argparse
+import asyncio
+import csv
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urljoin
+
+from playwright.async_api import async_playwright
+
+from rate_limit import HostRateLimiter
+from resource_block import policy_from_env
+from review_capture import capture_for
+from review_extract import ATT_CARDS_SEL
+from review_pages import REVIEWS_PER_PAGE, page_url, supports_offset
+from review_sinks import FIELDNAMES
+from review_store import HighWaterMark, ReviewStore, fingerprint
+from scrape_core import VerificationRequired, looks_like_verification_async, new_context_async, parse_page_async
+from timing import timings
+from waits import (REVIEW_CARD_SEL, first_card_key_js_async as first_card_key, wait_cards_async,
+                   wait_cards_changed_async, wait_dom_quiet_async)
+from warmup_and_scrape import review_key
+
+NEXT_SELECTORS = [
+    "[data-smoke-attr='pagination-next-arrow']",
+    "a[aria-label='Next page']",
+    "a[aria-label*='Next page']",
+    "a[aria-label='Next']",
+    "a[aria-label*='Next']",
+    "button[aria-label*='Next']",
+    "li[title*='Next Page'] a",
+    "nav[aria-label='Pagination'] a:has-text('Next')",
+    "a[rel='next']",
+    "a[data-page-number][aria-label*='Next']",
+]
+
+REVIEW_ENTRY_SELECTORS = [
+    "a[data-automation='seeAllReviews']",
+    "[data-test-target='reviews-tab']",
+    "a[href*='#REVIEWS']",
+    "a[href*='-Reviews-']",
+    "a[aria-controls*='REVIEWS']",
+    "a[href*='Reviews-'][role='tab']",
+]
+
+# --parse -> scrape_core 的 engine（async 沒有逐卡 locator）
+PARSE_MODES = {"dom": "eval", "html": "html", "net": "net"}
+
+
+async def get_attraction_name(page) -> str:
+    try:
+        name = await page.evaluate(r"""
+            () => {
+              const h1 = document.querySelector("h1[data-test-target='mainH1']");
+              if (h1) {
+                const sp = h1.querySelector(":scope > span");
+                return (sp && sp.textContent.trim()) || h1.textContent || "";
+              }
+              const og = document.querySelector("meta[property='og:title']");
+              return og ? "@" + (og.getAttribute("content") || "") : "@" + document.title;
+            }
+        """)
+    except Exception:
+        return "(unknown)"
+    if name.startswith("@"):
+        name = re.split(r"\s*[-–]\s*Reviews", name[1:], maxsplit=1)[0]
+    else:
+        name = re.split(r"\bUnclaimed\b", name, maxsplit=1)[0]
+        name = re.sub(r"If you own this business.*$", "", name, flags=re.S)
+        name = re.sub(r"Claim this listing.*$", "", name, flags=re.S)
+    name = re.sub(r"\s+", " ", name).strip()
+    return name or "(unknown)"
+
+
+async def ensure_on_reviews(page):
+    if await page.locator(REVIEW_CARD_SEL).count():
+        return
+    for sel in REVIEW_ENTRY_SELECTORS:
+        el = page.locator(sel).first
+        if not await el.count():
+            continue
+        try:
+            await el.click(timeout=1200)
+        except Exception:
+            href = (await el.get_attribute("href") or "").strip()
+            if href:
+                await page.goto(urljoin(page.url, href), wait_until="domcontentloaded")
+        if await page.locator(REVIEW_CARD_SEL).count():
+            return
+    try:
+        await page.evaluate("() => { location.hash = 'REVIEWS'; }")
+    except Exception:
+        pass
+
+
+async def click_next_page(page) -> bool:
+    """點下一頁並等第一張卡片換掉；沒有可點的 next 或內容沒變就回 False。"""
+    before_key = await first_card_key(page)
+    before_url = page.url
+    for sel in NEXT_SELECTORS:
+        loc = page.locator(sel).first
+        if not await loc.count():
+            continue
+        try:
+            if not await loc.is_visible():
+                continue
+            await loc.click(timeout=2500)
+        except Exception:
+            try:
+                href = (await loc.get_attribute("href") or "").strip()
+                if not href:
+                    continue
+                await page.goto(urljoin(before_url, href), wait_until="domcontentloaded")
+            except Exception:
+                continue
+        if await wait_cards_changed_async(page, before_key, timeout_ms=8000):
+            return True
+        if page.url != before_url:
+            return True
+    return False
+
+
+class Crawler:
+    def __init__(self, args):
+        self.args = args
+        self.profile = "food" if args.kind == "food" else "att"
+        self.per_page = REVIEWS_PER_PAGE[self.profile]
+        self.sem = asyncio.Semaphore(args.concurrency)
+        self.limiter = HostRateLimiter(args.per_host_interval, jitter=args.jitter)
+        self.out_csv = Path(args.out_csv).resolve()
+        self.processed_path = Path(args.processed).resolve()
+        self.done = 0
+        self.failed = 0
+        self.total_reviews = 0
+        self.store = ReviewStore(Path(args.db).resolve()) if args.db else None
+
+    async def goto(self, page, url: str, **kw):
+        await self.limiter.wait(url)
+        return await page.goto(url, **kw)
+
+    async def crawl_one(self, page, url: str, hwm: Optional[HighWaterMark] = None) -> List[Dict[str, Any]]:
+        print(f"[INFO] goto: {url}")
+        if self.args.parse == "net":
+            capture_for(page)      # 導航前掛上 response listener
+        with timings.span("goto"):
+            await self.goto(page, url, wait_until="domcontentloaded", timeout=60000)
+
+        with timings.span("consent"):
+            try:
+                btn = page.get_by_role("button", name=re.compile(r"(Accept|Agree|I agree|OK)", re.I))
+                if await btn.count() and await btn.first.is_visible():
+                    await btn.first.click()
+            except Exception:
+                pass
+
+        if await looks_like_verification_async(page):
+            raise VerificationRequired(f"verification page on {url}")
+
+        with timings.span("ensure_on_reviews"):
+            await ensure_on_reviews(page)
+        with timings.span("scroll"):
+            if not await wait_cards_async(page, timeout_ms=8000):
+                for _ in range(3):
+                    await page.mouse.wheel(0, 1600)
+                    await wait_dom_quiet_async(page, quiet_ms=150, timeout_ms=1000)
+
+        attraction = await get_attraction_name(page)
+        reviews: List[Dict[str, Any]] = []
+        seen_urls = set()
+        seen_keys = set()
+        seen_reviews = set()        # ATT_CARDS_SEL 也會對到卡片裡的 reviewText，同一則評論只留第一次（同 dedupe_reviews）
+        base = page.url if supports_offset(page.url) else url
+        by_offset = self.args.paginate == "url" and supports_offset(base)
+        page_index = 1
+        while page_index <= self.args.max_pages:
+            seen_urls.add(page.url)
+            if by_offset:
+                # offset 超出範圍會被導回既有的頁
+                key = await first_card_key(page)
+                if key and key in seen_keys:
+                    break
+                if key:
+                    seen_keys.add(key)
+            with timings.span("parse", page=page_index):
+                batch = await parse_page_async(page, url, mode=PARSE_MODES[self.args.parse], profile=self.profile,
+                                               cards_sel=ATT_CARDS_SEL, page=page_index)
+            n_cards = len(batch)
+            fresh = []
+            for r in batch:
+                r["attraction"] = attraction
+                k = review_key(r)
+                if k not in seen_reviews:
+                    seen_reviews.add(k)
+                    fresh.append(r)
+            batch = fresh
+            if hwm is not None and batch:
+                hwm.observe(batch)
+                batch = [r for r in batch if not hwm.older(r)]
+                if not batch:
+                    print(f"[INFO] {attraction} | page {page_index}: older than the high-water mark. Stop.")
+                    break
+            if self.store is not None and batch:
+                known = self.store.known(fingerprint(r) for r in batch)
+                fresh = [r for r in batch if fingerprint(r) not in known]
+                if not fresh:
+                    print(f"[INFO] {attraction} | page {page_index}: all reviews already stored. Stop.")
+                    break
+                batch = fresh
+            reviews.extend(batch)
+            print(f"[INFO] {attraction} | page {page_index}: {len(batch)} reviews")
+
+            with timings.span("pagination", page=page_index + 1):
+                if by_offset:
+                    if n_cards < self.per_page:
+                        break
+                    await self.goto(page, page_url(base, page_index + 1, self.per_page), wait_until="domcontentloaded")
+                    if await looks_like_verification_async(page):
+                        raise VerificationRequired(f"verification page while paginating {url}")
+                    if not await wait_cards_async(page, timeout_ms=8000):
+                        break
+                else:
+                    await self.limiter.wait(url)
+                    if not await click_next_page(page):
+                        break
+                    if await looks_like_verification_async(page):
+                        raise VerificationRequired(f"verification page while paginating {url}")
+                    if page.url in seen_urls:
+                        break
+            page_index += 1
+        return reviews
+
+    def _append(self, url: str, reviews: List[Dict[str, Any]]):
+        # 單一 event loop thread，同步寫檔不會交錯
+        if reviews:
+            with self.out_csv.open("a", newline="", encoding="utf-8") as f:
+                w = csv.DictWriter(f, fieldnames=FIELDNAMES)
+                for r in reviews:
+                    w.writerow(r)
+            if self.store is not None:
+                self.store.upsert_many(reviews)
+        with open(self.processed_path, "a", encoding="utf-8") as pf:
+            pf.write(url + "\n")
+
+    async def worker(self, context, url: str):
+        async with self.sem:
+            page = await context.new_page()
+            page.set_default_timeout(self.args.timeout_ms)
+            try:
+                hwm = HighWaterMark(self.store, url) if self.args.incremental and self.store is not None else None
+                with timings.scope(url=url):
+                    reviews = await self.crawl_one(page, url, hwm)
+                    with timings.span("write", rows=len(reviews)):
+                        self._append(url, reviews)
+                if hwm is not None:
+                    hwm.commit()
+                self.done += 1
+                self.total_reviews += len(reviews)
+                print(f"[DONE] {url} ({len(reviews)} reviews) | done={self.done} failed={self.failed}")
+            except Exception as e:
+                # 不記 processed，下次續跑會再試
+                self.failed += 1
+                print(f"[WARN] {url} failed: {e}")
+            finally:
+                await page.close()
+
+    async def run(self, urls: List[str]):
+        if not self.out_csv.exists():
+            with self.out_csv.open("w", newline="", encoding="utf-8") as f:
+                csv.DictWriter(f, fieldnames=FIELDNAMES).writeheader()
+
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(
+                headless=self.args.headless,
+                args=["--disable-blink-features=AutomationControlled"],
+            )
+            block = policy_from_env()
+            context = await new_context_async(browser, self.args.state, block=block)
+
+            await asyncio.gather(*(self.worker(context, u) for u in urls))
+
+            if self.args.state:
+                try:
+                    await context.storage_state(path=self.args.state)
+                except Exception as e:
+                    print(f"[WARN] Save storage state failed: {e}")
+            await browser.close()
+
+        print(f"[INFO] resource blocking: {block.summary()}")
+        timings.print_summary()
+        timings.close()
+        if self.store is not None:
+            print(f"[INFO] review db: {self.store.rows} new reviews -> {self.store.path}")
+            self.store.close()
+        print(f"[DONE] {self.done} urls, {self.total_reviews} reviews, {self.failed} failed -> {self.out_csv}")
+
+
+def load_pending(json_path: Path, processed_path: Path, only: Optional[str], include_processed: bool = False) -> List[str]:
+    with open(json_path, "r", encoding="utf-8") as f:
+        urls = json.load(f)
+    if not isinstance(urls, list):
+        raise SystemExit(f"[ERROR] JSON 應該是 list，但得到 {type(urls)}")
+    processed = set()
+    if processed_path.exists() and not include_processed:
+        processed = {ln.strip() for ln in processed_path.read_text(encoding="utf-8").splitlines()}
+    pending = []
+    for u in urls:
+        if u in processed or "#REVIEWS" in u:
+            continue
+        if only and only not in u:
+            continue
+        if u not in pending:
+            pending.append(u)
+    return pending
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent TripAdvisor review crawler (async Playwright).")
+    parser.add_argument("--kind", choices=["att", "food"], default="att")
+    parser.add_argument("--input", help="URL list JSON (default: TripAdv_Atts_List.json / TripAdv_Foods_List.json)")
+    parser.add_argument("--out-csv", help="default: reviews_<kind>.csv")
+    parser.add_argument("--processed", help="default: processed_urls_<kind>.txt")
+    parser.add_argument("--state", default="ta_state.json", help="storage_state to load/save")
+    parser.add_argument("--concurrency", type=int, default=4, help="pages crawling at the same time")
+    parser.add_argument("--per-host-interval", type=float, default=2.0, help="min seconds between requests to one host")
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--max-pages", type=int, default=300)
+    parser.add_argument("--timeout-ms", type=int, default=15000)
+    parser.add_argument("--db", help="SQLite review store for cross-run dedupe (stop at the first all-known page)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="with --db: re-crawl processed URLs too, but stop at each one's high-water mark")
+    parser.add_argument("--paginate", choices=["url", "click"], default="url",
+                        help="url: build -Reviews-orN- page URLs directly; click: click Next")
+    parser.add_argument("--parse", choices=["dom", "html", "net"], default="dom",
+                        help="dom: one in-page eval per page; html: parse page.content() with lxml; "
+                             "net: take reviews from GraphQL responses / embedded state, DOM as fallback")
+    parser.add_argument("--only", help="only crawl URLs containing this substring (e.g. Luang_Prabang)")
+    parser.add_argument("--headed", dest="headless", action="store_false")
+    args = parser.parse_args()
+
+    args.input = args.input or ("TripAdv_Foods_List.json" if args.kind == "food" else "TripAdv_Atts_List.json")
+    args.out_csv = args.out_csv or f"reviews_{args.kind}.csv"
+    args.processed = args.processed or f"processed_urls_{args.kind}.txt"
+
+    if args.incremental and not args.db:
+        parser.error("--incremental needs --db")
+    urls = load_pending(Path(args.input).resolve(), Path(args.processed).resolve(), args.only,
+                        include_processed=args.incremental)
+    print(f"[INFO] {len(urls)} URLs pending, concurrency={args.concurrency}")
+    asyncio.run(Crawler(args).run(urls))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
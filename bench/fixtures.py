@@ -0,0 +1,225 @@
+# bench/fixtures.py
+"""
+本機 fixture server：用 reviews.json 的評論合成 TripAdvisor 風格的頁面，
+讓 benchmark 不用連網、每次跑的內容都一樣。
+
+    景點評論頁  /Attraction_Review-g1-d{id}-Reviews[-or{offset}]-Bench_Attraction_{id}-Bench_City.html
+    景點列表頁  /Attractions-g1-Activities-oa{offset}-Bench_City.html
+
+卡片 markup 用 review_extract / offline_parse 認得的那幾條 selector（reviewCard、memberName、
+bubbleRatingImage、ShowUserReviews 標題、review-text、Written ...），每張卡有一個 "Read more"。
+offset 超出範圍時回最後一頁（TripAdvisor 也是導回既有的頁）。
+
+pages_dir 底下若有同路徑的檔案（例如存下來的 ta_*.html），直接回那份錄下來的頁面。
+"""
+import html
+import json
+import re
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+
+_REVIEW_PATH_RE = re.compile(r"^/Attraction_Review-g(\d+)-d(\d+)-Reviews(?:-or(\d+))?-(.+)\.html$")
+_LIST_PATH_RE = re.compile(r"^/Attractions-g(\d+)-Activities(?:-oa(\d+))?-(.+)\.html$")
+
+_LOCATIONS = ["Sydney, Australia", "London, UK", "Bangkok, Thailand", "Paris, France", None]
+
+
+def load_seed_reviews(path: Optional[Path] = None) -> List[Dict[str, Any]]:
+    with open(path or ROOT / "reviews.json", encoding="utf-8") as f:
+        return [r for r in json.load(f) if r.get("text")]
+
+
+def review_path(attraction_id: int, page_index: int = 1, per_page: int = 10) -> str:
+    offset = (page_index - 1) * per_page
+    seg = f"-Reviews-or{offset}-" if offset else "-Reviews-"
+    return f"/Attraction_Review-g1-d{attraction_id}{seg}Bench_Attraction_{attraction_id}-Bench_City.html"
+
+
+def list_path(offset: int = 0) -> str:
+    return f"/Attractions-g1-Activities-oa{offset}-Bench_City.html"
+
+
+class FixtureSite:
+    """
+    attractions       : 列表頁上的景點數
+    reviews_per_attr  : 每個景點的評論數
+    per_page          : 評論頁每頁幾則（景點 = 10）
+    links_per_list    : 列表頁每頁幾個景點連結
+    """
+
+    def __init__(self, attractions: int = 30, reviews_per_attr: int = 50, per_page: int = 10,
+                 links_per_list: int = 30, seed: Optional[List[Dict[str, Any]]] = None):
+        self.attractions = attractions
+        self.reviews_per_attr = reviews_per_attr
+        self.per_page = per_page
+        self.links_per_list = links_per_list
+        self.seed = seed or load_seed_reviews()
+
+    # ---- 評論 ----
+    def review(self, attraction_id: int, i: int) -> Dict[str, Any]:
+        """第 i 則（0 起算，新到舊）；同一個 (景點, i) 每次都一樣。"""
+        s = self.seed[i % len(self.seed)]
+        written = date(2025, 8, 1) - timedelta(days=3 * i + attraction_id % 3)
+        return {
+            "id": attraction_id * 100000 + i,
+            "title": f"{s.get('title') or 'Review'} #{i + 1}",
+            "text": s["text"],
+            "rating": s.get("rating") or 4.0,
+            "author": f"{s.get('author') or 'traveler'}_{i + 1}",
+            "location": _LOCATIONS[i % len(_LOCATIONS)],
+            "contributions": (s.get("contribution_count") or 1) + i,
+            "helpful": i % 4,
+            "written": f"{written:%B} {written.day}, {written.year}",
+            "travel": f"{written:%b %Y}",
+        }
+
+    def _card(self, attraction_id: int, r: Dict[str, Any]) -> str:
+        e = html.escape
+        loc = f'<span data-automation="reviewerLocation">{e(r["location"])}</span>' if r["location"] else ""
+        helpful = f'<span>{r["helpful"]} helpful votes</span>' if r["helpful"] else ""
+        return f"""
+<div data-test-target="review-card" data-automation="reviewCard">
+  <div class="member"><span data-automation="memberName">{e(r["author"])}</span>{loc}
+    <span>{r["contributions"]} contributions</span></div>
+  <svg data-automation="bubbleRatingImage" aria-label="{r["rating"]:.1f} of 5 bubbles" width="88" height="16">
+    <title>{r["rating"]:.1f} of 5 bubbles</title></svg>
+  <a href="/ShowUserReviews-g1-d{attraction_id}-r{r["id"]}-Bench.html"><span data-automation="reviewTitle">{e(r["title"])}</span></a>
+  <div><span>Date of experience: {r["travel"]}</span></div>
+  <div data-test-target="review-text"><span lang="en" class="clamp">{e(r["text"])}</span></div>
+  <button type="button" onclick="this.previousElementSibling.firstChild.classList.remove('clamp'); this.remove();">Read more</button>
+  <div><span>Written {r["written"]}</span></div>
+  {helpful}
+</div>"""
+
+    def review_page(self, attraction_id: int, offset: int) -> str:
+        n_pages = max(1, -(-self.reviews_per_attr // self.per_page))
+        page_index = min(offset // self.per_page + 1, n_pages)      # 超出範圍 -> 最後一頁
+        start = (page_index - 1) * self.per_page
+        end = min(start + self.per_page, self.reviews_per_attr)
+        cards = "".join(self._card(attraction_id, self.review(attraction_id, i)) for i in range(start, end))
+        name = f"Bench Attraction {attraction_id}"
+        nav = ""
+        if page_index < n_pages:
+            nxt = review_path(attraction_id, page_index + 1, self.per_page)
+            nav = (f'<nav aria-label="Pagination"><a data-smoke-attr="pagination-next-arrow" '
+                   f'aria-label="Next page" href="{nxt}">Next</a></nav>')
+        ld = json.dumps({"@type": "LocalBusiness", "name": name,
+                         "aggregateRating": {"ratingValue": 4.5, "reviewCount": self.reviews_per_attr}})
+        return f"""<!doctype html>
+<html lang="en"><head><meta charset="utf-8"><title>{name} - Reviews</title>
+<meta property="og:title" content="{name} - Reviews">
+<link rel="canonical" href="{review_path(attraction_id, page_index, self.per_page)}">
+<script type="application/ld+json">{ld}</script>
+<style>.clamp {{ display: -webkit-box; -webkit-line-clamp: 3; overflow: hidden; }}</style>
+</head><body>
+<h1 data-test-target="mainH1"><span>{name}</span></h1>
+<a data-automation="seeAllReviews" href="#REVIEWS">See all reviews</a>
+<section id="REVIEWS">
+  <div>Showing results {start + 1}-{end} of {self.reviews_per_attr:,}</div>
+  {cards}
+  {nav}
+</section>
+</body></html>"""
+
+    # ---- 列表 ----
+    def list_page(self, offset: int) -> str:
+        ids = range(offset + 1, min(offset + self.links_per_list, self.attractions) + 1)
+        items = "".join(
+            f'<li><a href="{review_path(d, 1, self.per_page)}">Bench Attraction {d}</a></li>' for d in ids)
+        nav = ""
+        if offset + self.links_per_list < self.attractions:
+            nav = (f'<nav aria-label="Pagination"><a data-smoke-attr="pagination-next-arrow" '
+                   f'aria-label="Next page" href="{list_path(offset + self.links_per_list)}">Next</a></nav>')
+        return f"""<!doctype html>
+<html lang="en"><head><meta charset="utf-8"><title>Things to do in Bench City</title></head><body>
+<h1>Things to Do in Bench City</h1><ul>{items}</ul>{nav}
+</body></html>"""
+
+    def render(self, path: str) -> Optional[str]:
+        m = _REVIEW_PATH_RE.match(path)
+        if m:
+            return self.review_page(int(m.group(2)), int(m.group(3) or 0))
+        m = _LIST_PATH_RE.match(path)
+        if m:
+            return self.list_page(int(m.group(2) or 0))
+        return None
+
+
+class FixtureServer:
+    """
+    背景 thread 的 HTTP server。latency_ms：每個 document 回應前先等這麼久（模擬網路）。
+
+        with FixtureServer(FixtureSite()) as srv:
+            url = srv.url(review_path(1))
+    """
+
+    def __init__(self, site: FixtureSite, host: str = "127.0.0.1", port: int = 0,
+                 latency_ms: float = 0.0, pages_dir: Optional[Path] = None):
+        self.site = site
+        self.latency_ms = latency_ms
+        self.pages_dir = Path(pages_dir).resolve() if pages_dir else None
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                path = urlsplit(self.path).path
+                body = server._recorded(path)
+                if body is None:
+                    body = server.site.render(path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                if server.latency_ms:
+                    time.sleep(server.latency_ms / 1000.0)
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fixture-server", daemon=True)
+
+    def _recorded(self, path: str) -> Optional[str]:
+        if self.pages_dir is None:
+            return None
+        f = (self.pages_dir / path.lstrip("/")).resolve()
+        if self.pages_dir in f.parents and f.is_file():
+            return f.read_text(encoding="utf-8", errors="replace")
+        return None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+    def start(self) -> "FixtureServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,160 @@
+# bench/parse_bench.py
+"""
+每張評論卡的 CPU 成本 micro-benchmark（不開瀏覽器）：
+
+    case      量的是
+    rating    extract_rating / extract_rating_app 每個 label
+    clean     clean_review_text 每段文字
+    fields    review_from_raw：eval engine 拿回 raw 之後 Python 端的欄位取捨（每張卡）
+    html      offline_parse.collect_raw + review_from_raw：html engine 每張卡（lxml 走訪 + 欄位取捨）
+
+卡片來自 fixtures.FixtureSite，另外混一張帶店家回覆、雜湊 class 內文容器、aria-labelledby
+評分的卡（TripAdvisor 現在的版型），讓回覆排除與評分備援的路徑也有算到。
+
+用法：
+    python bench/parse_bench.py                         # 印出每個 case 的 us/card
+    python bench/parse_bench.py --json before.json      # 存下來
+    python bench/parse_bench.py --compare before.json   # 和存下來的比（例如改動前的 commit 跑的）
+
+時間用 process_time（CPU），每個 case 跑 --repeat 次取最小值。
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+import lxml.html  # noqa: E402
+
+from fixtures import FixtureSite  # noqa: E402
+from offline_parse import _all, collect_raw  # noqa: E402
+from review_extract import (APP_CARDS_SEL, ATT_CARDS_SEL, PROFILES, clean_review_text,  # noqa: E402
+                            extract_rating, extract_rating_app, review_from_raw)
+
+_RICH_CARD = """
+<div data-test-target="review-card">
+  <div class="xyz navcl"><span>Taipei, Taiwan</span><span class="IugUm">12 contributions</span></div>
+  <svg data-automation="bubbleRatingImage" aria-labelledby="lbl{i}"><title></title></svg>
+  <span id="lbl{i}">4.0 of 5 bubbles</span>
+  <a href="/ShowUserReviews-g1-d1-r{i}-x.html"><span>Rich card title {i}</span></a>
+  <div class="bgMZj abc"><span class="jguWG"><span class="yCeTE">{text} Read more</span></span></div>
+  <div data-automation="ownerResponse"><span class="yCeTE">Dear guest, thank you for the kind words.</span>
+    <div>Response from Manager, Aug 2025</div></div>
+  <div><span>Date of experience: Jul 2025</span></div>
+  <div><span>Written August {day}, 2025</span></div>
+  <span>{helpful} helpful votes</span>
+  <div>This review is the subjective opinion of a Tripadvisor member and not of Tripadvisor LLC.</div>
+</div>"""
+
+_LABELS = ["4.0 of 5 bubbles", "5 bubbles", "3.5 out of 5 bubbles", "Rated 2 of 5", "", "4 of 5 bubbles"]
+
+
+def build_docs(pages: int, per_page: int) -> List[Any]:
+    site = FixtureSite(attractions=pages, reviews_per_attr=per_page, per_page=per_page)
+    docs = []
+    for d in range(1, pages + 1):
+        html = site.review_page(d, 0)
+        rich = "".join(_RICH_CARD.format(i=d * 1000 + k, text=site.review(d, k)["text"], day=1 + k % 28,
+                                         helpful=k % 5) for k in range(per_page // 4 or 1))
+        docs.append(lxml.html.fromstring(html.replace("</section>", rich + "</section>")))
+    return docs
+
+
+def _cards(docs, sel: str):
+    return [(card, doc) for doc in docs for card in _all(doc, sel)]
+
+
+def _time(fn: Callable[[], int], repeat: int) -> float:
+    """回傳每單位最少的 CPU 微秒數；fn 回傳這一輪處理了幾個單位。"""
+    best = None
+    for _ in range(repeat):
+        t0 = time.process_time()
+        n = fn()
+        dt = (time.process_time() - t0) / max(1, n)
+        best = dt if best is None else min(best, dt)
+    return round(best * 1e6, 2)
+
+
+def run(pages: int, per_page: int, repeat: int) -> Dict[str, Any]:
+    docs = build_docs(pages, per_page)
+    att_cards = _cards(docs, ATT_CARDS_SEL)
+    app_cards = _cards(docs, APP_CARDS_SEL)
+    att_raws = [collect_raw(c, d, PROFILES["att"]) for c, d in att_cards]
+    app_raws = [collect_raw(c, d, PROFILES["app"]) for c, d in app_cards]
+    texts = [t for r in att_raws for t in r["text_cands"] if t] or [""]
+    labels = _LABELS * 50
+
+    def rating():
+        for s in labels:
+            extract_rating(s)
+            extract_rating_app(s)
+        return 2 * len(labels)
+
+    def clean():
+        for s in texts:
+            clean_review_text(s)
+        return len(texts)
+
+    def fields(raws, profile):
+        def f():
+            for r in raws:
+                review_from_raw(r, "http://bench/", profile)
+            return len(raws)
+        return f
+
+    def html(cards, profile):
+        opts = PROFILES[profile]
+
+        def f():
+            for c, d in cards:
+                review_from_raw(collect_raw(c, d, opts), "http://bench/", profile)
+            return len(cards)
+        return f
+
+    return {
+        "cards": len(att_cards),
+        "us_per_unit": {
+            "rating": _time(rating, repeat),
+            "clean": _time(clean, repeat),
+            "fields_att": _time(fields(att_raws, "att"), repeat),
+            "fields_app": _time(fields(app_raws, "app"), repeat),
+            "html_att": _time(html(att_cards, "att"), repeat),
+            "html_app": _time(html(app_cards, "app"), repeat),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-card CPU cost of the review field parsers.")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--per-page", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="write the result to this file")
+    parser.add_argument("--compare", help="earlier result (--json) to compare against")
+    args = parser.parse_args()
+
+    res = run(args.pages, args.per_page, args.repeat)
+    before = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            before = json.load(f)["us_per_unit"]
+
+    print(f"[INFO] {res['cards']} cards, best of {args.repeat}")
+    print(f"{'case':<12} {'us/unit':>10}" + (f" {'before':>10} {'change':>8}" if before else ""))
+    for case, us in res["us_per_unit"].items():
+        line = f"{case:<12} {us:>10}"
+        if before and case in before:
+            line += f" {before[case]:>10} {(us / before[case] - 1) * 100:>+7.1f}%"
+        print(line)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(res, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
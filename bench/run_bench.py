@@ -0,0 +1,291 @@
+# bench/run_bench.py
+"""
+離線 benchmark：對本機 fixture server（見 fixtures.py）跑三條主要流程，量吞吐量與記憶體，
+並和存下來的 baseline 比較。不連 TripAdvisor，每次的頁面內容都一樣，可以重現。
+
+    flow    跑的是
+    app     app.scrape_tripadvisor_reviews（browser pool + context 快取）
+    warmup  warmup_and_scrape.run_same_context（同一個 page 逐個景點爬）
+    list    tripadv_att_list.run（景點列表頁收連結）
+
+用法：
+    python bench/run_bench.py --save-baseline            # 先在要比較的機器上存一份 baseline（bench/baseline.json）
+    python bench/run_bench.py                            # 三個 flow 各跑 3 次，和 baseline 比較
+    python bench/run_bench.py --flows app,warmup --repeat 5 --latency-ms 80 --no-compare
+    python bench/run_bench.py --pages-dir recorded/      # 有錄下來的頁面就優先回那份
+
+每個 flow 的每一次都在獨立的子行程裡跑（記憶體、browser pool、import 時讀的環境變數互不影響），
+取多次的中位數。報告：
+    pages_per_s / reviews_per_s : 吞吐量（list flow 的 reviews 是收集到的連結數）
+    parse_ms_per_card           : timing 的 parse span（self time，不含 expand / 等卡片）÷ 評論數
+    py_peak_mb                  : tracemalloc 的 Python heap 峰值
+    rss_mb                      : Python 行程的 max RSS（不含 Chromium 子行程）
+baseline 比較：吞吐量掉超過 --tolerance、或成本 / 記憶體多出超過 --tolerance 就算退步，exit code 1；
+評論數和 baseline 不同表示解析結果變了，也算失敗。
+沒有 baseline、參數和 baseline 不同、或 baseline 缺少要跑的 flow 時一開始就失敗（exit code 2），
+除非給 --save-baseline 或 --no-compare。吞吐量 / 記憶體跟機器有關，baseline 不放進 repo，
+每台比較用的機器（例如 CI runner）各存一份。
+"""
+import argparse
+import json
+import math
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(ROOT))
+
+from fixtures import FixtureServer, FixtureSite, list_path, review_path  # noqa: E402
+
+FLOWS = ("app", "warmup", "list")
+HIGHER_IS_BETTER = ("pages_per_s", "reviews_per_s")
+LOWER_IS_BETTER = ("parse_ms_per_card", "py_peak_mb", "rss_mb")
+RESULT_PREFIX = "BENCH_RESULT "
+
+
+# ---------- 子行程：實際跑一個 flow ----------
+
+def _flow_app(base_url: str, args) -> Dict[str, Any]:
+    import app
+    from timing import timings
+
+    urls = [base_url + review_path(d) for d in range(1, args.attractions + 1)]
+    state = str(Path.cwd() / "ta_state.json")
+    # 第一次會等 pool 開好 Chromium，不算在量測裡
+    app.scrape_tripadvisor_reviews(urls[0], max_pages=1, storage_state=state)
+    timings.reset()
+    t0 = time.perf_counter()
+    reviews = 0
+    for u in urls:
+        reviews += len(app.scrape_tripadvisor_reviews(u, max_pages=args.max_pages, storage_state=state))
+    seconds = time.perf_counter() - t0
+    app.get_browser_pool().shutdown()
+    return {"seconds": seconds, "reviews": reviews}
+
+
+def _flow_warmup(base_url: str, args) -> Dict[str, Any]:
+    from playwright.sync_api import sync_playwright
+
+    import warmup_and_scrape as w
+    from review_sinks import Sink
+    from timing import timings
+
+    class CountSink(Sink):
+        def __init__(self):
+            super().__init__()
+
+        def write(self, batch):
+            self.rows += len(batch)
+
+    urls = [base_url + review_path(d) for d in range(1, args.attractions + 1)]
+    sink = CountSink()
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        ctx = browser.new_context(locale="en-US", viewport={"width": 1366, "height": 900})
+        page = ctx.new_page()
+        page.set_default_timeout(15000)
+        page.goto(urls[0], wait_until="domcontentloaded")
+        timings.reset()
+        t0 = time.perf_counter()
+        for u in urls:
+            w.run_same_context(target=u, max_pages=args.max_pages, timeout_ms=15000, debug_dir=None,
+                               out_json=None, out_csv=None, page=page, sinks=[sink])
+        seconds = time.perf_counter() - t0
+        browser.close()
+    return {"seconds": seconds, "reviews": sink.rows}
+
+
+def _flow_list(base_url: str, args) -> Dict[str, Any]:
+    import asyncio
+
+    import tripadv_att_list as tl
+
+    t0 = time.perf_counter()
+    out = asyncio.run(tl.run(base_url + list_path(), headless=True, channel=None,
+                             outfile=str(Path.cwd() / "att_list.json")))
+    seconds = time.perf_counter() - t0
+    n = out["count"] if out else 0
+    return {"seconds": seconds, "reviews": n, "pages": max(1, math.ceil(n / args.links_per_list))}
+
+
+def run_child(args) -> Dict[str, Any]:
+    # import 時就會讀的設定：不要禮貌間隔、pool 只開一個 browser
+    os.environ.setdefault("TA_HOST_INTERVAL", "0")
+    os.environ.setdefault("TA_POOL_SIZE", "1")
+    workdir = tempfile.mkdtemp(prefix=f"bench_{args.child}_")
+    os.chdir(workdir)   # 截圖、state、輸出檔都留在暫存目錄
+
+    tracemalloc.start()
+    res = {"app": _flow_app, "warmup": _flow_warmup, "list": _flow_list}[args.child](args.base_url, args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    from timing import timings
+    summary = timings.summary()
+    parse = summary.get("parse") or {}
+    pages = res.get("pages") or parse.get("count") or 0
+    seconds = max(res["seconds"], 1e-9)
+    return {
+        "seconds": round(seconds, 3),
+        "pages": pages,
+        "reviews": res["reviews"],
+        "pages_per_s": round(pages / seconds, 3),
+        "reviews_per_s": round(res["reviews"] / seconds, 3),
+        "parse_ms_per_card": round(parse["total_s"] * 1000.0 / res["reviews"], 3)
+        if parse and res["reviews"] else None,
+        "py_peak_mb": round(peak / 2 ** 20, 2),
+        "rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+        "phases": summary,
+    }
+
+
+# ---------- 主行程：fixture server + 比較 ----------
+
+def _median_result(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"runs": len(runs)}
+    for k in ("seconds", "pages", "reviews") + HIGHER_IS_BETTER + LOWER_IS_BETTER:
+        vals = [r[k] for r in runs if r.get(k) is not None]
+        out[k] = round(statistics.median(vals), 3) if vals else None
+    return out
+
+
+def _child_cmd(flow: str, base_url: str, args) -> List[str]:
+    return [sys.executable, str(Path(__file__).resolve()), "--child", flow, "--base-url", base_url,
+            "--attractions", str(args.attractions), "--reviews", str(args.reviews),
+            "--max-pages", str(args.max_pages), "--links-per-list", str(args.links_per_list)]
+
+
+def _run_flow(flow: str, base_url: str, args) -> Dict[str, Any]:
+    runs = []
+    for i in range(args.repeat):
+        proc = subprocess.run(_child_cmd(flow, base_url, args), capture_output=True, text=True, cwd=str(ROOT))
+        line = next((l for l in reversed(proc.stdout.splitlines()) if l.startswith(RESULT_PREFIX)), None)
+        if proc.returncode != 0 or line is None:
+            tail = "\n".join((proc.stderr or proc.stdout).splitlines()[-15:])
+            raise RuntimeError(f"{flow} run {i + 1} failed (exit {proc.returncode}):\n{tail}")
+        r = json.loads(line[len(RESULT_PREFIX):])
+        print(f"[INFO] {flow} #{i + 1}: {r['seconds']}s, {r['pages']} pages, {r['reviews']} reviews")
+        runs.append(r)
+    return _median_result(runs)
+
+
+def load_baseline(path: Path, params: Dict[str, Any], flows: List[str]) -> Dict[str, Any]:
+    """讀 baseline 的 results；檔案不存在、參數不同或缺少某個 flow 都丟 ValueError。"""
+    if not path.exists():
+        raise ValueError(f"no baseline at {path}")
+    stored = json.loads(path.read_text(encoding="utf-8"))
+    if stored.get("params") != params:
+        raise ValueError(f"baseline params {stored.get('params')} differ from this run {params}")
+    results = stored.get("results") or {}
+    missing = [f for f in flows if f not in results]
+    if missing:
+        raise ValueError(f"baseline {path} has no results for {', '.join(missing)}")
+    return results
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """回傳退步的項目（空 list = 沒有退步）。"""
+    problems = []
+    for flow, cur in current.items():
+        base = baseline.get(flow)
+        if not base:
+            continue
+        if base.get("reviews") is not None and cur.get("reviews") != base.get("reviews"):
+            problems.append(f"{flow}: reviews {cur.get('reviews')} != baseline {base.get('reviews')} (parse output changed)")
+        for k in HIGHER_IS_BETTER:
+            if cur.get(k) is not None and base.get(k) and cur[k] < base[k] * (1 - tolerance):
+                problems.append(f"{flow}: {k} {cur[k]} < baseline {base[k]} (-{(1 - cur[k] / base[k]):.0%})")
+        for k in LOWER_IS_BETTER:
+            if cur.get(k) is not None and base.get(k) and cur[k] > base[k] * (1 + tolerance):
+                problems.append(f"{flow}: {k} {cur[k]} > baseline {base[k]} (+{(cur[k] / base[k] - 1):.0%})")
+    return problems
+
+
+def _print_table(results: Dict[str, Any], baseline: Dict[str, Any]):
+    cols = ("seconds", "pages", "reviews") + HIGHER_IS_BETTER + LOWER_IS_BETTER
+    print(f"{'flow':<8}" + "".join(f"{c:>19}" for c in cols))
+    for flow, r in results.items():
+        print(f"{flow:<8}" + "".join(f"{str(r.get(c)):>19}" for c in cols))
+        base = baseline.get(flow)
+        if base:
+            print(f"{'  base':<8}" + "".join(f"{str(base.get(c)):>19}" for c in cols))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline crawler benchmark against a local fixture server.")
+    parser.add_argument("--flows", default=",".join(FLOWS), help="comma separated: app,warmup,list")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--attractions", type=int, default=3, help="attractions scraped per app/warmup run")
+    parser.add_argument("--reviews", type=int, default=50, help="reviews per fixture attraction")
+    parser.add_argument("--max-pages", type=int, default=50)
+    parser.add_argument("--links-per-list", type=int, default=30)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="artificial latency per page response")
+    parser.add_argument("--pages-dir", help="serve recorded pages from this directory when the path matches")
+    parser.add_argument("--baseline", default=str(BENCH_DIR / "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--no-compare", action="store_true", help="only print the results, don't need a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--out", help="also write the results JSON here")
+    parser.add_argument("--child", choices=FLOWS, help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(RESULT_PREFIX + json.dumps(run_child(args)), flush=True)
+        return
+
+    flows = [f.strip() for f in args.flows.split(",") if f.strip()]
+    unknown = set(flows) - set(FLOWS)
+    if unknown:
+        parser.error(f"unknown flows: {', '.join(sorted(unknown))}")
+
+    site = FixtureSite(attractions=max(args.attractions, args.links_per_list), reviews_per_attr=args.reviews,
+                       links_per_list=args.links_per_list)
+    params = {"attractions": args.attractions, "reviews": args.reviews, "max_pages": args.max_pages,
+              "links_per_list": args.links_per_list, "latency_ms": args.latency_ms}
+    baseline_path = Path(args.baseline)
+    baseline: Dict[str, Any] = {}
+    if not args.save_baseline and not args.no_compare:
+        # 跑之前先檢查：沒有可比的 baseline 就直接失敗，不要跑完才默默 exit 0
+        try:
+            baseline = load_baseline(baseline_path, params, flows)
+        except ValueError as e:
+            parser.error(f"{e} (run --save-baseline on this machine first, or --no-compare to only print results)")
+
+    results: Dict[str, Any] = {}
+    with FixtureServer(site, latency_ms=args.latency_ms, pages_dir=args.pages_dir) as srv:
+        print(f"[INFO] fixture server at {srv.base_url}")
+        for flow in flows:
+            results[flow] = _run_flow(flow, srv.base_url, args)
+
+    _print_table(results, baseline)
+    doc = {"params": params, "python": sys.version.split()[0], "results": results}
+    if args.out:
+        Path(args.out).write_text(json.dumps(doc, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(doc, indent=2) + "\n", encoding="utf-8")
+        print(f"[DONE] baseline saved -> {baseline_path}")
+        return
+
+    problems = compare(results, baseline, args.tolerance)
+    for p in problems:
+        print(f"[REGRESSION] {p}")
+    if problems:
+        sys.exit(1)
+    if baseline:
+        print(f"[DONE] no regression beyond {args.tolerance:.0%} against {baseline_path}")
+    else:
+        print("[DONE] --no-compare: results not checked against a baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# browser_pool.py
+"""
+常駐的 Chromium pool：給 Flask /scrape 用，避免每個 request 都冷啟動瀏覽器。
+
+Playwright 的 sync API 綁定建立它的 thread，所以每個 browser 都由一條專屬
+worker thread 持有；呼叫端用 submit()/run() 把 fn(browser, ...) 丟進共用佇列，
+由任一條空閒的 worker 執行。browser 本身留著重用。
+
+context_cache=True 時每個 worker 另有一個 ContextCache（見 context_cache.py），
+任務裡用 context_cache() 取得目前 worker 的快取，同一個 storage_state 重用 context；
+否則任務自己開/關 context。
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from playwright.sync_api import sync_playwright
+
+from context_cache import ContextCache, cache_from_env
+
+LAUNCH_ARGS = [
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-blink-features=AutomationControlled",
+]
+
+log = logging.getLogger("browser_pool")
+
+_local = threading.local()
+
+
+def context_cache() -> Optional[ContextCache]:
+    """目前 worker thread 的 ContextCache；不在 pool 裡或沒開快取時回 None。"""
+    w = getattr(_local, "worker", None)
+    return w.contexts if w is not None else None
+
+
+class _Worker:
+    """One thread + one sync_playwright driver + one (recyclable) browser."""
+
+    def __init__(self, pool: "BrowserPool", idx: int):
+        self.pool = pool
+        self.idx = idx
+        self.browser = None
+        self.uses = 0
+        self.launches = 0
+        self.busy = False
+        self.contexts: Optional[ContextCache] = None
+        self.thread = threading.Thread(
+            target=self._loop, name=f"browser-pool-{idx}", daemon=True
+        )
+
+    def _launch(self, p):
+        self._close_browser()
+        t0 = time.monotonic()
+        self.browser = p.chromium.launch(headless=self.pool.headless, args=self.pool.launch_args)
+        self.uses = 0
+        self.launches += 1
+        if self.pool.context_cache is not None:
+            self.contexts = self.pool.context_cache()
+        log.info(f"[pool-{self.idx}] browser launched in {time.monotonic() - t0:.2f}s (launch #{self.launches})")
+
+    def _close_browser(self):
+        if self.contexts is not None:
+            # 先把 dirty 的 storage_state 寫回，再關 browser
+            try:
+                self.contexts.close()
+            except Exception as e:
+                log.warning(f"[pool-{self.idx}] context cache close failed: {e}")
+            self.contexts = None
+        if self.browser is None:
+            return
+        try:
+            self.browser.close()
+        except Exception:
+            pass
+        self.browser = None
+
+    def _healthy(self) -> bool:
+        try:
+            return self.browser is not None and self.browser.is_connected()
+        except Exception:
+            return False
+
+    def _maintain(self):
+        if self.contexts is not None:
+            try:
+                self.contexts.maintain()
+            except Exception as e:
+                log.warning(f"[pool-{self.idx}] context cache maintenance failed: {e}")
+
+    def _loop(self):
+        _local.worker = self
+        with sync_playwright() as p:
+            try:
+                self._launch(p)  # 先暖好，第一個 request 就不用等
+            except Exception as e:
+                log.warning(f"[pool-{self.idx}] initial launch failed: {e}")
+
+            while True:
+                try:
+                    item = self.pool._tasks.get(timeout=self.pool.health_interval)
+                except queue.Empty:
+                    self._maintain()
+                    # idle 時順便做健康檢查，掛掉就先重開
+                    if self.browser is not None and not self._healthy():
+                        log.info(f"[pool-{self.idx}] browser disconnected while idle; relaunching")
+                        try:
+                            self._launch(p)
+                        except Exception as e:
+                            log.warning(f"[pool-{self.idx}] relaunch failed: {e}")
+                            self.browser = None
+                    continue
+
+                if item is None:  # shutdown sentinel
+                    break
+
+                fn, args, kwargs, fut = item
+                if not fut.set_running_or_notify_cancel():
+                    continue
+
+                self.busy = True
+                try:
+                    if not self._healthy() or self.uses >= self.pool.max_uses:
+                        if self.browser is not None and self.uses >= self.pool.max_uses:
+                            log.info(f"[pool-{self.idx}] recycling browser after {self.uses} uses")
+                        self._launch(p)
+                    self.uses += 1
+                    fut.set_result(fn(self.browser, *args, **kwargs))
+                except BaseException as e:
+                    fut.set_exception(e)
+                finally:
+                    self.busy = False
+                    self._maintain()
+
+            self._close_browser()
+
+
+class BrowserPool:
+    """
+    size        : browser 數量（= 同時可跑的 scrape 數）
+    max_uses    : 每個 browser 跑幾次任務後回收重開（避免記憶體慢慢長大）
+    health_interval : idle 多久（秒）檢查一次 browser 是否還活著
+    context_cache   : 回傳 ContextCache 的 factory（每個 worker / 每次 launch 一個）；None 表示不快取
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_uses: int = 50,
+        headless: bool = True,
+        launch_args: Optional[List[str]] = None,
+        health_interval: float = 30.0,
+        context_cache: Optional[Callable[[], ContextCache]] = None,
+    ):
+        self.size = max(1, int(size))
+        self.max_uses = max(1, int(max_uses))
+        self.headless = headless
+        self.launch_args = list(launch_args or LAUNCH_ARGS)
+        self.health_interval = health_interval
+        self.context_cache = context_cache
+        self._tasks: "queue.Queue" = queue.Queue()
+        self._workers = [_Worker(self, i) for i in range(self.size)]
+        self._closed = False
+        for w in self._workers:
+            w.thread.start()
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """排入 fn(browser, *args, **kwargs)，回傳 Future。"""
+        if self._closed:
+            raise RuntimeError("BrowserPool is shut down")
+        fut: Future = Future()
+        self._tasks.put((fn, args, kwargs, fut))
+        return fut
+
+    def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """submit() 並等待結果；fn 裡丟出的例外會原樣丟回呼叫端。"""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "max_uses": self.max_uses,
+            "queued": self._tasks.qsize(),
+            "busy": sum(1 for w in self._workers if w.busy),
+            "launches": sum(w.launches for w in self._workers),
+            "uses": [w.uses for w in self._workers],
+            "contexts": [w.contexts.stats() for w in self._workers if w.contexts is not None],
+        }
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = 10.0):
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._workers:
+            self._tasks.put(None)
+        if wait:
+            for w in self._workers:
+                w.thread.join(timeout)
+
+
+def pool_from_env() -> BrowserPool:
+    """TA_POOL_SIZE / TA_POOL_MAX_USES 設定 pool 大小與回收次數；TA_CTX_CACHE=0 關閉 context 快取。"""
+    use_cache = os.environ.get("TA_CTX_CACHE", "1") not in ("0", "false", "no")
+    return BrowserPool(
+        size=int(os.environ.get("TA_POOL_SIZE", "2")),
+        max_uses=int(os.environ.get("TA_POOL_MAX_USES", "50")),
+        context_cache=cache_from_env if use_cache else None,
+    )
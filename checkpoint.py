@@ -0,0 +1,160 @@
+# checkpoint.py
+"""
+頁層級的續爬 checkpoint：append-only JSON lines，每爬完（寫出）一頁記一行。
+行程中途掛掉，重跑時同一個景點直接從下一頁開始，不必從第 1 頁重爬。
+
+    ckpt = PageCheckpoint("checkpoint_att.jsonl")
+    r = ckpt.resume(url)             # None，或 {"page": 17, "offset": 160, "key": "...", ...}
+    ckpt.page_done(url, attraction, page=18, offset=170, key=first_key, rows=10)
+    ckpt.url_done(url)               # 整個景點爬完；之後靠 processed_urls 跳過
+    ckpt.close()
+
+每行：
+    {"ts": 1723456789.1, "url": "<canonical>", "attraction": "...", "page": 18, "offset": 170, "key": "...", "rows": 10}
+    {"ts": 1723456801.4, "url": "<canonical>", "done": true}
+同一個 URL 以最後一行為準；url 用 review_store.canonical_url（去掉 -orN-），哪一頁的網址都對得上。
+key 是該頁第一張卡的 key（first_card_key），續爬時拿來判斷 offset 超出範圍被導回已爬過的頁。
+
+寫入：每行都 flush 到 OS（行程 crash 不會遺失）；fsync 批次做（每 fsync_every 行或 fsync_s 秒，
+url_done / close 一定做），斷電最多重爬 fsync_every 頁（有 TA_REVIEW_DB 時重複的評論會被濾掉）。
+最後一行寫到一半的（crash 當下）讀取時略過。
+開檔時若檔案裡大多是過時的行，就壓實成每個未完成 URL 一行（寫暫存檔 + fsync + rename）。
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from review_store import canonical_url
+
+
+def _replay(paths: Iterable[Path]) -> Tuple[Dict[str, Dict[str, Any]], int]:
+    """依序重放各檔，回傳 (未完成 URL -> 最後一筆, 最後一個檔的行數)。"""
+    state: Dict[str, Dict[str, Any]] = {}
+    for path in paths:
+        lines = 0
+        if not path.exists():
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    rec = json.loads(line)
+                    url = rec["url"]
+                except (ValueError, KeyError, TypeError):
+                    continue            # crash 時寫到一半的行
+                if rec.get("done"):
+                    state.pop(url, None)
+                else:
+                    state[url] = rec
+    return state, lines
+
+
+def _write_atomic(path: Path, records: Iterable[Dict[str, Any]]):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class PageCheckpoint:
+    """
+    path        : 寫入的 JSONL 檔
+    base        : 只讀的 checkpoint 檔（shard_runner 的 worker 讀主檔、寫自己的 shard 檔）
+    fsync_every : 每幾行 fsync 一次
+    fsync_s     : 距上次 fsync 超過幾秒就 fsync
+    """
+
+    def __init__(self, path, base=None, fsync_every: int = 20, fsync_s: float = 2.0, compact_min_lines: int = 1000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_s = fsync_s
+        self._lock = threading.Lock()
+        # base 在前、自己的檔在後：shard 檔裡的 done / 較新的頁蓋過主檔
+        self._state, lines = _replay(([Path(base)] if base else []) + [self.path])
+        if not base and lines >= compact_min_lines and lines > 2 * len(self._state):
+            self.compact()
+        self._f = open(self.path, "a", encoding="utf-8")
+        if self._f.tell() and not self._ends_with_newline():
+            self._f.write("\n")        # 上次 crash 留下半行，先補斷行免得黏到下一筆
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def compact(self):
+        """只留未完成的 URL，每個一行。"""
+        with self._lock:
+            _write_atomic(self.path, self._state.values())
+
+    def resume(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            rec = self._state.get(canonical_url(url))
+            return dict(rec) if rec else None
+
+    def pending(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(r) for r in self._state.values()]
+
+    def _append(self, rec: Dict[str, Any], sync: bool = False):
+        self._f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._f.flush()
+        self._unsynced += 1
+        if sync or self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_s:
+            os.fsync(self._f.fileno())
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def page_done(self, url: str, attraction: Optional[str], page: int, offset: Optional[int] = None,
+                  key: Optional[str] = None, rows: int = 0):
+        rec = {"ts": round(time.time(), 3), "url": canonical_url(url), "attraction": attraction,
+               "page": page, "offset": offset, "key": key, "rows": rows}
+        with self._lock:
+            self._state[rec["url"]] = rec
+            self._append(rec)
+
+    def url_done(self, url: str):
+        rec = {"ts": round(time.time(), 3), "url": canonical_url(url), "done": True}
+        with self._lock:
+            self._state.pop(rec["url"], None)
+            self._append(rec, sync=True)
+
+    def close(self):
+        with self._lock:
+            if self._f.closed:
+                return
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._f.close()
+
+
+def merge_checkpoints(path, shard_paths: Iterable) -> int:
+    """把 shard 的 checkpoint 併進主檔（壓實成每個未完成 URL 一行），併完刪掉 shard 檔；回傳未完成的 URL 數。"""
+    path = Path(path)
+    shard_paths = [Path(p) for p in shard_paths]
+    state, _ = _replay([path] + shard_paths)
+    _write_atomic(path, state.values())
+    for p in shard_paths:
+        p.unlink(missing_ok=True)
+    return len(state)
+
+
+def checkpoint_from_env(kind: str, path=None) -> Optional[PageCheckpoint]:
+    """
+    TA_CHECKPOINT：checkpoint 檔路徑（預設 checkpoint_<kind>.jsonl；設成 0 關閉）。
+    path：呼叫端指定檔名（例如 crawl_worker 每個 worker 一個檔），這時 TA_CHECKPOINT 只用來關閉。
+    一個檔只能有一個行程在寫：開檔時的壓實會 rename 掉別的行程正在 append 的檔。
+    """
+    env = os.environ.get("TA_CHECKPOINT", f"checkpoint_{kind}.jsonl")
+    if not env or env.lower() in ("0", "false", "no", "off"):
+        return None
+    return PageCheckpoint(Path(path or env).resolve())
@@ -0,0 +1,165 @@
+# context_cache.py
+"""
+BrowserContext 快取：同一個 storage_state 的 /scrape 重用同一個 context + page，
+不用每次重建 context、重跑 add_init_script、重讀 storage_state。
+
+Playwright sync API 綁 thread，所以每個 browser pool worker 各有一個 ContextCache，
+只在該 worker thread 上操作（見 browser_pool.context_cache()）。
+
+    page = cache.acquire(key, factory, flush_path)   # 命中就直接拿到 page
+    ...
+    cache.release(key, dirty=True)    # 成功：session 可能更新，等下次 flush 一起寫
+    cache.discard(key)                # 失敗（驗證頁等）：關掉、不寫回
+
+storage_state 不再每個 request 寫一次：dirty 的 entry 由 maintain()（worker idle 時呼叫）
+每 flush_interval 秒合併寫一次；LRU 淘汰、idle 逾時、browser 回收時也會寫。
+寫檔用 tmp + os.replace，同一路徑跨 worker 以鎖串行，不會寫出半個 JSON。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+log = logging.getLogger("context_cache")
+
+_path_locks: Dict[str, threading.Lock] = {}
+_path_locks_guard = threading.Lock()
+
+
+def _lock_for(path: str) -> threading.Lock:
+    with _path_locks_guard:
+        return _path_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def write_state(path: str, state: Dict[str, Any]):
+    """原子寫入 storage_state JSON。"""
+    d = os.path.dirname(os.path.abspath(path))
+    os.makedirs(d, exist_ok=True)
+    with _lock_for(path):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+
+class _Entry:
+    def __init__(self, context, page, flush_path: Optional[str]):
+        self.context = context
+        self.page = page
+        self.flush_path = flush_path
+        self.last_used = time.monotonic()
+        self.last_flush = time.monotonic()
+        self.dirty = False
+        self.uses = 0
+
+
+class ContextCache:
+    """
+    max_size       : 每個 worker 最多留幾個 context（LRU）
+    idle_ttl       : 多久沒用（秒）就關掉
+    flush_interval : dirty 的 storage_state 最短多久寫一次
+    """
+
+    def __init__(self, max_size: int = 4, idle_ttl: float = 600.0, flush_interval: float = 60.0):
+        self.max_size = max(1, int(max_size))
+        self.idle_ttl = idle_ttl
+        self.flush_interval = flush_interval
+        self._entries: "OrderedDict[Optional[str], _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flushes = 0
+
+    def acquire(self, key: Optional[str], factory: Callable[[], Any], flush_path: Optional[str] = None):
+        """回傳 key 對應的 page；沒有（或已壞掉）就用 factory() 建新的 context。"""
+        e = self._entries.get(key)
+        if e is not None:
+            try:
+                if e.page.is_closed():
+                    e.page = e.context.new_page()
+                self._entries.move_to_end(key)
+                e.last_used = time.monotonic()
+                e.uses += 1
+                self.hits += 1
+                return e.page
+            except Exception as ex:
+                log.info(f"cached context for {key!r} unusable ({ex}); recreating")
+                self._drop(key, flush=False)
+
+        self.misses += 1
+        while len(self._entries) >= self.max_size:
+            old_key = next(iter(self._entries))
+            self._drop(old_key, flush=True)
+            self.evictions += 1
+        context = factory()
+        e = _Entry(context, context.new_page(), flush_path)
+        e.uses = 1
+        self._entries[key] = e
+        return e.page
+
+    def release(self, key: Optional[str], dirty: bool = True):
+        e = self._entries.get(key)
+        if e is None:
+            return
+        e.last_used = time.monotonic()
+        e.dirty = e.dirty or dirty
+
+    def discard(self, key: Optional[str]):
+        """關掉、不寫回（例如 session 卡在驗證頁）。"""
+        if key in self._entries:
+            self._drop(key, flush=False)
+
+    def _flush(self, e: _Entry):
+        if not e.dirty or not e.flush_path:
+            return
+        try:
+            write_state(e.flush_path, e.context.storage_state())
+            self.flushes += 1
+        except Exception as ex:
+            log.warning(f"storage_state flush to {e.flush_path} failed: {ex}")
+        e.dirty = False
+        e.last_flush = time.monotonic()
+
+    def _drop(self, key: Optional[str], flush: bool):
+        e = self._entries.pop(key)
+        if flush:
+            self._flush(e)
+        try:
+            e.context.close()
+        except Exception:
+            pass
+
+    def maintain(self):
+        """worker idle 時呼叫：關掉閒置的 context、合併寫回到期的 storage_state。"""
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if now - e.last_used >= self.idle_ttl]:
+            self._drop(key, flush=True)
+            self.evictions += 1
+        for e in self._entries.values():
+            if e.dirty and now - e.last_flush >= self.flush_interval:
+                self._flush(e)
+
+    def close(self):
+        for key in list(self._entries):
+            self._drop(key, flush=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "contexts": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "flushes": self.flushes,
+        }
+
+
+def cache_from_env() -> ContextCache:
+    """TA_CTX_CACHE_SIZE / TA_CTX_IDLE_S / TA_CTX_FLUSH_S。"""
+    return ContextCache(
+        max_size=int(os.environ.get("TA_CTX_CACHE_SIZE", "4")),
+        idle_ttl=float(os.environ.get("TA_CTX_IDLE_S", "600")),
+        flush_interval=float(os.environ.get("TA_CTX_FLUSH_S", "60")),
+    )
@@ -0,0 +1,233 @@
+# crawl_worker.py
+"""
+分散式 worker：從共用的 URL frontier（frontier.py）領工作來爬，多個容器 / 多台機器可以同時跑同一個 frontier。
+
+    export TA_FRONTIER=redis://redis:6379/0          # 或 frontier.db（同一台機器 / 共用 volume）
+    python frontier.py seed TripAdv_Atts_List.json "https://www.tripadvisor.com/Attractions-g295415-Activities-oa0-Luang_Prabang_Luang_Prabang_Province.html"
+    python crawl_worker.py --headless                 # 每個容器跑一個
+    python frontier.py stats
+
+工作種類（frontier.kind_of 依 URL 判斷）：
+    att / food            評論頁：warmup_and_scrape(_food_reviews).run_same_context，逐頁寫進本機 CSV
+    att_list / food_list  清單頁：tripadv_*_list.run 抓出評論頁連結，加回 frontier
+
+每個 worker 的輸出寫在 --out-dir 下，檔名帶 worker id（TA_WORKER_ID，預設 hostname），
+共用 volume 時不會互相覆寫：reviews_<kind>.<worker>.csv、checkpoint_<kind>.<worker>.jsonl、
+<kind>.<worker>.json（清單頁結果）。
+
+lease：爬評論頁時每寫出一頁就視需要延長；lease 被別人領走（逾時太久）就放棄這個 URL。
+失敗（含驗證頁：容器裡沒有 stdin，input() 直接 EOFError）交給 frontier 的重試 / dead 處理。
+Ctrl-C / SIGTERM：把手上的 lease 立刻放回佇列再結束。
+TA_HOST_INTERVAL 是每個 worker 自己的間隔，N 個 worker 對同一個 host 的總速率是 N 倍，請跟著放大。
+其他 TA_*（TA_REVIEW_DB、TA_INCREMENTAL、TA_PAGINATE、TA_TABS、TA_PARSE_MODE、TA_BLOCK_*…）與 cli 相同；
+TA_CHECKPOINT=0 關閉 checkpoint（檔名固定如上）。
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from frontier import KINDS, Frontier, Lease, frontier_from_env
+from review_sinks import Sink
+
+SCRAPERS = {"att": "warmup_and_scrape", "food": "warmup_and_scrape_food_reviews"}
+LISTERS = {"att_list": ("tripadv_att_list", "att"), "food_list": ("tripadv_food_list", "food")}
+
+
+class LeaseLost(RuntimeError):
+    pass
+
+
+class _LeaseKeeper(Sink):
+    """每寫出一頁就檢查 lease，過了一半的 visibility 就延長；延長失敗代表別人已經領走，中止這個 URL。"""
+
+    def __init__(self, frontier: Frontier):
+        super().__init__()
+        self.frontier = frontier
+        self.lease: Optional[Lease] = None
+
+    def keep_alive(self):
+        lease = self.lease
+        if lease is None or time.time() < lease.deadline - self.frontier.visibility / 2:
+            return
+        if not self.frontier.extend(lease):
+            raise LeaseLost(f"lease on {lease.url} expired and was taken by another worker")
+
+    def write(self, batch: List[Dict[str, Any]]):
+        self.keep_alive()
+        self.rows += len(batch)
+
+
+def _run_async(keeper: _LeaseKeeper, fn, *args, **kwargs):
+    """清單頁的爬蟲是 async API，放到另一個 thread 跑（sync Playwright 佔著這個 thread），等待時順便延長 lease。"""
+    box: Dict[str, Any] = {}
+
+    def target():
+        try:
+            box["out"] = asyncio.run(fn(*args, **kwargs))
+        except BaseException as e:
+            box["err"] = e
+
+    t = threading.Thread(target=target, name="lister", daemon=True)
+    t.start()
+    while t.is_alive():
+        t.join(timeout=max(1.0, keeper.frontier.visibility / 4))
+        keeper.keep_alive()
+    if "err" in box:
+        raise box["err"]
+    return box.get("out")
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pull URLs from the shared frontier (TA_FRONTIER) and crawl them.")
+    parser.add_argument("--kinds", default=",".join(KINDS), help=f"comma separated, in priority order (default: {','.join(KINDS)})")
+    parser.add_argument("--out-dir", default=".", help="per-worker CSV / list JSON go here")
+    parser.add_argument("--state", default="ta_state.json", help="storage_state to start from (if it exists)")
+    parser.add_argument("--debug-dir", help="save a screenshot per page here (off by default)")
+    parser.add_argument("--max-pages", type=int, default=300)
+    parser.add_argument("--timeout-ms", type=int, default=15000)
+    parser.add_argument("--poll", type=float, default=10.0, help="seconds to sleep when nothing is ready")
+    parser.add_argument("--exit-when-empty", action="store_true", help="stop once nothing is pending or leased")
+    parser.add_argument("--headless", action="store_true")
+    args = parser.parse_args()
+
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()]
+    unknown = [k for k in kinds if k not in KINDS]
+    if unknown:
+        parser.error(f"unknown kinds: {unknown}")
+    frontier = frontier_from_env()
+    if frontier is None:
+        parser.error("set TA_FRONTIER (redis://host:6379/0 or a SQLite file path)")
+
+    from playwright.sync_api import sync_playwright
+
+    from checkpoint import checkpoint_from_env
+    from rate_limit import HostRateLimiter
+    from resource_block import policy_from_env
+    from review_sinks import CsvSink, ParquetSink
+    from review_store import ReviewStore
+    from scrape_core import new_context
+    from timing import timings
+
+    worker = os.environ.get("TA_WORKER_ID") or socket.gethostname()
+    out_dir = Path(args.out_dir).resolve()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    keeper = _LeaseKeeper(frontier)
+    sinks: Dict[str, List[Sink]] = {}
+    checkpoints: Dict[str, Any] = {}
+    review_db = os.environ.get("TA_REVIEW_DB")
+    store = ReviewStore(Path(review_db).resolve()) if review_db else None
+    incremental = store is not None and os.environ.get("TA_INCREMENTAL", "0") in ("1", "true", "yes")
+    limiter = HostRateLimiter(float(os.environ.get("TA_HOST_INTERVAL", "1.0")), jitter=0.5)
+    paginate = os.environ.get("TA_PAGINATE", "url")
+    tabs = max(1, int(os.environ.get("TA_TABS", "1")))
+    parquet_dir = os.environ.get("TA_PARQUET_DIR")
+    state = Path(args.state).resolve()
+
+    def sinks_for(kind: str) -> List[Sink]:
+        # keeper 放第一個：lease 已經被別人領走時，這頁不要再寫
+        if kind not in sinks:
+            sinks[kind] = [keeper, CsvSink(out_dir / f"reviews_{kind}.{worker}.csv", append=True)]
+            if parquet_dir:
+                sinks[kind].append(ParquetSink(Path(parquet_dir).resolve()))
+            # checkpoint 也要每個 worker 一個檔：共用一個檔時，開檔壓實的 rename 會讓別人的 append 寫進已刪掉的檔
+            checkpoints[kind] = checkpoint_from_env(kind, out_dir / f"checkpoint_{kind}.{worker}.jsonl")
+        return sinks[kind]
+
+    print(f"[INFO] worker={worker} frontier={os.environ.get('TA_FRONTIER')} kinds={kinds} out_dir={out_dir}")
+    print(f"[INFO] frontier: {frontier.stats()}")
+    signal.signal(signal.SIGTERM, _interrupt)     # docker stop
+    done = failed = 0
+    lease: Optional[Lease] = None
+    try:
+        with sync_playwright() as p:
+            browser = p.chromium.launch(headless=args.headless, args=["--disable-blink-features=AutomationControlled"])
+            block = policy_from_env()
+            ctx = new_context(browser, storage_state=str(state) if state.exists() else None, block=block)
+            page = ctx.new_page()
+            page.set_default_timeout(args.timeout_ms)
+            while True:
+                lease = frontier.lease(kinds)
+                if lease is None:
+                    s = frontier.stats()
+                    if args.exit_when_empty and s["pending"] + s["leased"] == 0:
+                        print("[INFO] frontier is empty. Stop.")
+                        break
+                    time.sleep(args.poll)
+                    continue
+                keeper.lease = lease
+                print(f"[INFO] 處理 URL: {lease.url} ({lease.kind}, attempt {lease.attempt})")
+                try:
+                    with timings.scope(url=lease.url):
+                        if lease.kind in LISTERS:
+                            mod_name, link_kind = LISTERS[lease.kind]
+                            mod = importlib.import_module(mod_name)
+                            out = _run_async(keeper, mod.run, lease.url, headless=args.headless, channel=None,
+                                             outfile=str(out_dir / f"{lease.kind}.{worker}.json"))
+                            links = (out or {}).get("links") or []
+                            print(f"[INFO] {frontier.add(links, kind=link_kind)} of {len(links)} links are new")
+                        else:
+                            mod = importlib.import_module(SCRAPERS[lease.kind])
+                            n = mod.run_same_context(
+                                target=lease.url, max_pages=args.max_pages, timeout_ms=args.timeout_ms,
+                                debug_dir=Path(args.debug_dir).resolve() if args.debug_dir else None,
+                                out_json=None, out_csv=None, page=page, sinks=sinks_for(lease.kind),
+                                store=store, incremental=incremental, paginate=paginate, tabs=tabs,
+                                limiter=limiter, checkpoint=checkpoints[lease.kind],
+                            )
+                            print(f"[INFO] {n} reviews appended for {lease.url}")
+                except LeaseLost as e:
+                    print(f"[WARN] {e}; skip")
+                    lease = None
+                    continue
+                except Exception as e:
+                    msg = f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+                    status = frontier.fail(lease, msg)
+                    print(f"[WARN] {lease.url} failed ({msg}) -> {status}")
+                    failed += 1
+                    lease = None
+                    continue
+                if not frontier.done(lease):
+                    print(f"[WARN] lease on {lease.url} was lost before done; another worker may crawl it again")
+                done += 1
+                lease = None
+            try:
+                ctx.storage_state(path=str(state))
+            except Exception as e:
+                print(f"[WARN] Save storage state failed: {e}")
+            browser.close()
+    except KeyboardInterrupt:
+        print("\n[INFO] interrupted")
+        if lease is not None:
+            frontier.extend(lease, 0)       # 立刻放回佇列給別的 worker
+    finally:
+        for kind_sinks in sinks.values():
+            for s in kind_sinks:
+                s.close()
+        for ckpt in checkpoints.values():
+            if ckpt is not None:
+                ckpt.close()
+        if store is not None:
+            store.close()
+        print(f"[DONE] worker={worker}: {done} done, {failed} failed; frontier: {frontier.stats()}")
+        frontier.close()
+        timings.print_summary()
+        timings.close()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
@@ -0,0 +1,517 @@
+# frontier.py
+"""
+多個爬蟲容器共用的 URL frontier：景點 / 餐廳評論頁與清單頁都放在這裡，worker 用 lease 領工作。
+
+    fr = frontier_from_env()                     # TA_FRONTIER=frontier.db 或 redis://host:6379/0
+    fr.add(urls)                                 # kind 依 URL 判斷（見 kind_of），已經有的不會重複加
+    lease = fr.lease(["att_list", "att"])        # 沒有可領的回 None
+    ...爬 lease.url，途中 fr.extend(lease) 延長...
+    fr.done(lease)     或   fr.fail(lease, "TimeoutError: ...")
+
+語意和 SQS 類似：
+    - lease 之後該 URL 在 visibility 秒內對其他 worker 不可見；worker 掛掉、沒有 done / fail，
+      時間到就自動回到佇列給別人領（所以同一時間只有一個 worker 在爬同一個 URL）。
+    - 每次 lease 都算一次嘗試；fail 之後隔 retry_delay * 2^(n-1) 秒再放回佇列，
+      嘗試滿 max_attempts 次就移到 dead，requeue() 可以再放回來。
+    - done / fail / extend 都要帶著 lease 的 token；lease 已過期並被別人領走時回 False / "lost"。
+    - URL 一律 canonical_url（去掉 -orN-、query、#fragment），同一個景點不會重複排進來。
+
+後端：
+    FileFrontier   SQLite 檔（WAL + busy_timeout，同一台機器上多個行程 / 共用 volume 的容器）
+    RedisFrontier  Redis（或相容的 Valkey / KeyDB；需要 redis 套件），跨節點用。
+                   client= 可以傳 fakeredis.FakeRedis() 在本機測。
+"""
+import os
+import re
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from review_store import canonical_url
+
+# 預設領工作的順序：先清單頁（產生更多評論頁），再評論頁
+KINDS = ("att_list", "food_list", "att", "food")
+
+_KIND_RES = (
+    ("att", re.compile(r"/Attraction_Review-")),
+    ("food", re.compile(r"/Restaurant_Review-")),
+    ("att_list", re.compile(r"/Attractions-")),
+    ("food_list", re.compile(r"/Restaurants-")),
+)
+
+
+def kind_of(url: str) -> Optional[str]:
+    """Attraction_Review -> att、Restaurant_Review -> food、Attractions- / Restaurants- 清單頁 -> *_list。"""
+    for kind, rx in _KIND_RES:
+        if rx.search(url or ""):
+            return kind
+    return None
+
+
+class Lease:
+    def __init__(self, url: str, kind: str, token: str, attempt: int, deadline: float):
+        self.url = url
+        self.kind = kind
+        self.token = token
+        self.attempt = attempt        # 第幾次嘗試（從 1 開始）
+        self.deadline = deadline      # 過了這個時間（time.time()）別的 worker 就能再領
+
+    def __repr__(self):
+        return f"Lease({self.kind} {self.url} attempt={self.attempt})"
+
+
+class Frontier(ABC):
+    """
+    visibility   : lease 多久沒 done / fail / extend 就放回佇列（秒）
+    max_attempts : 最多領幾次，超過就進 dead
+    retry_delay  : fail 後第一次重試的延遲（秒），之後每次加倍
+    """
+
+    def __init__(self, visibility: float = 1800.0, max_attempts: int = 3, retry_delay: float = 60.0):
+        self.visibility = float(visibility)
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_delay = float(retry_delay)
+
+    def _backoff(self, attempts: int) -> float:
+        return self.retry_delay * (2 ** max(0, attempts - 1))
+
+    @staticmethod
+    def _items(urls: Iterable[str], kind: Optional[str]) -> Dict[str, str]:
+        items: Dict[str, str] = {}
+        for u in urls:
+            url = canonical_url((u or "").strip())
+            k = kind or kind_of(url)
+            if not url or not k:
+                print(f"[WARN] frontier: skip {u!r} (unknown kind)")
+                continue
+            items.setdefault(url, k)
+        return items
+
+    @abstractmethod
+    def add(self, urls: Iterable[str], kind: Optional[str] = None) -> int:
+        """加入新的 URL（已在 frontier 裡的，不論狀態都不動），回傳新增數。"""
+        ...
+
+    @abstractmethod
+    def lease(self, kinds: Optional[Sequence[str]] = None) -> Optional[Lease]:
+        ...
+
+    @abstractmethod
+    def extend(self, lease: Lease, seconds: Optional[float] = None) -> bool:
+        """延長 lease（預設再給 visibility 秒）；seconds=0 等於立刻放回佇列。"""
+        ...
+
+    @abstractmethod
+    def done(self, lease: Lease) -> bool:
+        ...
+
+    @abstractmethod
+    def fail(self, lease: Lease, error: str = "") -> str:
+        """回傳 "retry"、"dead" 或 "lost"（lease 已過期並被別人領走）。"""
+        ...
+
+    @abstractmethod
+    def requeue(self, status: str = "dead", kinds: Optional[Sequence[str]] = None) -> int:
+        """把 dead（或 done，例如每週增量重爬）的 URL 放回佇列、嘗試次數歸零。"""
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """{"pending", "leased", "done", "dead"}"""
+        ...
+
+    def close(self):
+        pass
+
+
+# ---------- SQLite ----------
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    url TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    visible_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    token TEXT,
+    error TEXT,
+    added_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_frontier_ready ON frontier(status, kind, visible_at);
+"""
+
+
+class FileFrontier(Frontier):
+    """status 只有 pending / done / dead；lease 中的是 pending、帶 token、visible_at 在未來。"""
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def _tx(self, fn):
+        # BEGIN IMMEDIATE 先拿寫鎖，多個行程同時 lease 也不會領到同一筆
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(self._db)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            return out
+
+    def add(self, urls: Iterable[str], kind: Optional[str] = None) -> int:
+        now = time.time()
+        rows = [(u, k, now, now, now) for u, k in self._items(urls, kind).items()]
+
+        def run(db):
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO frontier (url, kind, visible_at, added_at, updated_at) VALUES (?, ?, ?, ?, ?)", rows)
+            return db.total_changes - before
+        return self._tx(run) if rows else 0
+
+    def lease(self, kinds: Optional[Sequence[str]] = None) -> Optional[Lease]:
+        def run(db):
+            now = time.time()
+            for kind in kinds or KINDS:
+                while True:
+                    row = db.execute(
+                        "SELECT url, attempts, error FROM frontier WHERE status = 'pending' AND kind = ? "
+                        "AND visible_at <= ? ORDER BY visible_at LIMIT 1", (kind, now)).fetchone()
+                    if row is None:
+                        break
+                    url, attempts, error = row
+                    if attempts >= self.max_attempts:
+                        # 最後一次 lease 過期都沒回報：worker 多半在這個 URL 上掛掉
+                        db.execute("UPDATE frontier SET status = 'dead', token = NULL, error = ?, updated_at = ? "
+                                   "WHERE url = ?", (error or "lease expired", now, url))
+                        continue
+                    token = uuid.uuid4().hex
+                    deadline = now + self.visibility
+                    db.execute("UPDATE frontier SET visible_at = ?, attempts = attempts + 1, token = ?, updated_at = ? "
+                               "WHERE url = ?", (deadline, token, now, url))
+                    return Lease(url, kind, token, attempts + 1, deadline)
+            return None
+        return self._tx(run)
+
+    def extend(self, lease: Lease, seconds: Optional[float] = None) -> bool:
+        deadline = time.time() + (self.visibility if seconds is None else seconds)
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE frontier SET visible_at = ?, updated_at = ? WHERE url = ? AND token = ? AND status = 'pending'",
+                (deadline, time.time(), lease.url, lease.token))
+        if cur.rowcount:
+            lease.deadline = deadline
+        return bool(cur.rowcount)
+
+    def done(self, lease: Lease) -> bool:
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE frontier SET status = 'done', token = NULL, error = NULL, updated_at = ? "
+                "WHERE url = ? AND token = ? AND status = 'pending'", (time.time(), lease.url, lease.token))
+        return bool(cur.rowcount)
+
+    def fail(self, lease: Lease, error: str = "") -> str:
+        def run(db):
+            now = time.time()
+            row = db.execute("SELECT attempts FROM frontier WHERE url = ? AND token = ? AND status = 'pending'",
+                             (lease.url, lease.token)).fetchone()
+            if row is None:
+                return "lost"
+            if row[0] >= self.max_attempts:
+                db.execute("UPDATE frontier SET status = 'dead', token = NULL, error = ?, updated_at = ? WHERE url = ?",
+                           (error, now, lease.url))
+                return "dead"
+            db.execute("UPDATE frontier SET visible_at = ?, token = NULL, error = ?, updated_at = ? WHERE url = ?",
+                       (now + self._backoff(row[0]), error, now, lease.url))
+            return "retry"
+        return self._tx(run)
+
+    def requeue(self, status: str = "dead", kinds: Optional[Sequence[str]] = None) -> int:
+        kinds = list(kinds or KINDS)
+        now = time.time()
+
+        def run(db):
+            return db.execute(
+                f"UPDATE frontier SET status = 'pending', attempts = 0, token = NULL, error = NULL, visible_at = ?, "
+                f"updated_at = ? WHERE status = ? AND kind IN ({', '.join('?' for _ in kinds)})",
+                (now, now, status, *kinds)).rowcount
+        return self._tx(run)
+
+    def stats(self) -> Dict[str, int]:
+        out = {"pending": 0, "leased": 0, "done": 0, "dead": 0}
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, token IS NOT NULL AND visible_at > ?, COUNT(*) FROM frontier GROUP BY 1, 2",
+                (time.time(),)).fetchall()
+        for status, leased, n in rows:
+            out["leased" if status == "pending" and leased else status] += n
+        return out
+
+    def close(self):
+        with self._lock:
+            try:
+                self._db.close()
+            except sqlite3.ProgrammingError:
+                pass
+
+
+# ---------- Redis（選用） ----------
+
+def _require_redis():
+    try:
+        import redis
+    except ImportError as e:
+        raise ImportError("Redis frontier needs the redis package: pip install redis") from e
+    return redis
+
+
+class RedisFrontier(Frontier):
+    """
+    <prefix>:q:<kind>  ZSET url -> 可被領的時間；lease 中的分數是到期時間，過期自然又可被領
+    <prefix>:kind      HASH url -> kind（加過的 URL 都在這裡，add 用來去重）
+    <prefix>:attempts  HASH url -> 嘗試次數
+    <prefix>:lease     HASH url -> token
+    <prefix>:error     HASH url -> 最後一次的錯誤
+    <prefix>:done      SET
+    <prefix>:dead      SET
+    狀態轉換都用 WATCH / MULTI，多個 worker 同時 lease 時輸的一方重試。
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "ta:frontier", client=None, **kwargs):
+        super().__init__(**kwargs)
+        redis = _require_redis()
+        self._WatchError = redis.exceptions.WatchError
+        self.r = client if client is not None else redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def _k(self, *parts: str) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    def _watch(self, keys: List[str], fn):
+        """fn(pipe) 在 WATCH 之後讀、pipe.multi() 之後寫；被別的 worker 搶先改到就整段重來。"""
+        while True:
+            with self.r.pipeline() as pipe:
+                try:
+                    pipe.watch(*keys)
+                    out = fn(pipe)
+                    if pipe.explicit_transaction:
+                        pipe.execute()
+                    return out
+                except self._WatchError:
+                    continue
+
+    @staticmethod
+    def _s(v) -> Optional[str]:
+        return v.decode("utf-8") if isinstance(v, bytes) else v
+
+    def add(self, urls: Iterable[str], kind: Optional[str] = None) -> int:
+        items = list(self._items(urls, kind).items())
+        added = 0
+        for i in range(0, len(items), 500):
+            chunk = items[i:i + 500]
+            known = self.r.hmget(self._k("kind"), [u for u, _ in chunk])
+            new = [(u, k) for (u, k), seen in zip(chunk, known) if seen is None]
+            if not new:
+                continue
+            now = time.time()
+            pipe = self.r.pipeline()        # MULTI：kind 與佇列一起寫進去
+            for u, k in new:
+                pipe.hsetnx(self._k("kind"), u, k)
+                pipe.zadd(self._k("q", k), {u: now}, nx=True)
+            res = pipe.execute()
+            added += sum(1 for r in res[0::2] if r)
+        return added
+
+    def lease(self, kinds: Optional[Sequence[str]] = None) -> Optional[Lease]:
+        for kind in kinds or KINDS:
+            q = self._k("q", kind)
+
+            def run(pipe):
+                now = time.time()
+                hit = pipe.zrangebyscore(q, "-inf", now, start=0, num=1)
+                if not hit:
+                    return None
+                url = self._s(hit[0])
+                attempts = int(pipe.hget(self._k("attempts"), url) or 0)
+                pipe.multi()
+                if attempts >= self.max_attempts:
+                    pipe.zrem(q, url)
+                    pipe.hdel(self._k("lease"), url)
+                    pipe.sadd(self._k("dead"), url)
+                    pipe.hsetnx(self._k("error"), url, "lease expired")
+                    return "dead"
+                token = uuid.uuid4().hex
+                deadline = now + self.visibility
+                pipe.zadd(q, {url: deadline})
+                pipe.hincrby(self._k("attempts"), url, 1)
+                pipe.hset(self._k("lease"), url, token)
+                return Lease(url, kind, token, attempts + 1, deadline)
+
+            while True:
+                out = self._watch([q], run)
+                if out != "dead":
+                    break
+            if out is not None:
+                return out
+        return None
+
+    def _owned(self, pipe, lease: Lease) -> bool:
+        return self._s(pipe.hget(self._k("lease"), lease.url)) == lease.token
+
+    def extend(self, lease: Lease, seconds: Optional[float] = None) -> bool:
+        deadline = time.time() + (self.visibility if seconds is None else seconds)
+
+        def run(pipe):
+            if not self._owned(pipe, lease):
+                return False
+            pipe.multi()
+            pipe.zadd(self._k("q", lease.kind), {lease.url: deadline}, xx=True)
+            return True
+        ok = self._watch([self._k("lease")], run)
+        if ok:
+            lease.deadline = deadline
+        return ok
+
+    def done(self, lease: Lease) -> bool:
+        def run(pipe):
+            if not self._owned(pipe, lease):
+                return False
+            pipe.multi()
+            pipe.zrem(self._k("q", lease.kind), lease.url)
+            pipe.hdel(self._k("lease"), lease.url)
+            pipe.hdel(self._k("attempts"), lease.url)
+            pipe.hdel(self._k("error"), lease.url)
+            pipe.sadd(self._k("done"), lease.url)
+            return True
+        return self._watch([self._k("lease")], run)
+
+    def fail(self, lease: Lease, error: str = "") -> str:
+        def run(pipe):
+            if not self._owned(pipe, lease):
+                return "lost"
+            attempts = int(pipe.hget(self._k("attempts"), lease.url) or 0)
+            pipe.multi()
+            pipe.hdel(self._k("lease"), lease.url)
+            pipe.hset(self._k("error"), lease.url, error)
+            if attempts >= self.max_attempts:
+                pipe.zrem(self._k("q", lease.kind), lease.url)
+                pipe.sadd(self._k("dead"), lease.url)
+                return "dead"
+            pipe.zadd(self._k("q", lease.kind), {lease.url: time.time() + self._backoff(attempts)})
+            return "retry"
+        return self._watch([self._k("lease")], run)
+
+    def requeue(self, status: str = "dead", kinds: Optional[Sequence[str]] = None) -> int:
+        src = self._k(status)
+        kinds = set(kinds or KINDS)
+
+        def run(pipe):
+            urls = [self._s(u) for u in pipe.smembers(src)]
+            item_kinds = pipe.hmget(self._k("kind"), urls) if urls else []
+            picked = [(u, self._s(k)) for u, k in zip(urls, item_kinds) if self._s(k) in kinds]
+            pipe.multi()
+            now = time.time()
+            for u, k in picked:
+                pipe.srem(src, u)
+                pipe.hdel(self._k("attempts"), u)
+                pipe.hdel(self._k("error"), u)
+                pipe.zadd(self._k("q", k), {u: now})
+            return len(picked)
+        return self._watch([src], run)
+
+    def stats(self) -> Dict[str, int]:
+        pipe = self.r.pipeline(transaction=False)
+        for kind in KINDS:
+            pipe.zcard(self._k("q", kind))
+        pipe.hlen(self._k("lease"))
+        pipe.scard(self._k("done"))
+        pipe.scard(self._k("dead"))
+        *queued, leased, done, dead = pipe.execute()
+        # 過期但還沒被重領的 lease 仍算 leased
+        return {"pending": sum(queued) - leased, "leased": leased, "done": done, "dead": dead}
+
+    def close(self):
+        try:
+            self.r.close()
+        except Exception:
+            pass
+
+
+def frontier_from_env() -> Optional[Frontier]:
+    """
+    TA_FRONTIER                 : redis://… / rediss://… 用 RedisFrontier，其他當 SQLite 檔路徑；沒設回 None
+    TA_FRONTIER_PREFIX          : Redis key 前綴（預設 ta:frontier）
+    TA_FRONTIER_VISIBILITY      : lease 逾時秒數（預設 1800）
+    TA_FRONTIER_MAX_ATTEMPTS    : 最多嘗試次數（預設 3）
+    TA_FRONTIER_RETRY_DELAY     : 第一次重試延遲秒數（預設 60，之後加倍）
+    """
+    target = os.environ.get("TA_FRONTIER")
+    if not target:
+        return None
+    kwargs = {
+        "visibility": float(os.environ.get("TA_FRONTIER_VISIBILITY", "1800")),
+        "max_attempts": int(os.environ.get("TA_FRONTIER_MAX_ATTEMPTS", "3")),
+        "retry_delay": float(os.environ.get("TA_FRONTIER_RETRY_DELAY", "60")),
+    }
+    if target.startswith(("redis://", "rediss://", "unix://")):
+        return RedisFrontier(target, prefix=os.environ.get("TA_FRONTIER_PREFIX", "ta:frontier"), **kwargs)
+    return FileFrontier(Path(target).resolve(), **kwargs)
+
+
+def _main():
+    """管理用：seed / stats / requeue（worker 見 crawl_worker.py）。"""
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Shared URL frontier (TA_FRONTIER=frontier.db or redis://...).")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_seed = sub.add_parser("seed", help="add URLs from JSON lists (list of URLs or {'links': [...]}), text files or args")
+    p_seed.add_argument("inputs", nargs="+")
+    p_seed.add_argument("--kind", choices=KINDS, help="default: guessed from each URL")
+    sub.add_parser("stats")
+    p_re = sub.add_parser("requeue", help="put dead (or --done) URLs back into the queue")
+    p_re.add_argument("--done", action="store_true", help="requeue finished URLs (periodic re-crawl)")
+    p_re.add_argument("--kind", choices=KINDS, action="append")
+    args = parser.parse_args()
+
+    fr = frontier_from_env()
+    if fr is None:
+        parser.error("set TA_FRONTIER")
+    try:
+        if args.cmd == "seed":
+            urls: List[Any] = []
+            for src in args.inputs:
+                if "://" in src:
+                    urls.append(src)
+                elif src.endswith(".json"):
+                    with open(src, encoding="utf-8") as f:
+                        data = json.load(f)
+                    urls.extend(data["links"] if isinstance(data, dict) else data)
+                else:
+                    with open(src, encoding="utf-8") as f:
+                        urls.extend(line.strip() for line in f if line.strip())
+            print(f"[INFO] {fr.add(urls, kind=args.kind)} of {len(urls)} URLs added")
+        elif args.cmd == "requeue":
+            n = fr.requeue("done" if args.done else "dead", kinds=args.kind)
+            print(f"[INFO] {n} URLs requeued")
+        print(f"[INFO] frontier: {fr.stats()}")
+    finally:
+        fr.close()
+
+
+if __name__ == "__main__":
+    _main()
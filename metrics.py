@@ -0,0 +1,205 @@
+# metrics.py
+"""
+極簡的 Prometheus metrics registry（text exposition format 0.0.4），不另外裝 prometheus_client。
+
+    REQUESTS = counter("ta_scrapes_total", "Scrapes by outcome.", ["outcome"])
+    REQUESTS.inc(outcome="ok")
+    PAGE_SECONDS = histogram("ta_page_seconds", "Per-page latency.", buckets=(0.5, 1, 2, 5))
+    PAGE_SECONDS.observe(1.3)
+    gauge_func("ta_jobs_in_flight", "Jobs not finished yet.", lambda: jobs.in_flight())
+
+    body = render()        # GET /metrics 的內容
+
+寫入只在一把鎖裡加幾個數字；render() 只走過既有的 series，每 15 秒被抓一次也很便宜。
+*_func 的值在 render 時才呼叫 callback 取得（例如 pool 的 launch 次數），不必在別處同步更新。
+"""
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        if not self.labelnames:
+            self._values[()] = 0.0      # 沒有 label 的從 0 開始輸出，rate() 才算得出第一段
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("counters only go up")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets)) + (math.inf,)
+        # 每個 series：[各 bucket 的非累計次數..., sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        if not self.labelnames:
+            self._series[()] = [0.0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = 0
+        while value > self.buckets[i]:
+            i += 1
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0.0] * (len(self.buckets) + 1)
+            s[i] += 1
+            s[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        out = self._header()
+        for key, s in items:
+            acc = 0.0
+            for b, n in zip(self.buckets, s):
+                acc += n
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, ('le', _fmt(b)))} {_fmt(acc)}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(s[-1])}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {_fmt(acc)}")
+        return out
+
+
+class _FuncMetric(_Metric):
+    """render 時才呼叫 fn() 取值；fn 丟例外就略過這個 metric。"""
+
+    def __init__(self, name: str, help: str, kind: str, fn: Callable[[], float]):
+        super().__init__(name, help)
+        self.kind = kind
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            v = float(self.fn())
+        except Exception:
+            return []
+        return self._header() + [f"{self.name} {_fmt(v)}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, m: _Metric) -> _Metric:
+        with self._lock:
+            if m.name in self._metrics:
+                raise ValueError(f"metric {m.name} already registered")
+            self._metrics[m.name] = m
+        return m
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for m in metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labelnames: Iterable[str] = (), registry: Registry = REGISTRY) -> Counter:
+    return registry.register(Counter(name, help, labelnames))
+
+
+def gauge(name: str, help: str, labelnames: Iterable[str] = (), registry: Registry = REGISTRY) -> Gauge:
+    return registry.register(Gauge(name, help, labelnames))
+
+
+def histogram(name: str, help: str, labelnames: Iterable[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS,
+              registry: Registry = REGISTRY) -> Histogram:
+    return registry.register(Histogram(name, help, labelnames, buckets))
+
+
+def counter_func(name: str, help: str, fn: Callable[[], float], registry: Registry = REGISTRY) -> _Metric:
+    return registry.register(_FuncMetric(name, help, "counter", fn))
+
+
+def gauge_func(name: str, help: str, fn: Callable[[], float], registry: Registry = REGISTRY) -> _Metric:
+    return registry.register(_FuncMetric(name, help, "gauge", fn))
+
+
+def render(registry: Registry = REGISTRY) -> str:
+    return registry.render()
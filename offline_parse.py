@@ -0,0 +1,356 @@
+# offline_parse.py
+"""
+離線解析：直接吃存下來的 HTML（page.content() / ta_*.html / debug dump），
+不需要開瀏覽器。欄位規則跟 parse_current_page 一樣——這裡用 lxml 收集
+與 review_extract.CARDS_JS 相同格式的 raw 值，再交給同一個 review_from_raw。
+
+用法：
+    python offline_parse.py /data/shared/ta_*.html --out reviews_offline.csv
+    python offline_parse.py snapshots/ --profile food --workers 8 --out food.json
+
+限制：沒有 layout，innerText 以 textContent 近似（<br>/區塊元素換行、
+略過 script/style）；get_by_role('link') 的隱藏判斷只看 aria-hidden /
+hidden / inline display:none。
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import lxml.html
+from cssselect import HTMLTranslator
+from lxml import etree
+
+from review_extract import (APP_CARDS_SEL, APP_TEXT_SEL, ATT_CARDS_SEL, BUBBLES_SEL, LANG_SEL, LOCATION_SEL,
+                            NAV_SEL, NAV_SPAN_SEL, PROFILES, RATING_ALT_SEL, RATING_SVG_SEL, TEXT_BLOCK_SEL,
+                            TEXT_LANG_SEL, WS_RE, review_from_raw)
+
+_translator = HTMLTranslator()
+
+_BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "dd", "div", "dl", "dt", "fieldset",
+    "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6",
+    "header", "hr", "li", "main", "nav", "ol", "p", "pre", "section", "table",
+    "tr", "ul",
+}
+_SKIP_TAGS = {"script", "style", "noscript", "template", "head"}
+
+_RESP_ATTR = "[data-automation*='Response'], [data-test-target*='response']"
+_RESP_TEXT = ("response from", "management response", "owner response")
+
+
+_SCOPE_RE = re.compile(r":scope\s+")
+_HSPACE_RE = re.compile(r"[ \t\r\f\v]+")
+
+
+@lru_cache(maxsize=None)
+def _xpath(sel: str) -> etree.XPath:
+    """CSS -> 編譯好的 XPath（以 descendant:: 為前綴，等同 querySelectorAll）。"""
+    sel = _SCOPE_RE.sub("", sel)
+    return etree.XPath(_translator.css_to_xpath(sel, prefix="descendant::"))
+
+
+def _all(root, sel) -> list:
+    """sel 可以是 CSS 字串或下面預先編好的 XPath。"""
+    return (_xpath(sel) if isinstance(sel, str) else sel)(root)
+
+
+def _first(root, sel):
+    found = _all(root, sel)
+    return found[0] if found else None
+
+
+# collect_raw 每張卡都會用到的固定 selector，import 時先編好
+_X_SPAN = _xpath("span")
+_X_SCOPE_SPAN = _xpath(":scope span")
+_X_TITLE = _xpath("title")
+_X_LINK = _xpath("a[href], area[href], [role='link']")
+_X_RESP = _xpath(_RESP_ATTR)
+_X_BUBBLES = _xpath(BUBBLES_SEL)
+_X_RATING_SVG = _xpath(RATING_SVG_SEL)
+_X_RATING_ALT = _xpath(RATING_ALT_SEL)
+_X_LOCATION = _xpath(LOCATION_SEL)
+_X_NAV = _xpath(NAV_SEL)
+_X_NAV_SPAN = _xpath(NAV_SPAN_SEL)
+_X_LANG = _xpath(LANG_SEL)
+_X_TEXT_LANG = _xpath(TEXT_LANG_SEL)
+_X_TEXT_BLOCK = _xpath(TEXT_BLOCK_SEL)
+_X_APP_TEXT = _xpath(APP_TEXT_SEL)
+_X_BY_ID = etree.XPath("descendant::*[@id=$rid]")
+
+
+def _text_content(el) -> Optional[str]:
+    if el is None:
+        return None
+    return "".join(el.itertext())
+
+
+def _walk(node, parts: List[str]):
+    tag = node.tag if isinstance(node.tag, str) else None
+    if tag is None:  # comment / PI
+        return
+    tag = tag.lower()
+    if tag in _SKIP_TAGS:
+        return
+    if tag == "br":
+        parts.append("\n")
+        return
+    block = tag in _BLOCK_TAGS
+    if block:
+        parts.append("\n")
+    if node.text:
+        parts.append(node.text)
+    for child in node:
+        _walk(child, parts)
+        if child.tail:
+            parts.append(child.tail)
+    if block:
+        parts.append("\n")
+
+
+def _inner_text(el) -> Optional[str]:
+    if el is None:
+        return None
+    parts: List[str] = []
+    _walk(el, parts)
+    lines = [_HSPACE_RE.sub(" ", ln).strip() for ln in "".join(parts).split("\n")]
+    return "\n".join(ln for ln in lines if ln)
+
+
+def _norm(s: Optional[str]) -> str:
+    return WS_RE.sub(" ", s or "").strip().lower()
+
+
+def _has_text(el, needle: str) -> bool:
+    return needle.lower() in _norm(_text_content(el))
+
+
+def _first_has_text(root, sel, needle: str):
+    for el in _all(root, sel):
+        if _has_text(el, needle):
+            return el
+    return None
+
+
+def _child_with_text(el, n: str):
+    for c in el:
+        if isinstance(c.tag, str) and n in _norm(_text_content(c)):
+            return c
+    return None
+
+
+def _smallest_text(root, needle: str):
+    """文件順序第一個包含 needle、但子元素都不包含的後代（同 CARDS_JS 的 smallestText，逐層往下找）。"""
+    n = needle.lower()
+    found = None
+    el = _child_with_text(root, n)
+    while el is not None:
+        found = el
+        el = _child_with_text(el, n)
+    return found
+
+
+def _a11y_hidden(el) -> bool:
+    node = el
+    while node is not None and isinstance(node.tag, str):
+        if node.get("aria-hidden") == "true" or node.get("hidden") is not None:
+            return True
+        style = (node.get("style") or "").replace(" ", "").lower()
+        if "display:none" in style or "visibility:hidden" in style:
+            return True
+        node = node.getparent()
+    return False
+
+
+def _first_link(root):
+    for el in _X_LINK(root):
+        if not _a11y_hidden(el):
+            return el
+    return None
+
+
+def _by_id(card, doc, rid: str):
+    for root in (card, doc):
+        found = _X_BY_ID(root, rid=rid)
+        if found:
+            return found[0]
+    return None
+
+
+def _has_response(el) -> bool:
+    if _first(el, _X_RESP) is not None:
+        return True
+    # 有後代包含回覆字樣 <=> 有子元素包含；先看自己有沒有，沒有就不必往下算
+    text = _norm(_text_content(el))
+    return any(t in text and _child_with_text(el, t) is not None for t in _RESP_TEXT)
+
+
+def _attr(el, name: str) -> Optional[str]:
+    return el.get(name) if el is not None else None
+
+
+def collect_raw(card, doc, opts: Dict[str, Any]) -> Dict[str, Any]:
+    """review_extract.CARDS_JS 的 lxml 版本，回傳相同 key 的 raw dict。"""
+    profile = opts["profile"]
+    text_of = _inner_text if profile == "app" else _text_content
+    r: Dict[str, Any] = {}
+
+    # title
+    if profile == "app":
+        r["title_fallbacks"] = [_inner_text(_first(card, s)) for s in opts["titleFallbacks"]]
+    else:
+        r["title_new"] = _text_content(_first(card, opts["titleNewSel"]))
+        r["title_anchor"] = _text_content(_first(card, opts["titleAnchorSel"])) if opts.get("titleAnchorSel") else None
+        r["title_fallbacks"] = [_text_content(_first(card, s)) for s in opts["titleFallbacks"]]
+
+    # text
+    if profile == "app":
+        r["text_review"] = [_inner_text(e) for e in _X_APP_TEXT(card)[:16]]
+        r["text_lang"] = [_inner_text(e) for e in _X_TEXT_LANG(card)[:16]]
+        r["text_block"] = [_inner_text(e) for e in _X_TEXT_BLOCK(card)[:16]]
+    else:
+        cands = [e for e in _all(card, opts["textCandSel"]) if not _has_response(e)]
+        r["text_cands"] = [_text_content(e) for e in cands[:30]]
+        r["text_lang"] = _text_content(_first(card, _X_TEXT_LANG))
+        r["text_block"] = _text_content(_first(card, _X_TEXT_BLOCK))
+
+    # rating
+    r["rating_aria"] = _attr(_first(card, _X_BUBBLES), "aria-label")
+    if profile != "app":
+        svg = _first(card, _X_RATING_SVG)
+        r["rating_svg"] = svg is not None
+        if svg is not None:
+            r["rating_svg_title"] = _text_content(_first(svg, _X_TITLE))
+            r["rating_svg_labelledby"] = _attr(svg, "aria-labelledby")
+            r["rating_svg_refs"] = [
+                _text_content(_by_id(card, doc, rid)) for rid in (r["rating_svg_labelledby"] or "").split()
+            ]
+            r["rating_svg_aria"] = _attr(svg, "aria-label")
+    r["rating_alt"] = _attr(_first(card, _X_RATING_ALT), "aria-label")
+
+    # dates
+    r["written"] = _inner_text(_first_has_text(card, _X_SPAN, "Written"))
+    exp = _smallest_text(card, "Date of experience")
+    r["experience"] = _inner_text(exp)
+    r["card_text"] = None if exp is not None else _inner_text(card)
+
+    # language
+    r["language"] = _attr(_first(card, _X_LANG), "lang")
+
+    # author
+    r["author"] = text_of(_first(card, opts["authorSel"]))
+    r["author_link"] = text_of(_first_link(card))
+
+    # location
+    r["location"] = text_of(_first(card, _X_LOCATION))
+    if profile != "app":
+        nav = _first(card, _X_NAV)
+        r["location_nav"] = nav is not None
+        if nav is not None:
+            sp = _first(nav, _X_NAV_SPAN)
+            if sp is None:
+                sp = _first(nav, _X_SPAN)
+            r["location_nav_span"] = _text_content(sp)
+        r["location_comma"] = _text_content(_first_has_text(card, _X_SCOPE_SPAN, ","))
+
+    # contribution / helpful
+    r["contribution"] = _inner_text(_first_has_text(card, _X_SCOPE_SPAN, "contribution"))
+    r["helpful"] = _inner_text(_first_has_text(card, _X_SCOPE_SPAN, "helpful"))
+    return r
+
+
+def _guess_url(doc) -> Optional[str]:
+    for sel, attr in (("link[rel='canonical']", "href"), ("meta[property='og:url']", "content")):
+        el = _first(doc, sel)
+        if el is not None and el.get(attr):
+            return el.get(attr)
+    return None
+
+
+def parse_html(html: str, url: Optional[str] = None, profile: str = "att",
+               cards_sel: Optional[str] = None) -> List[Dict[str, Any]]:
+    """解析一份 HTML 字串，回傳與 parse_current_page 同 schema 的 review dict list。"""
+    if not html or not html.strip():
+        return []
+    doc = lxml.html.fromstring(html)
+    if url is None:
+        url = _guess_url(doc)
+    if cards_sel is None:
+        cards_sel = APP_CARDS_SEL if profile == "app" else ATT_CARDS_SEL
+    opts = PROFILES[profile]
+    return [review_from_raw(collect_raw(card, doc, opts), url, profile) for card in _all(doc, cards_sel)]
+
+
+def parse_file(path: str, url: Optional[str] = None, profile: str = "att") -> List[Dict[str, Any]]:
+    html = Path(path).read_text(encoding="utf-8", errors="replace")
+    return parse_html(html, url=url, profile=profile)
+
+
+def _parse_file_job(args) -> List[Dict[str, Any]]:
+    path, profile = args
+    try:
+        return parse_file(path, profile=profile)
+    except Exception as e:
+        print(f"[WARN] parse failed: {path}: {e}", file=sys.stderr)
+        return []
+
+
+def parse_files(paths: Iterable[str], profile: str = "att", workers: Optional[int] = None) -> Iterable[List[Dict[str, Any]]]:
+    """用 process pool 平行解析多個 HTML 檔，依輸入順序逐檔 yield 結果。"""
+    jobs = [(str(p), profile) for p in paths]
+    if workers == 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield _parse_file_job(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        yield from ex.map(_parse_file_job, jobs, chunksize=4)
+
+
+def _expand(inputs: List[str]) -> List[Path]:
+    out: List[Path] = []
+    for item in inputs:
+        p = Path(item)
+        if p.is_dir():
+            out.extend(sorted(p.glob("*.html")))
+        else:
+            out.append(p)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse saved TripAdvisor review pages without a browser.")
+    parser.add_argument("inputs", nargs="+", help="HTML files or directories of *.html")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="att")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", default="-", help="*.csv / *.json, or '-' for JSON lines on stdout")
+    args = parser.parse_args()
+
+    paths = _expand(args.inputs)
+    rows: List[Dict[str, Any]] = []
+    for reviews in parse_files(paths, profile=args.profile, workers=args.workers):
+        rows.extend(reviews)
+
+    if args.out == "-":
+        for r in rows:
+            print(json.dumps(r, ensure_ascii=False))
+    elif args.out.endswith(".csv"):
+        fieldnames = ["title", "text", "rating", "travel_date", "written_date", "language",
+                      "author", "location", "contribution_count", "helpful_votes", "url"]
+        with open(args.out, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=fieldnames)
+            w.writeheader()
+            for r in rows:
+                w.writerow(r)
+    else:
+        Path(args.out).write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[DONE] {len(paths)} files, {len(rows)} reviews", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# rate_limit.py
+"""
+Per-host 節流：同一個 host 兩次請求之間至少隔 min_interval 秒（再加一點隨機抖動）。
+不同 host 互不影響；並行度另由 semaphore 控制。
+async 用 await limiter.wait(url)，sync（多個分頁 / 多執行緒）用 limiter.wait_sync(url)。
+每次等待都記成 timing 的 "rate_limit" span，方便和網路 / 頁面等待分開看。
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlsplit
+
+from timing import timings
+
+
+def host_of(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+class HostRateLimiter:
+    def __init__(self, min_interval: float = 2.0, jitter: float = 0.5):
+        self.min_interval = max(0.0, float(min_interval))
+        self.jitter = max(0.0, float(jitter))
+        self._next_slot: Dict[str, float] = {}
+        # _reserve 只是記帳、不會等待，一把 threading.Lock 同時給 sync / async 用
+        self._lock = threading.Lock()
+
+    def _reserve(self, host: str) -> float:
+        """預約下一個可用時間點，回傳還要等幾秒。"""
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(host, 0.0))
+        self._next_slot[host] = slot + self.min_interval + random.uniform(0, self.jitter)
+        return slot - now
+
+    async def wait(self, url: str) -> float:
+        """async：輪到這個 host 才返回；回傳實際等待秒數。"""
+        with self._lock:
+            delay = self._reserve(host_of(url))
+        if delay > 0:
+            await asyncio.sleep(delay)
+        timings.record("rate_limit", max(0.0, delay))
+        return delay
+
+    def wait_sync(self, url: str) -> float:
+        with self._lock:
+            delay = self._reserve(host_of(url))
+        if delay > 0:
+            time.sleep(delay)
+        timings.record("rate_limit", max(0.0, delay))
+        return delay
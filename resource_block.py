@@ -0,0 +1,155 @@
+# resource_block.py
+"""
+共用的資源封鎖規則：依 resource_type（image/font/media…）與網域擋掉評論頁用不到的請求。
+allow_domains 一律放行（驗證/拼圖服務不能擋，否則永遠過不了）。
+
+被擋的請求沒有 response，所以「省下的位元組」是用各類型的典型大小估計（bytes_saved_est）。
+
+    policy = policy_from_env()
+    policy.install(context)              # sync API：BrowserContext 或 Page
+    await policy.install_async(context)  # async API
+    policy.stats()
+
+環境變數：
+    TA_BLOCK=0                   關閉
+    TA_BLOCK_TYPES=image,font    要擋的 resource type（預設 image,media,font）
+    TA_BLOCK_DOMAINS=a.com,b.net 額外要擋的網域
+    TA_ALLOW_DOMAINS=x.com       額外放行的網域
+"""
+import os
+import threading
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+DEFAULT_BLOCK_TYPES = ("image", "media", "font")
+
+TRACKER_DOMAINS = (
+    "doubleclick.net", "googlesyndication.com", "googletagservices.com",
+    "google-analytics.com", "googletagmanager.com", "ads.as.criteo.com", "criteo.net",
+    "adnxs.com", "taboola.com", "rubiconproject.com", "facebook.com/tr", "connect.facebook.net",
+    "scorecardresearch.com", "quantserve.com", "hotjar.com", "bat.bing.com", "amazon-adsystem.com",
+    "pubmatic.com", "casalemedia.com", "openx.net", "moatads.com", "demdex.net", "omtrdc.net",
+    "appboycdn.com", "braze.com",
+)
+
+# 驗證相關：永遠放行
+ALLOW_DOMAINS = (
+    "captcha-delivery.com", "datadome", "arkoselabs", "hcaptcha", "funcaptcha", "geetest",
+)
+
+# 估算用的典型大小（bytes）
+_TYPICAL_BYTES = {
+    "image": 60_000,
+    "media": 500_000,
+    "font": 40_000,
+    "script": 30_000,
+    "stylesheet": 20_000,
+    "xhr": 5_000,
+    "fetch": 5_000,
+    "other": 5_000,
+}
+
+
+def _split_env(name: str) -> Optional[list]:
+    raw = os.environ.get(name)
+    if raw is None:
+        return None
+    return [x.strip() for x in raw.split(",") if x.strip()]
+
+
+class BlockPolicy:
+    def __init__(
+        self,
+        block_types: Iterable[str] = DEFAULT_BLOCK_TYPES,
+        block_domains: Iterable[str] = TRACKER_DOMAINS,
+        allow_domains: Iterable[str] = ALLOW_DOMAINS,
+        enabled: bool = True,
+    ):
+        self.block_types = frozenset(t.lower() for t in block_types)
+        self.block_domains = tuple(d.lower() for d in block_domains)
+        self.allow_domains = tuple(d.lower() for d in allow_domains)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.blocked = 0
+        self.bytes_saved_est = 0
+        self.blocked_by_type: Dict[str, int] = {}
+        self.blocked_by_reason: Dict[str, int] = {}
+
+    def decide(self, url: str, resource_type: str) -> Optional[str]:
+        """回傳封鎖原因（'type' / 'domain'），放行則回 None。"""
+        if not self.enabled:
+            return None
+        u = (url or "").lower()
+        if u.startswith("data:") or u.startswith("blob:"):
+            return None
+        parts = urlsplit(u)
+        target = (parts.hostname or "") + parts.path
+        if any(d in target for d in self.allow_domains):
+            return None
+        if resource_type in self.block_types:
+            return "type"
+        if any(d in target for d in self.block_domains):
+            return "domain"
+        return None
+
+    def _count(self, resource_type: str, reason: Optional[str]):
+        with self._lock:
+            self.requests += 1
+            if reason is None:
+                return
+            self.blocked += 1
+            self.bytes_saved_est += _TYPICAL_BYTES.get(resource_type, _TYPICAL_BYTES["other"])
+            self.blocked_by_type[resource_type] = self.blocked_by_type.get(resource_type, 0) + 1
+            self.blocked_by_reason[reason] = self.blocked_by_reason.get(reason, 0) + 1
+
+    def _handler(self, route):
+        req = route.request
+        reason = self.decide(req.url, req.resource_type)
+        self._count(req.resource_type, reason)
+        if reason:
+            return route.abort("blockedbyclient")
+        return route.continue_()
+
+    async def _handler_async(self, route):
+        req = route.request
+        reason = self.decide(req.url, req.resource_type)
+        self._count(req.resource_type, reason)
+        if reason:
+            return await route.abort("blockedbyclient")
+        return await route.continue_()
+
+    def install(self, target):
+        """sync API：掛在 BrowserContext 或 Page 上。"""
+        if self.enabled:
+            target.route("**/*", self._handler)
+
+    async def install_async(self, target):
+        if self.enabled:
+            await target.route("**/*", self._handler_async)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "requests": self.requests,
+                "blocked": self.blocked,
+                "bytes_saved_est": self.bytes_saved_est,
+                "blocked_by_type": dict(self.blocked_by_type),
+                "blocked_by_reason": dict(self.blocked_by_reason),
+            }
+
+    def summary(self) -> str:
+        s = self.stats()
+        return (f"blocked {s['blocked']}/{s['requests']} requests, "
+                f"~{s['bytes_saved_est'] / 1_000_000:.1f} MB saved (est.)")
+
+
+def policy_from_env() -> BlockPolicy:
+    types = _split_env("TA_BLOCK_TYPES")
+    return BlockPolicy(
+        block_types=DEFAULT_BLOCK_TYPES if types is None else types,
+        block_domains=TRACKER_DOMAINS + tuple(_split_env("TA_BLOCK_DOMAINS") or ()),
+        allow_domains=ALLOW_DOMAINS + tuple(_split_env("TA_ALLOW_DOMAINS") or ()),
+        enabled=os.environ.get("TA_BLOCK", "1") not in ("0", "false", "no"),
+    )
@@ -0,0 +1,251 @@
+# review_capture.py
+"""
+從網路回應 / 頁面內嵌 state 直接拿評論，不做逐欄位的 DOM 查詢、也不用點 "Read more"。
+
+    cap = capture_for(page)          # page.on("response")，只把候選 JSON response 記下來
+    batch = cap.extract(page, url)   # 目前頁面的評論；對不上畫面上的卡片就回 None（呼叫端退回 DOM 解析）
+
+來源（依序）：
+  1. GraphQL / XHR JSON 回應（點 Next 的局部更新）
+  2. window.__WEB_CONTEXT__ 的 urqlCache（SSR：直接開 -orN- 網址時）
+
+payload 裡的 review 物件欄位名稱不固定，這裡遞迴找「長得像評論」的 dict（有 text 字串與 rating），
+再轉成與 review_extract 相同的 review dict。寫法與 DOM 版一致：
+written_date = "Written August 3, 2025"、travel_date = "Aug 2025"。
+
+為了不把「相關評論」等其他列表混進來，只回傳標題對得上目前頁面評論卡的那幾則，
+而且每張卡都要對得上，否則整頁退回 DOM。
+"""
+import json
+import re
+import weakref
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional
+
+from waits import REVIEW_CARD_SEL
+
+_CANDIDATE_URL_RE = re.compile(r"/data/graphql|/graphql|/data/\d", re.I)
+_MAX_PENDING = 50
+
+# 每張卡的標題（與 FIRST_CARD_KEY_JS 同一條 selector 鏈）
+CARD_TITLES_JS = r"""
+(sel) => Array.from(document.querySelectorAll(sel)).map((card) => {
+  const t = card.querySelector("a[href*='ShowUserReviews'] span, span.yCeTE, [data-automation='reviewTitle'], " +
+                               "a[data-test-target='review-title'], span[data-test-target='review-title'], h3, h4");
+  return t ? (t.textContent || "") : "";
+})
+"""
+
+# SSR 內嵌的 urql cache：只回傳含評論欄位的 data 字串，避免把整個 state 搬回 Python
+EMBEDDED_STATE_JS = r"""
+() => {
+  const out = [];
+  const ctx = window.__WEB_CONTEXT__;
+  const cache = ctx && ctx.pageManifest && ctx.pageManifest.urqlCache;
+  if (!cache) return out;
+  const results = cache.results || cache;
+  for (const k of Object.keys(results)) {
+    const v = results[k];
+    const d = v && v.data;
+    if (typeof d === "string") {
+      if (d.indexOf('"rating"') >= 0) out.push(d);
+    } else if (d && typeof d === "object") {
+      const s = JSON.stringify(d);
+      if (s.indexOf('"rating"') >= 0) out.push(s);
+    }
+  }
+  return out;
+}
+"""
+
+_MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+           "August", "September", "October", "November", "December"]
+
+
+def _iso_date(s: Any) -> Optional[date]:
+    m = re.match(r"(\d{4})-(\d{2})(?:-(\d{2}))?", str(s or ""))
+    if not m:
+        return None
+    try:
+        return date(int(m.group(1)), int(m.group(2)), int(m.group(3) or 1))
+    except ValueError:
+        return None
+
+
+def _written(s: Any) -> Optional[str]:
+    d = _iso_date(s)
+    return f"Written {_MONTHS[d.month - 1]} {d.day}, {d.year}" if d else None
+
+
+def _travel(s: Any) -> Optional[str]:
+    d = _iso_date(s)
+    return f"{_MONTHS[d.month - 1][:3]} {d.year}" if d else None
+
+
+def _int(v: Any) -> Optional[int]:
+    try:
+        return int(v) if v is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _looks_like_review(d: Dict[str, Any]) -> bool:
+    return (isinstance(d.get("text"), str) and "rating" in d
+            and any(k in d for k in ("title", "publishedDate", "createdDate")))
+
+
+def iter_payload_reviews(obj: Any) -> Iterator[Dict[str, Any]]:
+    """遞迴走訪 JSON，找出評論物件（找到就不再往下走）。"""
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if isinstance(o, dict):
+            if _looks_like_review(o):
+                yield o
+                continue
+            stack.extend(reversed(list(o.values())))
+        elif isinstance(o, list):
+            stack.extend(reversed(o))
+
+
+def review_from_payload(d: Dict[str, Any], url: str) -> Dict[str, Any]:
+    user = d.get("userProfile") or d.get("user") or {}
+    hometown = user.get("hometown") or {}
+    home_loc = hometown.get("location") or {}
+    counts = user.get("contributionCounts") or {}
+    trip = d.get("tripInfo") or {}
+    rating = d.get("rating")
+    return {
+        "title": (d.get("title") or "").strip() or None,
+        "text": (d.get("text") or "").strip() or None,
+        "rating": float(rating) if isinstance(rating, (int, float)) else None,
+        "travel_date": _travel(trip.get("stayDate") or d.get("stayDate") or d.get("travelDate")),
+        "written_date": _written(d.get("publishedDate") or d.get("createdDate")),
+        "language": d.get("language") or None,
+        "author": user.get("displayName") or user.get("username") or d.get("username") or None,
+        "location": (hometown.get("fallbackString")
+                     or (home_loc.get("additionalNames") or {}).get("long")
+                     or home_loc.get("name") or None),
+        "contribution_count": _int(counts.get("sumAllUgc") or counts.get("sumReview")),
+        "helpful_votes": _int(d.get("helpfulVotes")),
+        "url": url,
+    }
+
+
+def _norm_title(s: Optional[str]) -> str:
+    return re.sub(r"\s+", " ", s or "").strip().lower()
+
+
+def match_cards(card_titles: List[str], candidates: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    """依畫面卡片順序挑出對應的 payload 評論；有任何一張卡對不上就回 None。"""
+    if not card_titles:
+        return None
+    pool: Dict[str, List[Dict[str, Any]]] = {}
+    for r in candidates:
+        pool.setdefault(_norm_title(r.get("title")), []).append(r)
+    out = []
+    for t in card_titles:
+        bucket = pool.get(_norm_title(t))
+        if not _norm_title(t) or not bucket:
+            return None
+        out.append(bucket.pop(0))
+    return out
+
+
+class ReviewCapture:
+    def __init__(self, cards_sel: str = REVIEW_CARD_SEL):
+        self.cards_sel = cards_sel
+        self._pending: List[Any] = []
+        self.hits = 0       # 成功用 payload 解出的頁數
+        self.misses = 0     # 退回 DOM 的頁數
+
+    def _on_response(self, resp):
+        # 只記下候選 response；body 等 extract 時再讀（handler 裡不做 IPC）
+        try:
+            if resp.request.resource_type not in ("xhr", "fetch"):
+                return
+            if not _CANDIDATE_URL_RE.search(resp.url):
+                return
+            self._pending.append(resp)
+            del self._pending[:-_MAX_PENDING]
+        except Exception:
+            pass
+
+    def attach(self, page):
+        page.on("response", self._on_response)
+        return self
+
+    def _take(self) -> List[Any]:
+        pending, self._pending = self._pending, []
+        return pending
+
+    def _decode(self, payloads: List[Any], url: str) -> List[Dict[str, Any]]:
+        out = []
+        for p in payloads:
+            for d in iter_payload_reviews(p):
+                out.append(review_from_payload(d, url))
+        return out
+
+    def _finish(self, titles: List[str], candidates: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        batch = match_cards(titles, candidates)
+        if batch is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return batch
+
+    # ---- sync API ----
+    def extract(self, page, url: str) -> Optional[List[Dict[str, Any]]]:
+        payloads = []
+        for resp in self._take():
+            try:
+                payloads.append(resp.json())
+            except Exception:
+                pass    # 非 JSON / body 已隨換頁釋放
+        try:
+            titles = page.evaluate(CARD_TITLES_JS, self.cards_sel)
+        except Exception:
+            return None
+        candidates = self._decode(payloads, url)
+        if match_cards(titles, candidates) is None:
+            try:
+                for s in page.evaluate(EMBEDDED_STATE_JS):
+                    payloads.append(json.loads(s))
+            except Exception:
+                pass
+            candidates = self._decode(payloads, url)
+        return self._finish(titles, candidates)
+
+    # ---- async API（attach 同一個，page.on 在 async API 也是同步呼叫）----
+    async def extract_async(self, page, url: str) -> Optional[List[Dict[str, Any]]]:
+        payloads = []
+        for resp in self._take():
+            try:
+                payloads.append(await resp.json())
+            except Exception:
+                pass
+        try:
+            titles = await page.evaluate(CARD_TITLES_JS, self.cards_sel)
+        except Exception:
+            return None
+        candidates = self._decode(payloads, url)
+        if match_cards(titles, candidates) is None:
+            try:
+                for s in await page.evaluate(EMBEDDED_STATE_JS):
+                    payloads.append(json.loads(s))
+            except Exception:
+                pass
+            candidates = self._decode(payloads, url)
+        return self._finish(titles, candidates)
+
+
+_captures: "weakref.WeakKeyDictionary[Any, ReviewCapture]" = weakref.WeakKeyDictionary()
+
+
+def capture_for(page) -> ReviewCapture:
+    """每個 page 一個 ReviewCapture，第一次呼叫時掛上 response listener。"""
+    cap = _captures.get(page)
+    if cap is None:
+        cap = ReviewCapture().attach(page)
+        _captures[page] = cap
+    return cap
@@ -0,0 +1,553 @@
+# review_extract.py
+"""
+一次 round-trip 抽出整頁評論卡。
+
+原本 parse_current_page / app 的卡片迴圈每張卡要打幾十次 locator
+(count / text_content / get_attribute ...)，每次都是一趟 IPC。
+這裡改成一次 eval_on_selector_all：JS 只負責把「每條 selector 備援鏈的
+第一個命中值」原樣帶回來（不 strip、不做正規化），取捨邏輯仍在 Python
+端照原本的順序跑，所以同一頁的輸出與 locator 版一致。
+
+profile:
+  "att"  : warmup_and_scrape.parse_current_page 的規則
+  "food" : warmup_and_scrape_food_reviews 的規則（標題多一條 <a> 備援）
+  "app"  : app.scrape_tripadvisor_reviews 的規則
+
+expand_reviews：解析前展開 "Read more"（TA_EXPAND=batch|none|click）。
+"""
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+# 卡片內欄位的 raw 值收集器。Playwright 專有的 selector 在這裡手動模擬：
+#   :has-text('x')  -> 元素文字（空白正規化、不分大小寫）包含 x
+#   :text('x')      -> 包含 x 的「最小」元素（子元素都不包含）
+#   get_by_role('link') -> a[href] / area[href] / [role=link]，排除 a11y 隱藏的
+CARDS_JS = r"""
+(cards, opts) => {
+  const norm = (s) => (s || "").replace(/\s+/g, " ").trim().toLowerCase();
+  const hasText = (el, needle) => norm(el.textContent).includes(needle.toLowerCase());
+  const all = (root, sel) => Array.from(root.querySelectorAll(sel));
+  const first = (root, sel) => root.querySelector(sel);
+  const textC = (el) => (el ? el.textContent : null);
+  const innerT = (el) => (el ? el.innerText : null);
+  const attr = (el, name) => (el ? el.getAttribute(name) : null);
+  const firstHasText = (root, sel, needle) => all(root, sel).find((el) => hasText(el, needle)) || null;
+  // 文件順序第一個「包含 needle、但子元素都不包含」的後代：子元素的文字是父元素的子字串，
+  // 所以從 root 往下、每層走第一個包含 needle 的子元素即可，不必對每個後代都算 textContent
+  const smallestText = (root, needle) => {
+    const n = needle.toLowerCase();
+    let found = null;
+    for (let el = root; el; ) {
+      const next = Array.from(el.children).find((c) => norm(c.textContent).includes(n));
+      if (!next) break;
+      found = el = next;
+    }
+    return found;
+  };
+  const a11yHidden = (el) => {
+    for (let n = el; n && n.nodeType === 1; n = n.parentElement) {
+      if (n.getAttribute("aria-hidden") === "true") return true;
+      const cs = getComputedStyle(n);
+      if (cs.display === "none" || cs.visibility === "hidden") return true;
+    }
+    return false;
+  };
+  const firstLink = (root) =>
+    all(root, "a[href], area[href], [role='link']").find((el) => !a11yHidden(el)) || null;
+  const byId = (root, id) => {
+    const sel = "#" + CSS.escape(id);
+    return root.querySelector(sel) || document.querySelector(sel);
+  };
+
+  const RESP_ATTR = "[data-automation*='Response'], [data-test-target*='response']";
+  const RESP_TEXT = ["Response from", "Management response", "Owner response"];
+  // 有後代包含 t <=> 有子元素包含 t
+  const hasResponse = (el) =>
+    !!el.querySelector(RESP_ATTR) ||
+    RESP_TEXT.some((t) => hasText(el, t) && Array.from(el.children).some((c) => hasText(c, t)));
+
+  const profile = opts.profile;
+
+  return cards.map((card) => {
+    const r = {};
+
+    // ---- title ----
+    if (profile === "app") {
+      r.title_fallbacks = opts.titleFallbacks.map((s) => innerT(first(card, s)));
+    } else {
+      r.title_new = textC(first(card, opts.titleNewSel));
+      r.title_anchor = opts.titleAnchorSel ? textC(first(card, opts.titleAnchorSel)) : null;
+      r.title_fallbacks = opts.titleFallbacks.map((s) => textC(first(card, s)));
+    }
+
+    // ---- text ----
+    if (profile === "app") {
+      const longest = (sel) => all(card, sel).slice(0, 16).map(innerT);
+      r.text_review = longest("[data-automation='reviewText']");
+      r.text_lang = longest(":scope span[lang]");
+      r.text_block = longest(":scope p, :scope q, :scope div");
+    } else {
+      r.text_cands = all(card, opts.textCandSel).filter((el) => !hasResponse(el)).slice(0, 30).map(textC);
+      r.text_lang = textC(first(card, ":scope span[lang]"));
+      r.text_block = textC(first(card, ":scope p, :scope q, :scope div"));
+    }
+
+    // ---- rating ----
+    r.rating_aria = attr(first(card, "[aria-label*='bubbles']"), "aria-label");
+    if (profile !== "app") {
+      const svg = first(card, "svg[data-automation='bubbleRatingImage']");
+      r.rating_svg = !!svg;
+      if (svg) {
+        r.rating_svg_title = textC(first(svg, "title"));
+        r.rating_svg_labelledby = attr(svg, "aria-labelledby");
+        r.rating_svg_refs = (r.rating_svg_labelledby || "").trim().split(/\s+/).filter(Boolean)
+          .map((id) => textC(byId(card, id)));
+        r.rating_svg_aria = attr(svg, "aria-label");
+      }
+    }
+    r.rating_alt = attr(first(card, "svg[aria-label*='bubbles'], span[aria-label*='bubbles']"), "aria-label");
+
+    // ---- dates ----
+    r.written = innerT(firstHasText(card, "span", "Written"));
+    const exp = smallestText(card, "Date of experience");
+    r.experience = innerT(exp);
+    r.card_text = exp ? null : card.innerText;
+
+    // ---- language ----
+    r.language = attr(first(card, "span[lang]"), "lang");
+
+    // ---- author ----
+    r.author = (profile === "app" ? innerT : textC)(first(card, opts.authorSel));
+    r.author_link = (profile === "app" ? innerT : textC)(firstLink(card));
+
+    // ---- location ----
+    const locSel = "[data-automation='reviewerLocation'], span[data-test-target='reviewer-location']";
+    r.location = (profile === "app" ? innerT : textC)(first(card, locSel));
+    if (profile !== "app") {
+      const nav = first(card, ":scope div[class*='navcl']");
+      r.location_nav = !!nav;
+      if (nav) {
+        const sp = first(nav, "span:not(.IugUm):not([class*='IugUm'])") || first(nav, "span");
+        r.location_nav_span = sp ? textC(sp) : undefined;
+      }
+      r.location_comma = textC(firstHasText(card, ":scope span", ","));
+    }
+
+    // ---- contribution / helpful ----
+    r.contribution = innerT(firstHasText(card, ":scope span", "contribution"));
+    r.helpful = innerT(firstHasText(card, ":scope span", "helpful"));
+    return r;
+  });
+}
+"""
+
+ATT_CARDS_SEL = (
+    "div[data-test-target='review-card'], [data-automation='reviewCard'], "
+    "div[data-test-target='HR_CC_CARD'], div[data-test-target='reviewText'], "
+    "[data-automation='reviewText'], span[data-automation^='reviewText_'], "
+    "div[class*='JVaPo']"
+)
+APP_CARDS_SEL = (
+    "[data-automation='reviewCard'], "
+    "div[data-test-target='review-card'], "
+    "div[data-test-target='HR_CC_CARD']"
+)
+
+TITLE_FALLBACKS = [
+    "[data-automation='reviewTitle']",
+    "a[data-test-target='review-title']",
+    "span[data-test-target='review-title']",
+    "h3, h4",
+]
+TEXT_CAND_SEL = (
+    ":scope div[class*='bgMZj'], "
+    ":scope div[class*='bgMZj'] span, "
+    ":scope span.jguWG, "
+    ":scope span.yCeTE, "
+    ":scope [data-automation='reviewText'], "
+    ":scope [data-test-target='review-text']"
+)
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "att": {
+        "profile": "att",
+        "titleNewSel": "a[href*='ShowUserReviews'] span, span.yCeTE",
+        "titleAnchorSel": None,
+        "titleFallbacks": TITLE_FALLBACKS,
+        "textCandSel": TEXT_CAND_SEL,
+        "authorSel": "[data-automation='memberName'], a[data-automation='reviewer-name']",
+    },
+    "food": {
+        "profile": "food",
+        "titleNewSel": "a[href*='ShowUserReviews'], span.yCeTE",
+        "titleAnchorSel": "a[href*='ShowUserReviews']",
+        "titleFallbacks": TITLE_FALLBACKS,
+        "textCandSel": TEXT_CAND_SEL,
+        "authorSel": "[data-automation='memberName'], a[data-automation='reviewer-name']",
+    },
+    "app": {
+        "profile": "app",
+        "titleFallbacks": TITLE_FALLBACKS,
+        "authorSel": "[data-automation='memberName']",
+    },
+}
+
+
+# ---------- 預編譯的 pattern / selector 表 ----------
+# 每張卡都會跑好幾次；import 時編一次，review_extract / offline_parse / scrape_core 共用
+
+RATING_OF5_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:of|out of)\s*5\s*bubbles", re.I)
+RATING_BUBBLES_RE = re.compile(r"(\d+(?:\.\d+)?)\s*bubbles", re.I)
+MONTH_YEAR_RE = re.compile(r"(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4}", re.I)
+FIRST_INT_RE = re.compile(r"(\d+)")
+REPLY_RE = re.compile(r"^\s*(dear|親愛|尊敬|您好)\b", re.I)          # 明顯是店家回覆的語氣
+NOT_LOCATION_RE = re.compile(r"\b(contribution|review)\b", re.I)
+WS_RE = re.compile(r"\s+")
+_CLEAN_TAIL_RE = re.compile(r"\b(Read more|Show less)\b.*$", re.I)
+_CLEAN_WRITTEN_RE = re.compile(r"^Written\s+\w+\s+\d{1,2},\s+\d{4}.*$", re.I)
+_CLEAN_DISCLAIMER_RE = re.compile(r"This review is the subjective opinion.*$", re.I)
+
+DISCLAIMER = "This review is the subjective opinion"
+BUBBLES_SEL = "[aria-label*='bubbles']"
+RATING_SVG_SEL = "svg[data-automation='bubbleRatingImage']"
+RATING_ALT_SEL = "svg[aria-label*='bubbles'], span[aria-label*='bubbles']"
+LOCATION_SEL = "[data-automation='reviewerLocation'], span[data-test-target='reviewer-location']"
+NAV_SEL = ":scope div[class*='navcl']"
+NAV_SPAN_SEL = "span:not(.IugUm):not([class*='IugUm'])"
+LANG_SEL = "span[lang]"
+TEXT_LANG_SEL = ":scope span[lang]"
+TEXT_BLOCK_SEL = ":scope p, :scope q, :scope div"
+APP_TEXT_SEL = "[data-automation='reviewText']"
+
+
+# ---------- Python 端的取捨（與 locator 版同一套規則） ----------
+
+def extract_rating(label: Optional[str]) -> Optional[float]:
+    """warmup_and_scrape 版：先認 'x of 5 bubbles'，再退回 'x bubbles'。"""
+    if not label:
+        return None
+    m = RATING_OF5_RE.search(label) or RATING_BUBBLES_RE.search(label)
+    try:
+        return float(m.group(1)) if m else None
+    except Exception:
+        return None
+
+
+def extract_rating_app(label: Optional[str]) -> Optional[float]:
+    """app.py 版：'x bubbles'，再退回 'x of 5'。"""
+    if not label:
+        return None
+    m = RATING_BUBBLES_RE.search(label)
+    if m:
+        try:
+            return float(m.group(1))
+        except Exception:
+            return None
+    if "of 5" in label:
+        try:
+            return float(label.split("of 5")[0].strip())
+        except Exception:
+            return None
+    return None
+
+
+def clean_review_text(s: Optional[str]) -> Optional[str]:
+    if not s:
+        return None
+    s = s.strip()
+    # 先用便宜的字串檢查，真的可能命中才跑 regex
+    low = s.lower()
+    if "read more" in low or "show less" in low:
+        s = _CLEAN_TAIL_RE.sub("", s)
+    if low.startswith("written"):
+        s = _CLEAN_WRITTEN_RE.sub("", s)
+    if "this review is the subjective opinion" in low:
+        s = _CLEAN_DISCLAIMER_RE.sub("", s)
+    s = WS_RE.sub(" ", s).strip()
+    return s or None
+
+
+def _longest(texts: List[Optional[str]]) -> Optional[str]:
+    """app.pick_longest_text 的規則：去空白、略過免責聲明、取最長。"""
+    kept = []
+    for t in texts:
+        t = (t or "").strip()
+        if not t or DISCLAIMER in t:
+            continue
+        kept.append(t)
+    return max(kept, key=len) if kept else None
+
+
+def _first_int(s: Optional[str]) -> Optional[int]:
+    m = FIRST_INT_RE.search(s or "")
+    return int(m.group(1)) if m else None
+
+
+def _dates(raw: Dict[str, Any]):
+    written_date = (raw["written"] or "").strip() if raw["written"] is not None else None
+    if raw["experience"] is not None:
+        travel_date = (raw["experience"] or "").strip()
+    else:
+        m = MONTH_YEAR_RE.search(raw["card_text"] or "")
+        travel_date = m.group(0) if m else None
+    return travel_date, written_date
+
+
+def _review_from_raw_att(raw: Dict[str, Any], url: str) -> Dict[str, Any]:
+    # title
+    title = None
+    if raw["title_new"] is not None:
+        title = (raw["title_new"] or "").strip()
+    if not title and raw.get("title_anchor") is not None:
+        title = (raw["title_anchor"] or "").strip()
+    if not title:
+        for t in raw["title_fallbacks"]:
+            if t is None:
+                continue
+            title = (t or "").strip()
+            if title:
+                break
+
+    # text
+    text = None
+    pieces = []
+    for t in raw["text_cands"]:
+        t = clean_review_text((t or "").strip())
+        if t and REPLY_RE.match(t):
+            continue
+        if t and not t.lower().startswith("written "):
+            pieces.append(t)
+    if pieces:
+        text = max(pieces, key=len)
+    if not text:
+        t = clean_review_text(raw["text_lang"] or "")
+        if t:
+            text = t
+    if not text:
+        t = clean_review_text(raw["text_block"] or "")
+        if t:
+            text = t
+
+    # rating
+    label = (raw["rating_aria"] or "").strip()
+    if not label and raw.get("rating_svg"):
+        label = (raw["rating_svg_title"] or "").strip()
+        if not label and (raw["rating_svg_labelledby"] or "").strip():
+            for ref in raw["rating_svg_refs"]:
+                if ref is not None:
+                    label = (ref or "").strip()
+                    if label:
+                        break
+        if not label:
+            label = (raw["rating_svg_aria"] or "").strip()
+    if not label:
+        label = (raw["rating_alt"] or "").strip()
+    rating = extract_rating(label)
+
+    travel_date, written_date = _dates(raw)
+
+    # author
+    if raw["author"] is not None:
+        author = (raw["author"] or "").strip() or None
+    elif raw["author_link"] is not None:
+        author = (raw["author_link"] or "").strip() or None
+    else:
+        author = None
+
+    # location（nav 容器裡沒有任何 span 時，locator 版會在 text_content 例外，整段放棄）
+    location_txt = None
+    if raw["location"] is not None:
+        location_txt = (raw["location"] or "").strip()
+    aborted = False
+    if not location_txt and raw["location_nav"]:
+        if raw.get("location_nav_span") is None:
+            aborted = True
+        else:
+            t = (raw["location_nav_span"] or "").strip()
+            if t and not NOT_LOCATION_RE.search(t):
+                location_txt = t
+    if not aborted and not location_txt and raw["location_comma"] is not None:
+        t = (raw["location_comma"] or "").strip()
+        if t and len(t.split()) <= 5:
+            location_txt = t
+
+    return {
+        "title": title, "text": text, "rating": rating,
+        "travel_date": travel_date, "written_date": written_date,
+        "language": raw["language"], "author": author, "location": location_txt,
+        "contribution_count": _first_int(raw["contribution"]) if raw["contribution"] is not None else None,
+        "helpful_votes": _first_int(raw["helpful"]) if raw["helpful"] is not None else None,
+        "url": url,
+    }
+
+
+def _review_from_raw_app(raw: Dict[str, Any], url: str) -> Dict[str, Any]:
+    title = None
+    for t in raw["title_fallbacks"]:
+        if t is None:
+            continue
+        title = (t or "").strip()
+        if title:
+            break
+
+    text = _longest(raw["text_review"]) if raw["text_review"] else None
+    if not text:
+        text = _longest(raw["text_lang"])
+    if not text:
+        text = _longest(raw["text_block"])
+
+    label = raw["rating_aria"] if raw["rating_aria"] is not None else raw["rating_alt"]
+    rating = extract_rating_app(label or "")
+
+    travel_date, written_date = _dates(raw)
+
+    if raw["author"] is not None:
+        author = (raw["author"] or "").strip() or None
+    elif raw["author_link"] is not None:
+        author = (raw["author_link"] or "").strip() or None
+    else:
+        author = None
+
+    location_txt = (raw["location"] or "").strip() if raw["location"] is not None else None
+
+    return {
+        "title": title,
+        "text": text,
+        "rating": rating,
+        "travel_date": travel_date,
+        "written_date": written_date,
+        "language": raw["language"],
+        "author": author,
+        "location": location_txt,
+        "contribution_count": _first_int(raw["contribution"]) if raw["contribution"] is not None else None,
+        "helpful_votes": _first_int(raw["helpful"]) if raw["helpful"] is not None else None,
+        "url": url,
+    }
+
+
+def review_from_raw(raw: Dict[str, Any], url: str, profile: str = "att") -> Dict[str, Any]:
+    if profile == "app":
+        return _review_from_raw_app(raw, url)
+    return _review_from_raw_att(raw, url)
+
+
+def extract_reviews(page, url: str, profile: str = "att", cards_sel: Optional[str] = None) -> List[Dict[str, Any]]:
+    """整頁卡片一次 eval 抓回，再在 Python 端組成 review dict。"""
+    if cards_sel is None:
+        cards_sel = APP_CARDS_SEL if profile == "app" else ATT_CARDS_SEL
+    raws = page.eval_on_selector_all(cards_sel, CARDS_JS, PROFILES[profile])
+    return [review_from_raw(r, url, profile) for r in raws]
+
+
+async def extract_reviews_async(page, url: str, profile: str = "att", cards_sel: Optional[str] = None) -> List[Dict[str, Any]]:
+    """extract_reviews 的 playwright.async_api 版本。"""
+    if cards_sel is None:
+        cards_sel = APP_CARDS_SEL if profile == "app" else ATT_CARDS_SEL
+    raws = await page.eval_on_selector_all(cards_sel, CARDS_JS, PROFILES[profile])
+    return [review_from_raw(r, url, profile) for r in raws]
+
+
+# ---------- "Read more" 展開 ----------
+
+EXPANDER_RE = r"^(Read more|More|Show more|更多|もっと読む)$"
+
+# 一次 evaluate：點掉所有 expander（最小的符合元素，同 Playwright text=/.../），
+# 再用 MutationObserver 等文字更新停下來；回傳 {expanded, settled}
+EXPAND_ALL_JS = r"""
+([cardsSel, pattern, limit, quietMs, maxMs]) => new Promise((resolve) => {
+  const re = new RegExp(pattern, "i");
+  const norm = (s) => (s || "").replace(/\s+/g, " ").trim();
+  const cards = cardsSel ? Array.from(document.querySelectorAll(cardsSel)) : [];
+  // ATT_CARDS_SEL 同時選到卡片與卡片裡的 reviewText 容器：只走最外層的 root，
+  // 否則同一個 expander 會被點兩次（第二次又收合成 "Show less"）
+  const roots = cards.length ? cards.filter((c) => !cards.some((o) => o !== c && o.contains(c))) : [document.body];
+  const hits = new Set();
+  for (const root of roots) {
+    for (const el of root.querySelectorAll("*")) {
+      if (hits.size >= limit) break;
+      if (!re.test(norm(el.textContent))) continue;
+      if (Array.from(el.children).some((c) => re.test(norm(c.textContent)))) continue;
+      hits.add(el);
+    }
+  }
+  if (!hits.size) return resolve({ expanded: 0, settled: true });
+
+  let timer = null, cap = null;
+  const done = (settled) => { obs.disconnect(); clearTimeout(timer); clearTimeout(cap); resolve({ expanded, settled }); };
+  const obs = new MutationObserver(() => { clearTimeout(timer); timer = setTimeout(() => done(true), quietMs); });
+  obs.observe(document.body, { subtree: true, childList: true, characterData: true, attributes: true });
+
+  let expanded = 0;
+  for (const el of hits) {
+    try { el.click(); expanded++; } catch (e) {}
+  }
+  timer = setTimeout(() => done(true), quietMs);
+  cap = setTimeout(() => done(false), maxMs);
+})
+"""
+
+# batch : 一次 evaluate 全部點掉（預設）
+# none  : 不展開，直接讀 DOM（TA 的截斷多半只是 CSS line-clamp，textContent 本來就是全文）
+# click : 舊做法，逐個 locator.click
+EXPAND_MODE = os.environ.get("TA_EXPAND", "batch")
+
+
+def _expand_by_click(page, limit: int) -> int:
+    n = 0
+    try:
+        expanders = page.locator("text=/" + EXPANDER_RE + "/i")
+        for i in range(min(expanders.count(), limit)):
+            try:
+                expanders.nth(i).click(timeout=800)
+                n += 1
+            except Exception:
+                pass
+    except Exception:
+        pass
+    return n
+
+
+async def _expand_by_click_async(page, limit: int) -> int:
+    n = 0
+    try:
+        expanders = page.locator("text=/" + EXPANDER_RE + "/i")
+        for i in range(min(await expanders.count(), limit)):
+            try:
+                await expanders.nth(i).click(timeout=800)
+                n += 1
+            except Exception:
+                pass
+    except Exception:
+        pass
+    return n
+
+
+def expand_reviews(page, mode: Optional[str] = None, cards_sel: Optional[str] = ATT_CARDS_SEL,
+                   limit: int = 20, quiet_ms: int = 150, max_ms: int = 2000) -> int:
+    """展開目前頁面的 "Read more"，回傳展開的數量。"""
+    mode = mode or EXPAND_MODE
+    if mode == "none":
+        return 0
+    if mode == "click":
+        return _expand_by_click(page, limit)
+    try:
+        res = page.evaluate(EXPAND_ALL_JS, [cards_sel, EXPANDER_RE, limit, quiet_ms, max_ms])
+        return int(res.get("expanded") or 0)
+    except Exception:
+        return _expand_by_click(page, limit)
+
+
+async def expand_reviews_async(page, mode: Optional[str] = None, cards_sel: Optional[str] = ATT_CARDS_SEL,
+                               limit: int = 20, quiet_ms: int = 150, max_ms: int = 2000) -> int:
+    """expand_reviews 的 async 版，mode 與退回方式相同。"""
+    mode = mode or EXPAND_MODE
+    if mode == "none":
+        return 0
+    if mode == "click":
+        return await _expand_by_click_async(page, limit)
+    try:
+        res = await page.evaluate(EXPAND_ALL_JS, [cards_sel, EXPANDER_RE, limit, quiet_ms, max_ms])
+        return int(res.get("expanded") or 0)
+    except Exception:
+        return await _expand_by_click_async(page, limit)
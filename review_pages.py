@@ -0,0 +1,234 @@
+# review_pages.py
+"""
+評論分頁 URL：TripAdvisor 把 offset 寫在路徑裡，第 n 頁直接組出來，不必點「Next」。
+
+    .../Attraction_Review-g295415-d3671945-Reviews-UXO_Lao...html        第 1 頁
+    .../Attraction_Review-g295415-d3671945-Reviews-or10-UXO_Lao...html   第 2 頁
+
+景點每頁 10 則、餐廳每頁 15 則（REVIEWS_PER_PAGE）。
+
+iter_fanout_pages：第 1 頁拿到評論總數後，剩下的頁分給同一個 context 的 K 個分頁同時載入，
+仍依頁序 yield。禮貌上限 = 分頁數 K + 每個 host 的最小間隔（rate_limit.HostRateLimiter）。
+"""
+import math
+import re
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from timing import timings
+from waits import REVIEW_CARD_SEL, wait_cards
+
+REVIEWS_PER_PAGE = {"att": 10, "food": 15}
+
+_REVIEWS_RE = re.compile(r"-Reviews(?:-or(\d+))?-")
+
+
+def supports_offset(url: str) -> bool:
+    return bool(_REVIEWS_RE.search(urlsplit(url or "").path))
+
+
+def page_offset(url: str) -> int:
+    m = _REVIEWS_RE.search(urlsplit(url or "").path)
+    return int(m.group(1)) if m and m.group(1) else 0
+
+
+def page_url(url: str, page_index: int, per_page: int = 10) -> str:
+    """page_index 從 1 開始；第 1 頁不帶 -orN-。#fragment 一律去掉。"""
+    parts = urlsplit(url)
+    offset = (max(1, page_index) - 1) * per_page
+    seg = f"-Reviews-or{offset}-" if offset else "-Reviews-"
+    path = _REVIEWS_RE.sub(seg, parts.path, count=1)
+    return urlunsplit((parts.scheme, parts.netloc, path, parts.query, ""))
+
+
+def page_urls(url: str, n_pages: int, per_page: int = 10, start: int = 1) -> List[str]:
+    return [page_url(url, i, per_page) for i in range(start, start + n_pages)]
+
+
+# 評論總數：先找「Showing results 1-10 of 1,234」（會跟著語言篩選），再退回 JSON-LD 的 reviewCount
+TOTAL_REVIEWS_JS = r"""
+() => {
+  const txt = document.body ? document.body.innerText : '';
+  const m = txt.match(/Showing results\s+[\d,]+\s*[-–]\s*[\d,]+\s+of\s+([\d,]+)/i);
+  if (m) return parseInt(m[1].replace(/,/g, ''), 10);
+  for (const s of document.querySelectorAll("script[type='application/ld+json']")) {
+    try {
+      const data = JSON.parse(s.textContent);
+      for (const d of (Array.isArray(data) ? data : [data])) {
+        const agg = d && d.aggregateRating;
+        const n = agg && (agg.reviewCount || agg.ratingCount);
+        if (n) return parseInt(String(n).replace(/[^0-9]/g, ''), 10);
+      }
+    } catch (e) {}
+  }
+  return null;
+}
+"""
+
+
+def total_review_count(page) -> Optional[int]:
+    """sync API；抓不到回 None。"""
+    try:
+        n = page.evaluate(TOTAL_REVIEWS_JS)
+        return int(n) if n else None
+    except Exception:
+        return None
+
+
+def iter_offset_pages(
+    page,
+    target: str,
+    max_pages: int,
+    per_page: int,
+    parse_page: Callable[[Any, int], List[Dict[str, Any]]],
+    first_key: Callable[[Any], Optional[str]],
+    goto: Optional[Callable[[Any, str], None]] = None,
+    is_last: Optional[Callable[[Any], bool]] = None,
+    start: int = 1,
+    seen: Optional[Iterable[str]] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    sync API：第 1 頁假設已經開好（page 停在 target），之後逐頁 goto(page_url(...))。
+    start > 1（從 checkpoint 續爬）：直接 goto 第 start 頁；seen 是已爬過頁的第一張卡 key。
+    parse_page(page, page_index) -> 該頁評論；first_key(page) -> 第一張卡的 key。
+    停止條件：該頁沒有評論、不滿一頁且 is_last(page) 為真（最後一頁；有卡片解析失敗時
+    不會誤停）、或第一張卡和看過的頁重複（offset 超出範圍時 TripAdvisor 會導回既有的頁）。
+    """
+    goto = goto or (lambda p, u: p.goto(u, wait_until="domcontentloaded"))
+    seen_keys = set(k for k in (seen or ()) if k)
+    page_index = max(1, start)
+    while page_index <= max_pages:
+        if page_index > 1:
+            url = page_url(target, page_index, per_page)
+            print(f"[INFO] goto page {page_index}: {url}")
+            goto(page, url)
+        key = first_key(page)
+        if key and key in seen_keys:
+            print(f"[INFO] page {page_index} repeats an earlier page (offset past the end). Stop.")
+            break
+        if key:
+            seen_keys.add(key)
+
+        batch = parse_page(page, page_index)
+        yield batch
+        if not batch:
+            print(f"[INFO] page {page_index} has no reviews. Stop.")
+            break
+        if len(batch) < per_page and (is_last is None or is_last(page)):
+            print(f"[INFO] page {page_index} has {len(batch)} < {per_page} reviews, last page. Stop.")
+            break
+        page_index += 1
+
+
+def iter_fanout_pages(
+    page,
+    target: str,
+    max_pages: int,
+    per_page: int,
+    tabs: int,
+    parse_page: Callable[[Any, int], List[Dict[str, Any]]],
+    first_key: Callable[[Any], Optional[str]],
+    total_reviews: Optional[int] = None,
+    wait_turn: Optional[Callable[[str], Any]] = None,
+    after_load: Optional[Callable[[Any], None]] = None,
+    is_last: Optional[Callable[[Any], bool]] = None,
+    timeout_ms: int = 30000,
+    start: int = 1,
+    seen: Optional[Iterable[str]] = None,
+    cards_sel: str = REVIEW_CARD_SEL,
+    cards_timeout_ms: int = 8000,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    sync API：第 1 頁在 page 上解析；第 2 頁起最多 tabs 個分頁同時在載入，依頁序 yield。
+    導航用 location.href 發出（不等待），所以單一 thread 也能讓 K 頁同時在網路上跑。
+    total_reviews 只用來決定預先載入到哪裡；最後一頁還是滿的就繼續往後爬，不會因為總數估太少而漏頁。
+    wait_turn(url) 在每次發出導航前呼叫（HostRateLimiter.wait_sync）；after_load(tab) 處理驗證頁等。
+    停止條件同 iter_offset_pages。下游提早停止時，已發出的頁會被丟棄、分頁一併關閉。
+    start / seen：同 iter_offset_pages，第 start 頁先在 page 上 goto 再解析。
+    分頁只等到 domcontentloaded，所以取 key / 解析前先等 cards_sel 出現（最多 cards_timeout_ms），
+    不靠 parse_page 自己等；否則卡片還沒渲染的頁會被當成「不滿一頁」而提早停止。
+    """
+    seen_keys = set(k for k in (seen or ()) if k)
+    first = max(1, start)
+    if first > 1:
+        url = page_url(target, first, per_page)
+        print(f"[INFO] goto page {first}: {url}")
+        with timings.span("pagination", page=first):
+            if wait_turn:
+                wait_turn(url)
+            page.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
+        if after_load:
+            after_load(page)
+        with timings.span("wait_cards", page=first):
+            wait_cards(page, timeout_ms=cards_timeout_ms, sel=cards_sel)
+    key = first_key(page)
+    if key and key in seen_keys:
+        print(f"[INFO] page {first} repeats an earlier page (offset past the end). Stop.")
+        return
+    if key:
+        seen_keys.add(key)
+    batch = parse_page(page, first)
+    yield batch
+    if not batch or (len(batch) < per_page and (is_last is None or is_last(page))):
+        return
+
+    limit = min(max_pages, math.ceil(total_reviews / per_page)) if total_reviews else max_pages
+    print(f"[INFO] fan-out: {limit} pages (total={total_reviews}) across {tabs} tabs")
+    pool = [page.context.new_page() for _ in range(max(1, tabs))]
+    inflight = deque()
+    next_index = first + 1
+
+    def launch(tab, i: int):
+        url = page_url(target, i, per_page)
+        if wait_turn:
+            wait_turn(url)
+        inflight.append((i, tab, url, tab.url))
+        tab.evaluate("u => { window.location.href = u; }", url)
+
+    try:
+        for tab in pool:
+            if next_index > limit:
+                break
+            launch(tab, next_index)
+            next_index += 1
+
+        while inflight:
+            i, tab, url, old_url = inflight.popleft()
+            # 這裡量到的是「輪到這頁時還要等多久」，已經和前面的頁重疊載入的部分不算
+            with timings.span("pagination", page=i):
+                try:
+                    tab.wait_for_url(lambda u: u != old_url, wait_until="domcontentloaded", timeout=timeout_ms)
+                except Exception as e:
+                    print(f"[WARN] page {i} did not load in tab ({e}); retry with goto")
+                    tab.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
+            if after_load:
+                after_load(tab)
+            with timings.span("wait_cards", page=i):
+                wait_cards(tab, timeout_ms=cards_timeout_ms, sel=cards_sel)
+
+            key = first_key(tab)
+            if key and key in seen_keys:
+                print(f"[INFO] page {i} repeats an earlier page (offset past the end). Stop.")
+                return
+            if key:
+                seen_keys.add(key)
+            batch = parse_page(tab, i)
+            if not batch or (len(batch) < per_page and (is_last is None or is_last(tab))):
+                yield batch
+                print(f"[INFO] page {i} has {len(batch)} < {per_page} reviews, last page. Stop.")
+                return
+
+            # 總數估太少：預計的最後一頁還是滿的，就往後多排一頁
+            if i == limit and limit < max_pages:
+                limit += 1
+            if next_index <= limit:
+                launch(tab, next_index)
+                next_index += 1
+            yield batch
+    finally:
+        for tab in pool:
+            try:
+                tab.close()
+            except Exception:
+                pass
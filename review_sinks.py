@@ -0,0 +1,392 @@
+# review_sinks.py
+"""
+評論輸出 sink：每收到一頁就寫出並 flush，不在記憶體累積整個景點。
+
+    sink.write(batch)   # batch = 一頁的 review dict list
+    sink.close()
+
+也可以當 context manager 用。
+"""
+import csv
+import json
+import os
+import re
+import socket
+import time
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+FIELDNAMES = ["attraction", "title", "text", "rating", "travel_date", "written_date", "language",
+              "author", "location", "contribution_count", "helpful_votes", "url"]
+
+
+def move_attraction_first(d: Dict[str, Any]) -> Dict[str, Any]:
+    if "attraction" in d:
+        keys = ["attraction"] + [k for k in d if k != "attraction"]
+        return {k: d.get(k) for k in keys}
+    return d
+
+
+class Sink(ABC):
+    """rows：寫出的筆數；子類別的 __init__ 要呼叫 super().__init__()。"""
+
+    def __init__(self):
+        self.rows = 0
+
+    @abstractmethod
+    def write(self, batch: List[Dict[str, Any]]):
+        ...
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvSink(Sink):
+    """append=True：檔案已存在就接著寫（不重寫 header）。"""
+
+    def __init__(self, path: Path, append: bool = True, fieldnames: Optional[List[str]] = None):
+        super().__init__()
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fieldnames = fieldnames or FIELDNAMES
+        new_file = not append or not self.path.exists() or self.path.stat().st_size == 0
+        self._f = self.path.open("a" if append else "w", newline="", encoding="utf-8")
+        self._w = csv.DictWriter(self._f, fieldnames=self.fieldnames, extrasaction="ignore")
+        if new_file:
+            self._w.writeheader()
+            self._f.flush()
+
+    def write(self, batch: List[Dict[str, Any]]):
+        if not batch:
+            return
+        self._w.writerows(batch)
+        self._f.flush()
+        self.rows += len(batch)
+
+    def close(self):
+        if not self._f.closed:
+            self._f.close()
+
+
+class JsonArraySink(Sink):
+    """逐筆寫出合法的 JSON array（indent=2、attraction 放第一欄），close 時補上結尾。"""
+
+    def __init__(self, path: Path):
+        super().__init__()
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = self.path.open("w", encoding="utf-8")
+        self._f.write("[")
+
+    def write(self, batch: List[Dict[str, Any]]):
+        for r in batch:
+            body = json.dumps(move_attraction_first(r), ensure_ascii=False, indent=2)
+            self._f.write(("," if self.rows else "") + "\n  " + body.replace("\n", "\n  "))
+            self.rows += 1
+        self._f.flush()
+
+    def close(self):
+        if not self._f.closed:
+            self._f.write("\n]" if self.rows else "]")
+            self._f.close()
+
+
+class JsonLinesSink(Sink):
+    def __init__(self, path: Path, append: bool = True):
+        super().__init__()
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = self.path.open("a" if append else "w", encoding="utf-8")
+
+    def write(self, batch: List[Dict[str, Any]]):
+        for r in batch:
+            self._f.write(json.dumps(move_attraction_first(r), ensure_ascii=False) + "\n")
+        self._f.flush()
+        self.rows += len(batch)
+
+    def close(self):
+        if not self._f.closed:
+            self._f.close()
+
+
+# ---------- Parquet（需要 pyarrow，選用） ----------
+
+_MONTHS = {m: i for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1)}
+_WRITTEN_RE = re.compile(r"([A-Za-z]{3})[a-z]*\.?\s+(\d{1,2}),\s+(\d{4})")
+_MONTH_YEAR_RE = re.compile(r"\b([A-Za-z]{3})[a-z]*\.?\s+(\d{4})\b")
+
+
+def parse_written_date(s: Optional[str]) -> Optional[date]:
+    """'Written August 3, 2025' -> date(2025, 8, 3)"""
+    m = _WRITTEN_RE.search(s or "")
+    if not m or m.group(1).lower() not in _MONTHS:
+        return None
+    try:
+        return date(int(m.group(3)), _MONTHS[m.group(1).lower()], int(m.group(2)))
+    except ValueError:
+        return None
+
+
+def parse_travel_date(s: Optional[str]) -> Optional[date]:
+    """'Date of experience: Aug 2025' / 'Aug 2025' -> date(2025, 8, 1)"""
+    for m in _MONTH_YEAR_RE.finditer(s or ""):
+        mon = _MONTHS.get(m.group(1).lower())
+        if mon:
+            return date(int(m.group(2)), mon, 1)
+    return None
+
+
+def _to_int(v) -> Optional[int]:
+    if v is None or v == "":
+        return None
+    try:
+        return int(float(v))
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(v) -> Optional[float]:
+    if v is None or v == "":
+        return None
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise ImportError("Parquet output needs pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def review_schema():
+    pa = _require_pyarrow()
+    return pa.schema([
+        ("attraction", pa.string()),
+        ("title", pa.string()),
+        ("text", pa.string()),
+        ("rating", pa.float32()),
+        ("travel_date", pa.date32()),
+        ("written_date", pa.date32()),
+        ("travel_date_text", pa.string()),
+        ("written_date_text", pa.string()),
+        ("language", pa.string()),
+        ("author", pa.string()),
+        ("location", pa.string()),
+        ("contribution_count", pa.int32()),
+        ("helpful_votes", pa.int32()),
+        ("url", pa.string()),
+    ])
+
+
+def typed_row(r: Dict[str, Any]) -> Dict[str, Any]:
+    """review dict（或 CSV 讀回來的全字串 row）-> 符合 review_schema 的型別。"""
+    return {
+        "attraction": r.get("attraction") or None,
+        "title": r.get("title") or None,
+        "text": r.get("text") or None,
+        "rating": _to_float(r.get("rating")),
+        "travel_date": parse_travel_date(r.get("travel_date")),
+        "written_date": parse_written_date(r.get("written_date")),
+        "travel_date_text": r.get("travel_date") or None,
+        "written_date_text": r.get("written_date") or None,
+        "language": r.get("language") or None,
+        "author": r.get("author") or None,
+        "location": r.get("location") or None,
+        "contribution_count": _to_int(r.get("contribution_count")),
+        "helpful_votes": _to_int(r.get("helpful_votes")),
+        "url": r.get("url") or None,
+    }
+
+
+def _slug(s: Optional[str]) -> str:
+    s = re.sub(r"[^0-9A-Za-z]+", "_", s or "unknown").strip("_")
+    return (s or "unknown")[:80]
+
+
+# 還沒收尾的 part 檔的 journal：.<part>.parquet.<host>-<pid>.jsonl（. 開頭，pyarrow.dataset 讀取時會略過）
+_JOURNAL_RE = re.compile(r"^\.(?P<part>.+\.parquet)\.(?P<host>[0-9A-Za-z_]+)-(?P<pid>\d+)\.jsonl$")
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        return True             # Windows 的 os.kill(pid, 0) 會送 CTRL_C_EVENT；不確定就當作還活著
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class ParquetSink(Sink):
+    """
+    寫成 Parquet dataset 目錄：每個景點一個 part 檔（append-per-attraction，
+    之後再爬新的景點只會多檔案，不用改舊檔）。
+    row 先在記憶體累積到 row_group_size 才寫成一個 row group；換景點或 close 時收尾。
+
+    Parquet 檔要收尾（寫 footer）後才讀得回來，所以 journal=True 時，還沒收尾的 part 檔
+    每頁的原始 row 也逐頁 flush 進同目錄的 .<part>.<host>-<pid>.jsonl，收尾後刪掉。
+    行程 crash 留下的 journal（同一台 host、原 pid 已結束），下次開 sink 時重寫成完整的 part 檔；
+    checkpoint 記成已完成的頁，在 Parquet 裡也不會掉。
+
+    讀回：pyarrow.dataset.dataset(path, format="parquet").to_table()
+    """
+
+    def __init__(self, path: Path, row_group_size: int = 5000, compression: str = "zstd", journal: bool = True):
+        super().__init__()
+        _require_pyarrow()
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.row_group_size = max(1, int(row_group_size))
+        self.compression = compression
+        self.journal = journal
+        self.schema = review_schema()
+        self._writer = None
+        self._journal = None
+        self._attraction: Optional[str] = None
+        self._buf: List[Dict[str, Any]] = []
+        self.files: List[Path] = []
+        self._owner = f"{_slug(socket.gethostname())}-{os.getpid()}"
+        self.recovered = self._recover()
+
+    def _journal_path(self, part: Path) -> Path:
+        return part.with_name(f".{part.name}.{self._owner}.jsonl")
+
+    def _recover(self) -> int:
+        """把已結束的行程留下的 journal 重寫成完整的 part 檔，回傳救回的筆數。"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        host = _slug(socket.gethostname())
+        total = 0
+        for j in sorted(self.path.glob(".*.jsonl")):
+            m = _JOURNAL_RE.match(j.name)
+            if not m or m["host"] != host or _pid_alive(int(m["pid"])):
+                continue
+            part = self.path / m["part"]
+            mine = self._journal_path(part)
+            try:
+                os.rename(j, mine)      # 同時開的 sink（shard_runner 的每個 worker）只有一個搶得到
+            except FileNotFoundError:
+                continue
+            rows = []
+            with open(mine, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rows.append(typed_row(json.loads(line)))
+                    except ValueError:
+                        continue            # crash 時寫到一半的行
+            if rows:
+                tmp = part.with_name(part.name + ".tmp")
+                pq.write_table(pa.Table.from_pylist(rows, schema=self.schema), str(tmp), compression=self.compression)
+                os.replace(tmp, part)
+            else:
+                part.unlink(missing_ok=True)
+            mine.unlink()
+            total += len(rows)
+            print(f"[INFO] parquet: recovered {len(rows)} rows of an interrupted run -> {part}")
+        return total
+
+    def _open(self, attraction: Optional[str]):
+        import pyarrow.parquet as pq
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+        fn = self.path / f"{_slug(attraction)}-{stamp}-{len(self.files):04d}.parquet"
+        if self.journal:
+            self._journal = open(self._journal_path(fn), "w", encoding="utf-8")
+        self._writer = pq.ParquetWriter(str(fn), self.schema, compression=self.compression)
+        self._attraction = attraction
+        self.files.append(fn)
+
+    def _flush(self):
+        if not self._buf:
+            return
+        import pyarrow as pa
+        self._writer.write_table(pa.Table.from_pylist(self._buf, schema=self.schema))
+        self._buf = []
+
+    def _finish_file(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._journal is not None:
+            self._journal.close()
+            os.unlink(self._journal.name)
+            self._journal = None
+
+    def write(self, batch: List[Dict[str, Any]]):
+        for r in batch:
+            att = r.get("attraction")
+            if self._writer is None or att != self._attraction:
+                self._finish_file()
+                self._open(att)
+            self._buf.append(typed_row(r))
+            if self._journal is not None:
+                self._journal.write(json.dumps(r, ensure_ascii=False, default=str) + "\n")
+            self.rows += 1
+            if len(self._buf) >= self.row_group_size:
+                self._flush()
+        if self._journal is not None:
+            self._journal.flush()       # 跟 checkpoint 一樣每頁 flush 到 OS
+
+    def close(self):
+        self._finish_file()
+
+
+def read_reviews(path: Path):
+    """讀回 ParquetSink 寫出的 dataset（或單一 .parquet 檔），回傳 pyarrow.Table。"""
+    _require_pyarrow()
+    import pyarrow.dataset as ds
+    return ds.dataset(str(path), format="parquet").to_table()
+
+
+def write_all(sinks: Iterable[Sink], batch: List[Dict[str, Any]]):
+    for s in sinks:
+        s.write(batch)
+
+
+def _convert_main():
+    """把既有的 reviews_*.csv / reviews.json 轉成 Parquet dataset。"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert review CSV/JSON files to a Parquet dataset.")
+    parser.add_argument("inputs", nargs="+", help="*.csv or *.json (list of review dicts)")
+    parser.add_argument("--out", required=True, help="output dataset directory")
+    parser.add_argument("--row-group-size", type=int, default=50_000)
+    args = parser.parse_args()
+
+    t0 = time.monotonic()
+    # 來源檔本身就是備份，不用 journal
+    with ParquetSink(Path(args.out), row_group_size=args.row_group_size, journal=False) as sink:
+        for inp in args.inputs:
+            p = Path(inp)
+            if p.suffix.lower() == ".json":
+                rows = json.loads(p.read_text(encoding="utf-8"))
+                sink.write(rows)
+            else:
+                with p.open(newline="", encoding="utf-8") as f:
+                    batch: List[Dict[str, Any]] = []
+                    for r in csv.DictReader(f):
+                        batch.append(r)
+                        if len(batch) >= 10_000:
+                            sink.write(batch)
+                            batch = []
+                    sink.write(batch)
+    print(f"[DONE] {sink.rows} rows -> {args.out} ({len(sink.files)} files, {time.monotonic() - t0:.1f}s)")
+
+
+if __name__ == "__main__":
+    _convert_main()
@@ -0,0 +1,304 @@
+# review_store.py
+"""
+SQLite 評論庫：跨次執行去重。每筆評論用穩定指紋（title / author / written_date + 景點 URL）
+當唯一鍵，重爬時已知的評論不會再寫進 CSV。
+
+    store = ReviewStore("reviews.db")
+    pipeline = skip_known(pages, store)      # 只放行新評論；整頁都已知就停止翻頁
+    for batch in pipeline:
+        write_all([csv_sink, store], batch)  # store 本身也是 Sink（批次 upsert）
+    store.close()
+
+WAL 模式：爬蟲寫入時，分析端可以同時讀。
+
+增量模式：每個景點記一個 high-water mark（最新一則評論的指紋與 written_date）。
+評論是新到舊排序，所以重爬時遇到整頁都比 mark 舊就可以停：
+
+    pipeline = until_watermark(pipeline, store, target)
+"""
+import csv
+import hashlib
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from review_sinks import FIELDNAMES, Sink, parse_written_date
+
+_OFFSET_RE = re.compile(r"-or\d+(?=-)")
+_WS_RE = re.compile(r"\s+")
+
+
+def canonical_url(url: Optional[str]) -> str:
+    """去掉分頁 offset（-or10-）、query 與 #fragment，同一景點的每一頁都對到同一個 URL。"""
+    if not url:
+        return ""
+    parts = urlsplit(url)
+    path = _OFFSET_RE.sub("", parts.path)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, "", ""))
+
+
+def _norm(s: Optional[str]) -> str:
+    return _WS_RE.sub(" ", (s or "")).strip().lower()
+
+
+def fingerprint(r: Dict[str, Any], url: Optional[str] = None) -> str:
+    """和 first_card_key 同樣取 title / author / written_date，再加上景點 URL。"""
+    raw = "|".join((
+        _norm(r.get("title")),
+        _norm(r.get("author")),
+        _norm(r.get("written_date")),
+        canonical_url(url if url is not None else r.get("url")),
+    ))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    id INTEGER PRIMARY KEY,
+    fp TEXT NOT NULL,
+    attraction TEXT,
+    title TEXT,
+    text TEXT,
+    rating REAL,
+    travel_date TEXT,
+    written_date TEXT,
+    language TEXT,
+    author TEXT,
+    location TEXT,
+    contribution_count INTEGER,
+    helpful_votes INTEGER,
+    url TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_reviews_fp ON reviews(fp);
+CREATE INDEX IF NOT EXISTS ix_reviews_url ON reviews(url);
+CREATE TABLE IF NOT EXISTS watermarks (
+    url TEXT PRIMARY KEY,
+    fp TEXT NOT NULL,
+    written_date TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+
+_COLS = list(FIELDNAMES)
+
+_UPSERT = (
+    f"INSERT INTO reviews (fp, {', '.join(_COLS)}, first_seen, last_seen) "
+    f"VALUES (?, {', '.join('?' for _ in _COLS)}, ?, ?) "
+    "ON CONFLICT(fp) DO UPDATE SET "
+    "last_seen = excluded.last_seen, "
+    "helpful_votes = COALESCE(excluded.helpful_votes, reviews.helpful_votes), "
+    "contribution_count = COALESCE(excluded.contribution_count, reviews.contribution_count)"
+)
+
+
+class ReviewStore(Sink):
+    """
+    path       : SQLite 檔案
+    batch_size : upsert 時每個 transaction 最多幾筆
+    """
+
+    def __init__(self, path, batch_size: int = 1000):
+        super().__init__()      # rows：這次新增的筆數
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = max(1, int(batch_size))
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self.updated = 0    # 已存在、只更新 last_seen 的筆數
+
+    # ---- 查詢 ----
+    def _known(self, fps: List[str]) -> Set[str]:
+        found: Set[str] = set()
+        for i in range(0, len(fps), 500):   # SQLite 參數上限
+            chunk = fps[i:i + 500]
+            q = f"SELECT fp FROM reviews WHERE fp IN ({', '.join('?' for _ in chunk)})"
+            found.update(fp for (fp,) in self._db.execute(q, chunk))
+        return found
+
+    def known(self, fps: Iterable[str]) -> Set[str]:
+        with self._lock:
+            return self._known(list(dict.fromkeys(fps)))
+
+    def count(self, url: Optional[str] = None) -> int:
+        with self._lock:
+            if url is None:
+                return self._db.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+            return self._db.execute(
+                "SELECT COUNT(*) FROM reviews WHERE url = ?", (canonical_url(url),)).fetchone()[0]
+
+    def get_watermark(self, url: str) -> Optional[Tuple[str, Optional[date]]]:
+        """回傳 (fp, written_date)；沒爬過回 None。"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fp, written_date FROM watermarks WHERE url = ?", (canonical_url(url),)).fetchone()
+        if row is None:
+            return None
+        return row[0], (date.fromisoformat(row[1]) if row[1] else None)
+
+    def set_watermark(self, url: str, fp: str, written: Optional[date]):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO watermarks (url, fp, written_date, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET fp = excluded.fp, written_date = excluded.written_date, "
+                "updated_at = excluded.updated_at",
+                (canonical_url(url), fp, written.isoformat() if written else None, time.time()))
+
+    # ---- 寫入 ----
+    def upsert_many(self, reviews: Iterable[Dict[str, Any]]) -> int:
+        """批次 upsert，回傳新增筆數；已存在的只更新 last_seen / 計數欄位。"""
+        now = time.time()
+        rows = []
+        for r in reviews:
+            url = canonical_url(r.get("url"))
+            rows.append((fingerprint(r, url), *[url if c == "url" else r.get(c) for c in _COLS], now, now))
+        if not rows:
+            return 0
+        inserted = 0
+        with self._lock:
+            for i in range(0, len(rows), self.batch_size):
+                chunk = rows[i:i + self.batch_size]
+                fps = list(dict.fromkeys(row[0] for row in chunk))
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    new = len(fps) - len(self._known(fps))
+                    self._db.executemany(_UPSERT, chunk)
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+                inserted += new
+                self.updated += len(fps) - new
+        self.rows += inserted
+        return inserted
+
+    def write(self, batch: List[Dict[str, Any]]):
+        self.upsert_many(batch)
+
+    def close(self):
+        with self._lock:
+            try:
+                self._db.close()
+            except sqlite3.ProgrammingError:
+                pass
+
+
+def skip_known(pages: Iterable[List[Dict[str, Any]]], store: ReviewStore,
+               stop_when_known: bool = True) -> Iterator[List[Dict[str, Any]]]:
+    """
+    pipeline stage：濾掉庫裡已有的評論。
+    stop_when_known=True 時，遇到整頁都是已知評論就停止（不再翻頁）。
+    """
+    for batch in pages:
+        if not batch:
+            yield batch
+            continue
+        fps = [fingerprint(r) for r in batch]
+        known = store.known(fps)
+        fresh = [r for r, fp in zip(batch, fps) if fp not in known]
+        if stop_when_known and not fresh:
+            print(f"[INFO] all {len(batch)} reviews on this page are already stored. Stop.")
+            return
+        if known:
+            print(f"[INFO] skipped {len(batch) - len(fresh)} already-stored reviews")
+        yield fresh
+
+
+class HighWaterMark:
+    """
+    單一景點的增量判斷。
+    older(r)  : 這則評論是否不比上次的 mark 新（同指紋，或 written_date 較早）
+    observe() : 記下這次看到的最新評論
+    commit()  : 爬完才呼叫，把新的 mark 寫回 store（中途失敗就不更新，下次照舊重爬）
+    """
+
+    def __init__(self, store: ReviewStore, url: str):
+        self.store = store
+        self.url = url
+        mark = store.get_watermark(url)
+        self.mark_fp, self.mark_date = mark if mark else (None, None)
+        self._best: Optional[Tuple[Optional[date], str]] = None
+
+    @property
+    def active(self) -> bool:
+        return self.mark_fp is not None
+
+    def older(self, r: Dict[str, Any]) -> bool:
+        if not self.active:
+            return False
+        if fingerprint(r) == self.mark_fp:
+            return True
+        d = parse_written_date(r.get("written_date"))
+        return d is not None and self.mark_date is not None and d < self.mark_date
+
+    def observe(self, batch: List[Dict[str, Any]]):
+        for r in batch:
+            d = parse_written_date(r.get("written_date"))
+            # 取日期最新的；同日期保留先出現的（列表是新到舊）
+            if self._best is None or (d is not None and (self._best[0] is None or d > self._best[0])):
+                self._best = (d, fingerprint(r))
+
+    def commit(self):
+        if self._best is None:
+            return
+        d, fp = self._best
+        if self.mark_date is not None and (d is None or d < self.mark_date):
+            return
+        self.store.set_watermark(self.url, fp, d)
+
+
+def until_watermark(pages: Iterable[List[Dict[str, Any]]], store: ReviewStore,
+                    url: str, hwm: Optional[HighWaterMark] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    pipeline stage（增量模式）：只放行比 high-water mark 新的評論；
+    遇到整頁都比 mark 舊就停止翻頁。
+    有給 hwm 時由呼叫端在整條 pipeline 正常跑完後 hwm.commit()：下游（例如 skip_known）
+    提早停止時這個 generator 不會再被 resume，不能靠它自己跑到最後才 commit。
+    沒給 hwm 時自己跑完才 commit（單獨使用、下游不會提早停止時）。
+    注意：第一次爬（還沒有 mark）若被 max_pages 截斷，mark 仍會設在最新那則，
+    之後的增量重爬不會回頭補更舊的頁。
+    """
+    owned = hwm is None
+    if owned:
+        hwm = HighWaterMark(store, url)
+    for batch in pages:
+        hwm.observe(batch)
+        fresh = [r for r in batch if not hwm.older(r)]
+        if batch and not fresh:
+            print(f"[INFO] page is older than the high-water mark ({hwm.mark_date}). Stop.")
+            break
+        yield fresh
+    if owned:
+        hwm.commit()
+
+
+def _import_main():
+    """把既有的 reviews_*.csv 匯入評論庫（重複的自動略過）。"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Import review CSV files into the SQLite review store.")
+    parser.add_argument("db", help="SQLite file, e.g. reviews.db")
+    parser.add_argument("csv", nargs="*", help="reviews_*.csv to import")
+    args = parser.parse_args()
+
+    csv.field_size_limit(sys.maxsize)
+    with ReviewStore(args.db, batch_size=5000) as store:
+        for fn in args.csv:
+            with open(fn, newline="", encoding="utf-8") as f:
+                n = store.upsert_many(csv.DictReader(f))
+            print(f"[INFO] {fn}: {n} new reviews")
+        print(f"[DONE] {args.db}: {store.count()} reviews ({store.rows} new, {store.updated} already known)")
+
+
+if __name__ == "__main__":
+    _import_main()
@@ -0,0 +1,571 @@
+# scrape_core.py
+"""
+所有入口（app.py、warmup_and_scrape*.py、async_review_crawler.py）共用的爬取核心：
+context 設定、驗證頁判斷、評論卡解析。改一次，每個入口都吃到。
+
+解析分成四種 engine，介面相同，可在同一頁上互相替換 / 比較：
+
+    net     : GraphQL 回應 / 內嵌 state 的評論（review_capture），對不上卡片回 None
+    eval    : 一次 eval_on_selector_all 抓回整頁（review_extract）
+    html    : 抓一次 page.content()，在 Python 端用 lxml 解析（offline_parse）
+    locator : 逐卡 locator（最舊的做法，每張卡幾十次 IPC；只有 sync 版）
+
+    reviews = parse_page(page, url, mode="eval", profile="att", page=3)
+
+mode 失敗時照 FALLBACKS 往下退（net -> eval -> locator、html -> locator）。
+"Read more" 只在第一個需要 DOM 的 engine 之前展開一次（net 不用展開）。
+"""
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional
+
+from offline_parse import parse_html
+from review_capture import capture_for
+from review_extract import (APP_CARDS_SEL, APP_TEXT_SEL, ATT_CARDS_SEL, BUBBLES_SEL, DISCLAIMER, FIRST_INT_RE,
+                            LANG_SEL, LOCATION_SEL, MONTH_YEAR_RE, NAV_SEL, NAV_SPAN_SEL, NOT_LOCATION_RE, PROFILES,
+                            RATING_ALT_SEL, RATING_SVG_SEL, REPLY_RE, TEXT_BLOCK_SEL, TEXT_CAND_SEL, TEXT_LANG_SEL,
+                            TITLE_FALLBACKS, clean_review_text, expand_reviews,
+                            expand_reviews_async, extract_rating, extract_rating_app, extract_reviews,
+                            extract_reviews_async)
+from timing import timings
+
+__all__ = [
+    "UA", "INIT_SCRIPT", "CONTEXT_DEFAULTS", "new_context", "new_context_async",
+    "VerificationRequired", "looks_like_verification", "looks_like_verification_async",
+    "extract_rating", "extract_rating_app", "clean_review_text", "pick_longest_text",
+    "Engine", "ENGINES", "FALLBACKS", "default_cards_sel", "parse_page", "parse_page_async", "compare_engines",
+]
+
+UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+      "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36")
+
+# mask common automation fingerprints
+INIT_SCRIPT = """
+    Object.defineProperty(navigator, 'webdriver', { get: () => undefined });
+    window.chrome = { runtime: {} };
+    Object.defineProperty(navigator, 'plugins', { get: () => [1,2,3,4,5] });
+    Object.defineProperty(navigator, 'languages', { get: () => ['en-US','en'] });
+"""
+
+CONTEXT_DEFAULTS: Dict[str, Any] = dict(
+    user_agent=UA,
+    locale="en-US",
+    viewport={"width": 1366, "height": 900},
+    extra_http_headers={"Accept-Language": "en-US,en;q=0.9"},
+)
+
+
+# ---------- context ----------
+
+def _context_kwargs(storage_state: Optional[str], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    kwargs = {**CONTEXT_DEFAULTS, **overrides}
+    if storage_state and os.path.exists(storage_state):
+        kwargs["storage_state"] = storage_state
+    return kwargs
+
+
+def new_context(browser, storage_state: Optional[str] = None, block=None, **overrides):
+    """UA / 語系 / viewport + 資源封鎖（resource_block 的 policy）+ 反自動化指紋。"""
+    context = browser.new_context(**_context_kwargs(storage_state, overrides))
+    try:
+        if block is not None:
+            block.install(context)
+        context.add_init_script(INIT_SCRIPT)
+    except Exception:
+        context.close()
+        raise
+    return context
+
+
+async def new_context_async(browser, storage_state: Optional[str] = None, block=None, **overrides):
+    context = await browser.new_context(**_context_kwargs(storage_state, overrides))
+    try:
+        if block is not None:
+            await block.install_async(context)
+        await context.add_init_script(INIT_SCRIPT)
+    except Exception:
+        await context.close()
+        raise
+    return context
+
+
+# ---------- 驗證頁 ----------
+
+_VERIFY_TEXTS = ("verification required", "slide right to complete the puzzle")
+# DataDome / Arkose 的 iframe，以及 puzzle widget 常帶的 aria-label
+_VERIFY_SEL = ("iframe[src*='captcha-delivery.com'], iframe[title*='captcha'], "
+               "iframe[src*='arkoselabs'], div[aria-label*='captcha']")
+
+
+class VerificationRequired(RuntimeError):
+    """遇到驗證頁（CAPTCHA）；各入口都丟這個，app._classify_error 只把它算成 captcha。"""
+
+
+def looks_like_verification(page) -> bool:
+    try:
+        txt = (page.inner_text("body") or "").lower()
+    except Exception:
+        return False
+    if any(t in txt for t in _VERIFY_TEXTS):
+        return True
+    try:
+        if page.locator(_VERIFY_SEL).count():
+            return True
+    except Exception:
+        pass
+    return False
+
+
+async def looks_like_verification_async(page) -> bool:
+    try:
+        txt = (await page.inner_text("body") or "").lower()
+    except Exception:
+        return False
+    if any(t in txt for t in _VERIFY_TEXTS):
+        return True
+    try:
+        if await page.locator(_VERIFY_SEL).count():
+            return True
+    except Exception:
+        pass
+    return False
+
+
+# ---------- locator engine（逐卡） ----------
+
+# pattern 與 selector 都用 review_extract 預先編好的那一份
+_RESPONSES_SEL = (
+    ":scope [data-automation*='Response'], "          # e.g. managementResponse / ownerResponse
+    ":scope [data-test-target*='response'], "
+    ":scope :text('Response from'), "
+    ":scope :text('Management response'), "
+    ":scope :text('Owner response')"
+)
+
+
+def pick_longest_text(loc, limit: int = 16) -> Optional[str]:
+    """從 locator 裡挑最長的可見文本，排除版權聲明等無效內容。"""
+    try:
+        n = loc.count()
+    except Exception:
+        return None
+    texts: List[str] = []
+    for j in range(min(n, limit)):
+        try:
+            t = loc.nth(j).inner_text().strip()
+            if t and DISCLAIMER not in t:
+                texts.append(t)
+        except Exception:
+            pass
+    return max(texts, key=len) if texts else None
+
+
+def _first_int(loc) -> Optional[int]:
+    try:
+        if loc.count():
+            m = FIRST_INT_RE.search(loc.first.inner_text() or "")
+            if m:
+                return int(m.group(1))
+    except Exception:
+        pass
+    return None
+
+
+def _card_common(card) -> Dict[str, Any]:
+    """日期 / 語系 / 貢獻數 / helpful：各 profile 都一樣。"""
+    written_date = travel_date = language = None
+    try:
+        wd = card.locator("span:has-text('Written')")
+        if wd.count():
+            written_date = (wd.first.inner_text() or "").strip()
+    except Exception:
+        pass
+    try:
+        exp = card.locator(":scope :text('Date of experience')")
+        if exp.count():
+            travel_date = (exp.first.inner_text() or "").strip()
+        else:
+            m = MONTH_YEAR_RE.search(card.inner_text())
+            if m:
+                travel_date = m.group(0)
+    except Exception:
+        pass
+    try:
+        lang_spans = card.locator(LANG_SEL)
+        if lang_spans.count():
+            language = lang_spans.first.get_attribute("lang")
+    except Exception:
+        pass
+    return {
+        "travel_date": travel_date, "written_date": written_date, "language": language,
+        "contribution_count": _first_int(card.locator(":scope span:has-text('contribution')")),
+        "helpful_votes": _first_int(card.locator(":scope span:has-text('helpful')")),
+    }
+
+
+def _title_att(card, opts: Dict[str, Any]) -> Optional[str]:
+    # 1) 新版：ShowUserReviews 連結裡的 span / span.yCeTE
+    loc = card.locator(opts["titleNewSel"]).first
+    title = (loc.text_content() or "").strip() if loc.count() else None
+    # 2) food：直接抓 <a> 本身的文字
+    if not title and opts.get("titleAnchorSel"):
+        loc = card.locator(opts["titleAnchorSel"]).first
+        if loc.count():
+            title = (loc.text_content() or "").strip()
+    # 3) 舊版 markup
+    if not title:
+        for sel in TITLE_FALLBACKS:
+            loc = card.locator(sel)
+            if loc.count():
+                try:
+                    title = (loc.first.text_content() or "").strip()
+                    if title:
+                        break
+                except Exception:
+                    pass
+    return title
+
+
+def _text_att(card) -> Optional[str]:
+    # 內文容器；位於店家回覆區塊內的節點排除
+    cands = card.locator(TEXT_CAND_SEL).filter(has_not=card.locator(_RESPONSES_SEL))
+    pieces = []
+    for k in range(min(cands.count(), 30)):
+        try:
+            t = clean_review_text((cands.nth(k).text_content() or "").strip())
+            if t and REPLY_RE.match(t):
+                continue
+            if t and not t.lower().startswith("written "):
+                pieces.append(t)
+        except Exception:
+            pass
+    if pieces:
+        return max(pieces, key=len)
+    # 語系 / 通用區塊兜底
+    for sel in (TEXT_LANG_SEL, TEXT_BLOCK_SEL):
+        loc = card.locator(sel)
+        t = clean_review_text((loc.first.text_content() or "") if loc.count() else "")
+        if t:
+            return t
+    return None
+
+
+def _rating_label_att(page, card) -> str:
+    # A) aria-label directly on any element
+    el = card.locator(BUBBLES_SEL).first
+    if el.count():
+        label = (el.get_attribute("aria-label") or "").strip()
+        if label:
+            return label
+    # B) SVG 的 <title> / aria-labelledby（可能多個 id，先找卡片內再找整頁）/ aria-label
+    svg = card.locator(RATING_SVG_SEL).first
+    if svg.count():
+        ttl = svg.locator("title")
+        if ttl.count():
+            label = (ttl.first.text_content() or "").strip()
+            if label:
+                return label
+        for rid in (svg.get_attribute("aria-labelledby") or "").split():
+            ref = card.locator(f"#{rid}")
+            if not ref.count():
+                ref = page.locator(f"#{rid}")
+            if ref.count():
+                label = (ref.first.text_content() or "").strip()
+                if label:
+                    return label
+        label = (svg.get_attribute("aria-label") or "").strip()
+        if label:
+            return label
+    # C) last resort
+    alt = card.locator(RATING_ALT_SEL).first
+    return (alt.get_attribute("aria-label") or "").strip() if alt.count() else ""
+
+
+def _author_location_att(card, opts: Dict[str, Any]):
+    author = location = None
+    try:
+        name_loc = card.locator(opts["authorSel"]).first
+        if name_loc.count():
+            author = (name_loc.text_content() or "").strip() or None
+        else:
+            first_link = card.get_by_role("link").first      # 最後備援：卡片裡的第一個 link
+            if first_link.count():
+                author = (first_link.text_content() or "").strip() or None
+    except Exception:
+        pass
+    try:
+        loc = card.locator(LOCATION_SEL).first
+        if loc.count():
+            location = (loc.text_content() or "").strip()
+        # 新版：class 含 navcl 的容器，第一個 span；排除貢獻數徽章（IugUm）
+        if not location:
+            nav = card.locator(NAV_SEL).first
+            if nav.count():
+                sp = nav.locator(NAV_SPAN_SEL).first
+                if not sp.count():
+                    sp = nav.locator("span").first
+                t = (sp.text_content() or "").strip()
+                if t and not NOT_LOCATION_RE.search(t):
+                    location = t
+        # 兜底：像 "City, Country" 的短 span
+        if not location:
+            maybe = card.locator(":scope span:has-text(',')").first
+            if maybe.count():
+                t = (maybe.text_content() or "").strip()
+                if t and len(t.split()) <= 5:
+                    location = t
+    except Exception:
+        pass
+    return author, location
+
+
+def _card_att(page, card, url: str, opts: Dict[str, Any]) -> Dict[str, Any]:
+    author, location = _author_location_att(card, opts)
+    common = _card_common(card)
+    return {
+        "title": _title_att(card, opts), "text": _text_att(card),
+        "rating": extract_rating(_rating_label_att(page, card)),
+        "travel_date": common["travel_date"], "written_date": common["written_date"],
+        "language": common["language"], "author": author, "location": location,
+        "contribution_count": common["contribution_count"], "helpful_votes": common["helpful_votes"],
+        "url": url,
+    }
+
+
+def _card_app(page, card, url: str, opts: Dict[str, Any]) -> Dict[str, Any]:
+    title = None
+    for sel in TITLE_FALLBACKS:
+        loc = card.locator(sel)
+        if loc.count():
+            try:
+                title = (loc.first.inner_text() or "").strip()
+                if title:
+                    break
+            except Exception:
+                pass
+
+    text = None
+    for sel in (APP_TEXT_SEL, TEXT_LANG_SEL, TEXT_BLOCK_SEL):
+        text = pick_longest_text(card.locator(sel))
+        if text:
+            break
+
+    rating = None
+    try:
+        el = card.locator(BUBBLES_SEL).first
+        if el.count() == 0:
+            el = card.locator(RATING_ALT_SEL).first
+        if el.count():
+            rating = extract_rating_app(el.get_attribute("aria-label") or "")
+    except Exception:
+        pass
+
+    author = location = None
+    try:
+        name_loc = card.locator(opts["authorSel"])
+        if name_loc.count():
+            author = (name_loc.first.inner_text() or "").strip() or None
+        else:
+            links = card.get_by_role("link")
+            if links.count():
+                author = (links.first.inner_text() or "").strip() or None
+    except Exception:
+        pass
+    try:
+        loc = card.locator(LOCATION_SEL)
+        if loc.count():
+            location = (loc.first.inner_text() or "").strip()
+    except Exception:
+        pass
+
+    common = _card_common(card)
+    return {
+        "title": title, "text": text, "rating": rating,
+        "travel_date": common["travel_date"], "written_date": common["written_date"],
+        "language": common["language"], "author": author, "location": location,
+        "contribution_count": common["contribution_count"], "helpful_votes": common["helpful_votes"],
+        "url": page.url,
+    }
+
+
+def parse_cards_locator(page, url: str, profile: str = "att", cards_sel: Optional[str] = None) -> List[Dict[str, Any]]:
+    """逐卡 locator 版解析；app profile 保留 app.py 原本較寬鬆的規則（inner_text、url 用 page.url）。"""
+    opts = PROFILES[profile]
+    parse_card = _card_app if profile == "app" else _card_att
+    cards = page.locator(cards_sel or default_cards_sel(profile))
+    return [parse_card(page, cards.nth(i), url, opts) for i in range(cards.count())]
+
+
+# ---------- engines ----------
+
+def default_cards_sel(profile: str) -> str:
+    return APP_CARDS_SEL if profile == "app" else ATT_CARDS_SEL
+
+
+class Engine(ABC):
+    """
+    parse() 回傳 review dict list；回 None 表示這個 engine 在這一頁沒有結果（換下一個）。
+    needs_expand  ：解析前要先展開 "Read more"。
+    supports_async：有 parse_async(page, url, profile, cards_sel)（同 parse 的 async 版）；
+                    False 的 engine 不會出現在 parse_page_async 的退回順序裡。
+    """
+    name = ""
+    needs_expand = True
+    supports_async = True
+
+    @abstractmethod
+    def parse(self, page, url: str, profile: str, cards_sel: str) -> Optional[List[Dict[str, Any]]]:
+        ...
+
+
+class NetEngine(Engine):
+    name = "net"
+    needs_expand = False
+
+    def parse(self, page, url, profile, cards_sel):
+        return capture_for(page).extract(page, url)
+
+    async def parse_async(self, page, url, profile, cards_sel):
+        return await capture_for(page).extract_async(page, url)
+
+
+class EvalEngine(Engine):
+    name = "eval"
+
+    def parse(self, page, url, profile, cards_sel):
+        return extract_reviews(page, url, profile=profile, cards_sel=cards_sel)
+
+    async def parse_async(self, page, url, profile, cards_sel):
+        return await extract_reviews_async(page, url, profile=profile, cards_sel=cards_sel)
+
+
+class HtmlEngine(Engine):
+    name = "html"
+
+    def parse(self, page, url, profile, cards_sel):
+        return parse_html(page.content(), url, profile=profile, cards_sel=cards_sel)
+
+    async def parse_async(self, page, url, profile, cards_sel):
+        return parse_html(await page.content(), url, profile=profile, cards_sel=cards_sel)
+
+
+class LocatorEngine(Engine):
+    name = "locator"
+    supports_async = False
+
+    def parse(self, page, url, profile, cards_sel):
+        return parse_cards_locator(page, url, profile, cards_sel)
+
+
+ENGINES: Dict[str, Engine] = {e.name: e for e in (NetEngine(), EvalEngine(), HtmlEngine(), LocatorEngine())}
+
+FALLBACKS: Dict[str, tuple] = {
+    "net": ("net", "eval", "locator"),
+    "eval": ("eval", "locator"),
+    "html": ("html", "locator"),
+    "locator": ("locator",),
+}
+
+
+def _chain(mode: str, is_async: bool) -> List[Engine]:
+    if mode not in FALLBACKS:
+        raise ValueError(f"unknown parse mode {mode!r} (expected one of {', '.join(FALLBACKS)})")
+    names = FALLBACKS[mode]
+    if is_async:
+        names = [n for n in names if ENGINES[n].supports_async] or ["eval"]
+    return [ENGINES[n] for n in names]
+
+
+def _on_miss(engine: Engine, nxt: Engine, err: Optional[BaseException], log: Callable[[str], Any]):
+    if err is None:
+        log(f"[INFO] {engine.name}: no review payload matched the cards, fallback to {nxt.name}")
+    else:
+        log(f"[WARN] {engine.name} parse failed, fallback to {nxt.name}: {err}")
+
+
+def parse_page(page, url: str, mode: str = "eval", profile: str = "att", cards_sel: Optional[str] = None,
+               expand: Optional[str] = None, log: Callable[[str], Any] = print, **span_attrs) -> List[Dict[str, Any]]:
+    """
+    用 mode 指定的 engine 解析目前頁面的評論卡，失敗照 FALLBACKS 往下退；最後一個 engine 的例外照常丟出。
+    expand     : "Read more" 展開方式 batch / none / click（預設看 TA_EXPAND）
+    span_attrs : 帶到 expand 的 timing span（例如 page=3）
+    """
+    cards_sel = cards_sel or default_cards_sel(profile)
+    chain = _chain(mode, is_async=False)
+    expanded = False
+    for i, engine in enumerate(chain):
+        last = i == len(chain) - 1
+        if engine.needs_expand and not expanded:
+            with timings.span("expand", **span_attrs):
+                n = expand_reviews(page, expand, cards_sel=cards_sel)
+            if n:
+                log(f"[DEBUG] expanded {n} 'Read more'")
+            expanded = True
+        try:
+            out = engine.parse(page, url, profile, cards_sel)
+        except Exception as e:
+            if last:
+                raise
+            _on_miss(engine, chain[i + 1], e, log)
+            continue
+        if out is not None:
+            return out
+        if last:
+            return []
+        _on_miss(engine, chain[i + 1], None, log)
+    return []
+
+
+async def parse_page_async(page, url: str, mode: str = "eval", profile: str = "att", cards_sel: Optional[str] = None,
+                           expand: Optional[str] = None, log: Callable[[str], Any] = print,
+                           **span_attrs) -> List[Dict[str, Any]]:
+    """parse_page 的 playwright.async_api 版本（沒有 locator engine）。"""
+    cards_sel = cards_sel or default_cards_sel(profile)
+    chain = _chain(mode, is_async=True)
+    expanded = False
+    for i, engine in enumerate(chain):
+        last = i == len(chain) - 1
+        if engine.needs_expand and not expanded:
+            with timings.span("expand", **span_attrs):
+                n = await expand_reviews_async(page, expand, cards_sel=cards_sel)
+            if n:
+                log(f"[DEBUG] expanded {n} 'Read more'")
+            expanded = True
+        try:
+            out = await engine.parse_async(page, url, profile, cards_sel)
+        except Exception as e:
+            if last:
+                raise
+            _on_miss(engine, chain[i + 1], e, log)
+            continue
+        if out is not None:
+            return out
+        if last:
+            return []
+        _on_miss(engine, chain[i + 1], None, log)
+    return []
+
+
+def compare_engines(page, url: str, profile: str = "att", cards_sel: Optional[str] = None,
+                    engines=("net", "eval", "html", "locator"), expand: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    同一頁依序跑每個 engine（net 在展開前），回傳 {name: {"ms", "reviews", "error"}}，
+    用來並排比較速度與結果筆數。
+    """
+    cards_sel = cards_sel or default_cards_sel(profile)
+    res: Dict[str, Dict[str, Any]] = {}
+    expanded = False
+    for name in sorted(engines, key=lambda n: ENGINES[n].needs_expand):
+        engine = ENGINES[name]
+        if engine.needs_expand and not expanded:
+            expand_reviews(page, expand, cards_sel=cards_sel)
+            expanded = True
+        t0 = time.perf_counter()
+        try:
+            out, err = engine.parse(page, url, profile, cards_sel), None
+        except Exception as e:
+            out, err = None, str(e)
+        res[name] = {"ms": round((time.perf_counter() - t0) * 1000.0, 1),
+                     "reviews": None if out is None else len(out), "error": err}
+    return res
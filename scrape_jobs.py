@@ -0,0 +1,137 @@
+# scrape_jobs.py
+"""
+/scrape 的非同步版：送出後立刻拿到 job_id，之後輪詢進度、分段取結果。
+
+實際執行交給呼叫端提供的 start(job) -> Future（app 裡是 BrowserPool.submit），
+所以同時在跑的 job 數由 browser pool 大小決定；這裡只管排隊上限、狀態與結果保存。
+完成的 job 保留 ttl 秒後清掉。
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+class Job:
+    def __init__(self, url: str, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.params = params
+        self.status = "queued"          # queued -> running -> done / failed
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.pages_done = 0
+        self.reviews: List[Dict[str, Any]] = []
+        self.error: Optional[str] = None
+        self.error_type: Optional[str] = None
+        self._lock = threading.Lock()
+
+    # ---- 由 worker thread 呼叫 ----
+    def mark_running(self):
+        with self._lock:
+            self.status = "running"
+            self.started_at = time.time()
+
+    def add_page(self, page_index: int, page_reviews: List[Dict[str, Any]]):
+        with self._lock:
+            self.pages_done = page_index
+            self.reviews.extend(page_reviews)
+
+    def finish(self, error: Optional[BaseException] = None, error_type: Optional[str] = None):
+        with self._lock:
+            self.finished_at = time.time()
+            if error is None:
+                self.status = "done"
+            else:
+                self.status = "failed"
+                self.error = str(error)
+                self.error_type = error_type
+
+    # ---- 給 HTTP handler ----
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def to_status(self) -> Dict[str, Any]:
+        with self._lock:
+            end = self.finished_at or time.time()
+            return {
+                "job_id": self.id,
+                "url": self.url,
+                "status": self.status,
+                "pages_done": self.pages_done,
+                "reviews_so_far": len(self.reviews),
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "elapsed_s": round(end - (self.started_at or end), 3),
+                "error": self.error,
+                "error_type": self.error_type,
+            }
+
+    def results(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            end = None if limit is None else offset + limit
+            return list(self.reviews[offset:end])
+
+
+class JobManager:
+    """
+    start       : start(job) -> Future，實際跑爬蟲（job.mark_running/add_page 由它呼叫）
+    classify    : 例外 -> error_type 字串（例如 captcha / timeout）
+    max_pending : 尚未完成的 job 上限，超過就 QueueFull
+    ttl         : 完成後保留秒數
+    """
+
+    def __init__(
+        self,
+        start: Callable[[Job], Future],
+        classify: Callable[[BaseException], str] = lambda e: "error",
+        max_pending: int = 100,
+        ttl: float = 3600.0,
+    ):
+        self._start = start
+        self._classify = classify
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def _gc(self):
+        cutoff = time.time() - self.ttl
+        for jid in [j.id for j in self._jobs.values() if j.finished and (j.finished_at or 0) < cutoff]:
+            del self._jobs[jid]
+
+    def submit(self, url: str, **params) -> Job:
+        job = Job(url, params)
+        with self._lock:
+            self._gc()
+            if self.in_flight() >= self.max_pending:
+                raise QueueFull(f"too many pending jobs (max {self.max_pending})")
+            self._jobs[job.id] = job
+        fut = self._start(job)
+        fut.add_done_callback(lambda f: self._done(job, f))
+        return job
+
+    def _done(self, job: Job, fut: Future):
+        exc = fut.exception()
+        job.finish(exc, self._classify(exc) if exc is not None else None)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def in_flight(self) -> int:
+        return sum(1 for j in list(self._jobs.values()) if not j.finished)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._gc()
+            jobs = sorted(self._jobs.values(), key=lambda j: j.created_at)
+        return [j.to_status() for j in jobs]
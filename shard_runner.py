@@ -0,0 +1,424 @@
+# shard_runner.py
+"""
+多行程版的 warmup_and_scrape cli：把 TripAdv_Atts_List.json / TripAdv_Foods_List.json 的 URL
+依 hash 分給 N 個 worker 行程，每個行程有自己的 browser 與 storage_state，所有核心一起跑。
+
+    python shard_runner.py --kind att --workers 4 --only Luang_Prabang
+    python shard_runner.py --kind food --workers 6 --headless
+
+每個 shard 的檔案（<name>.shard<i><ext>）：
+    processed_urls_<kind>.shard<i>.txt : shard 自己的 checkpoint，每爬完一個 URL 追加一行
+    checkpoint_<kind>.shard<i>.jsonl   : shard 自己的頁層級 checkpoint（checkpoint.py；讀主檔續爬、寫這個檔）
+    reviews_<kind>.shard<i>.csv        : shard 自己的 CSV，逐頁 flush
+    ta_state.shard<i>.json             : shard 自己的 storage_state（第一次從 --state 複製）
+    logs/<kind>.shard<i>.log           : 該行程原本印在終端機的 [INFO] / [DEBUG]
+開始與結束時把 shard 的 checkpoint / CSV 併回 processed_urls_<kind>.txt / checkpoint_<kind>.jsonl / reviews_<kind>.csv，
+中途被中斷也不會遺失，下次啟動時先併。同一個 URL 永遠落在同一個 shard（crc32），重跑時
+shard 自己的 checkpoint 就能接續。
+
+終端機只有一個彙整畫面：每 --interval 秒一行 [PROGRESS]（完成 / 失敗 URL、評論數、各 worker 正在爬哪個），
+以及失敗的 URL。
+
+禮貌間隔：TA_HOST_INTERVAL 是「所有 worker 合計」同 host 兩次請求的間隔，每個 worker 用 N 倍，
+整體送出的請求速率和單行程一樣。
+驗證頁：worker 沒有終端機可以按 Enter，遇到時該 URL 記為失敗、不寫 checkpoint，下次再爬
+（需要手動過驗證請用 warmup_and_scrape.py 單行程跑）。
+其他 TA_*（TA_REVIEW_DB、TA_INCREMENTAL、TA_PAGINATE、TA_TABS、TA_PARSE_MODE、TA_BLOCK_*…）與 cli 相同；
+TA_REVIEW_DB 是 WAL 模式的 SQLite，多個行程共用同一個檔沒問題。
+"""
+import argparse
+import csv
+import importlib
+import multiprocessing as mp
+import os
+import queue
+import shutil
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from checkpoint import merge_checkpoints
+from review_sinks import FIELDNAMES, Sink
+
+KINDS = {
+    "att": ("TripAdv_Atts_List.json", "warmup_and_scrape"),
+    "food": ("TripAdv_Foods_List.json", "warmup_and_scrape_food_reviews"),
+}
+
+
+def shard_of(url: str, n: int) -> int:
+    return zlib.crc32(url.encode("utf-8")) % n
+
+
+def shard_path(path: Path, shard: int) -> Path:
+    return path.with_name(f"{path.stem}.shard{shard}{path.suffix}")
+
+
+def _shard_files(path: Path) -> List[Path]:
+    return sorted(path.parent.glob(f"{path.stem}.shard*{path.suffix}"))
+
+
+def _read_lines(path: Path) -> List[str]:
+    if not path.exists():
+        return []
+    return [ln.strip() for ln in path.read_text(encoding="utf-8").splitlines() if ln.strip()]
+
+
+def read_processed(path: Path) -> Set[str]:
+    """processed_urls 主檔 + 所有 shard checkpoint 的聯集。"""
+    done = set(_read_lines(path))
+    for f in _shard_files(path):
+        done.update(_read_lines(f))
+    return done
+
+
+def merge_processed(path: Path) -> int:
+    """shard checkpoint 併回主檔（只追加主檔沒有的），併完刪掉 shard 檔；回傳新增行數。"""
+    shards = _shard_files(path)
+    if not shards:
+        return 0
+    known = set(_read_lines(path))
+    added = []
+    for f in shards:
+        for u in _read_lines(f):
+            if u not in known:
+                known.add(u)
+                added.append(u)
+    if added:
+        with open(path, "a", encoding="utf-8") as pf:
+            pf.write("".join(u + "\n" for u in added))
+            pf.flush()
+            os.fsync(pf.fileno())
+    for f in shards:
+        f.unlink()
+    return len(added)
+
+
+def merge_csv(path: Path) -> int:
+    """shard CSV 接到主 CSV 後面（主檔不存在就先寫 header），併完刪掉 shard 檔；回傳併入的列數。"""
+    shards = [f for f in _shard_files(path) if f.stat().st_size]
+    rows = 0
+    if shards:
+        new_file = not path.exists() or path.stat().st_size == 0
+        with open(path, "a", newline="", encoding="utf-8") as out:
+            w = csv.writer(out)
+            if new_file:
+                w.writerow(FIELDNAMES)
+            for f in shards:
+                with open(f, newline="", encoding="utf-8") as fin:
+                    r = csv.reader(fin)
+                    next(r, None)                               # shard 檔自己的 header
+                    for row in r:
+                        w.writerow(row)
+                        rows += 1
+            out.flush()
+            os.fsync(out.fileno())
+    for f in _shard_files(path):
+        f.unlink()
+    return rows
+
+
+def load_urls(json_path: Path, processed: Set[str], only: Optional[str], include_processed: bool) -> List[str]:
+    import json
+    with open(json_path, "r", encoding="utf-8") as f:
+        urls = json.load(f)
+    if not isinstance(urls, list):
+        raise SystemExit(f"[ERROR] JSON 應該是 list，但得到 {type(urls)}")
+    out, seen = [], set()
+    for u in urls:
+        if u in seen or "#REVIEWS" in u or (only and only not in u):
+            continue
+        if u in processed and not include_processed:
+            continue
+        seen.add(u)
+        out.append(u)
+    return out
+
+
+# ---------- worker 行程 ----------
+
+class _ProgressSink(Sink):
+    """每寫出一頁就回報筆數給主行程。"""
+
+    def __init__(self, events, shard: int):
+        super().__init__()
+        self.events = events
+        self.shard = shard
+
+    def write(self, batch: List[Dict[str, Any]]):
+        self.rows += len(batch)
+        self.events.put(("rows", self.shard, len(batch)))
+
+
+def _worker(kind: str, shard: int, urls: List[str], opts: Dict[str, Any], events):
+    # 原本印在終端機的輸出改寫到 shard 的 log；沒有 stdin，驗證頁的 input() 會直接 EOFError
+    log = open(opts["log"], "a", encoding="utf-8", buffering=1)
+    sys.stdout = sys.stderr = log
+    sys.stdin = open(os.devnull)
+    if os.environ.get("TA_TIMING_FILE"):
+        os.environ["TA_TIMING_FILE"] = str(shard_path(Path(os.environ["TA_TIMING_FILE"]), shard))
+
+    from playwright.sync_api import sync_playwright
+
+    from checkpoint import PageCheckpoint
+    from rate_limit import HostRateLimiter
+    from resource_block import policy_from_env
+    from review_sinks import CsvSink, ParquetSink
+    from review_store import ReviewStore
+    from scrape_core import new_context
+    from timing import timings
+
+    mod = importlib.import_module(KINDS[kind][1])
+    sinks: List[Sink] = [CsvSink(Path(opts["out_csv"]), append=True), _ProgressSink(events, shard)]
+    if os.environ.get("TA_PARQUET_DIR"):
+        sinks.append(ParquetSink(Path(os.environ["TA_PARQUET_DIR"]).resolve()))
+    review_db = os.environ.get("TA_REVIEW_DB")
+    store = ReviewStore(Path(review_db).resolve()) if review_db else None
+    limiter = HostRateLimiter(float(os.environ.get("TA_HOST_INTERVAL", "1.0")) * opts["workers"], jitter=0.5)
+    checkpoint = PageCheckpoint(opts["checkpoint"], base=opts["checkpoint_base"]) if opts["checkpoint"] else None
+    state = Path(opts["state"])
+    try:
+        with sync_playwright() as p:
+            browser = p.chromium.launch(headless=opts["headless"], args=["--disable-blink-features=AutomationControlled"])
+            block = policy_from_env()
+            ctx = new_context(browser, storage_state=str(state), block=block)
+            page = ctx.new_page()
+            page.set_default_timeout(opts["timeout_ms"])
+            for url in urls:
+                events.put(("url", shard, url))
+                print(f"[INFO] 處理 URL: {url}")
+                try:
+                    with timings.scope(url=url):
+                        n = mod.run_same_context(
+                            target=url, max_pages=opts["max_pages"], timeout_ms=opts["timeout_ms"],
+                            debug_dir=opts["debug_dir"], out_json=None, out_csv=None, page=page,
+                            sinks=sinks, store=store, incremental=opts["incremental"],
+                            paginate=opts["paginate"], tabs=opts["tabs"], limiter=limiter,
+                            checkpoint=checkpoint,
+                        )
+                except Exception as e:
+                    print(f"[WARN] {url} failed: {e}")
+                    events.put(("fail", shard, url, f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"))
+                    continue
+                with open(opts["processed"], "a", encoding="utf-8") as pf:
+                    pf.write(url + "\n")
+                events.put(("done", shard, url, n))
+            try:
+                ctx.storage_state(path=str(state))
+            except Exception as e:
+                print(f"[WARN] Save storage state failed: {e}")
+            browser.close()
+    finally:
+        for s in sinks:
+            s.close()
+        if store is not None:
+            store.close()
+        if checkpoint is not None:
+            checkpoint.close()
+        timings.print_summary()
+        timings.close()
+        events.put(("exit", shard, None))
+
+
+# ---------- 主行程 ----------
+
+class Progress:
+    def __init__(self, total: int, workers: int, tty: bool = False):
+        self.total = total
+        self.tty = tty          # tty 上 [PROGRESS] 是原地重畫的那一行，其他訊息要先換行
+        self.done = 0
+        self.failed = 0
+        self.reviews = 0
+        self.current: Dict[int, Optional[str]] = {i: None for i in range(workers)}
+        self.exited: Set[int] = set()
+        self.said_exit: Set[int] = set()     # 收到 exit 事件的 worker（它之前送的事件都已經讀過）
+        self.t0 = time.monotonic()
+
+    def apply(self, ev):
+        kind, shard = ev[0], ev[1]
+        if kind == "url":
+            self.current[shard] = ev[2]
+        elif kind == "rows":
+            self.reviews += ev[2]
+        elif kind == "done":
+            self.done += 1
+            self.current[shard] = None
+        elif kind == "fail":
+            self.failed += 1
+            self.current[shard] = None
+            print(f"{self._nl()}[FAIL] w{shard} {ev[2]}: {ev[3]}")
+        elif kind == "exit":
+            self.exited.add(shard)
+            self.said_exit.add(shard)
+            self.current[shard] = None
+
+    def _nl(self) -> str:
+        return "\n" if self.tty else ""
+
+    def line(self) -> str:
+        mins = max(1e-9, (time.monotonic() - self.t0) / 60.0)
+        finished = self.done + self.failed
+        workers = " ".join(
+            f"w{i}:{'exit' if i in self.exited else _short(u) if u else 'idle'}" for i, u in sorted(self.current.items()))
+        return (f"[PROGRESS] {finished}/{self.total} urls ({self.failed} failed) | {self.reviews} reviews | "
+                f"{finished / mins:.1f} urls/min, {self.reviews / mins:.0f} reviews/min | {workers}")
+
+
+def drain(events, progress: Progress, expect: Set[int], timeout: float = 5.0):
+    """
+    行程結束了，queue 裡可能還有它最後送的 rows / done / exit：先等 expect 裡每個 worker 的 exit 事件
+    （最多 timeout 秒），再把剩下的讀完，最後的統計才不會少算。
+    """
+    deadline = time.monotonic() + timeout
+    while not expect <= progress.said_exit and time.monotonic() < deadline:
+        try:
+            progress.apply(events.get(timeout=0.2))
+        except queue.Empty:
+            pass
+    while True:
+        try:
+            progress.apply(events.get_nowait())
+        except queue.Empty:
+            return
+
+
+def _short(url: str, width: int = 24) -> str:
+    name = url.rstrip("/").rsplit("/", 1)[-1]
+    parts = name.split("-Reviews-", 1)
+    name = parts[-1].split("-", 1)[0] if len(parts) == 2 else name
+    return name[:width]
+
+
+def _print_progress(progress: Progress, tty: bool):
+    if tty:
+        cols = shutil.get_terminal_size().columns - 1
+        print("\r" + progress.line()[:cols].ljust(cols), end="", flush=True)
+    else:
+        print(progress.line(), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shard the attraction / food URL list across worker processes.")
+    parser.add_argument("--kind", choices=sorted(KINDS), default="att")
+    parser.add_argument("--input", help="URL list JSON (default: TripAdv_Atts_List.json / TripAdv_Foods_List.json)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="worker processes, one browser each (default: half the CPU count)")
+    parser.add_argument("--out-csv", help="default: reviews_<kind>.csv")
+    parser.add_argument("--processed", help="default: processed_urls_<kind>.txt")
+    parser.add_argument("--state", default="ta_state.json", help="storage_state each shard starts from")
+    parser.add_argument("--log-dir", default="logs")
+    parser.add_argument("--debug-dir", help="save a screenshot per page here (off by default)")
+    parser.add_argument("--only", help="only crawl URLs containing this substring (e.g. Luang_Prabang)")
+    parser.add_argument("--max-pages", type=int, default=300)
+    parser.add_argument("--timeout-ms", type=int, default=15000)
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between progress lines")
+    parser.add_argument("--headless", action="store_true")
+    args = parser.parse_args()
+
+    n = max(1, args.workers)
+    json_path = Path(args.input or KINDS[args.kind][0]).resolve()
+    out_csv = Path(args.out_csv or f"reviews_{args.kind}.csv").resolve()
+    processed_path = Path(args.processed or f"processed_urls_{args.kind}.txt").resolve()
+    # TA_CHECKPOINT：頁層級 checkpoint 主檔（預設 checkpoint_<kind>.jsonl，設成 0 關閉）
+    ckpt_env = os.environ.get("TA_CHECKPOINT", f"checkpoint_{args.kind}.jsonl")
+    ckpt_path = None if ckpt_env.lower() in ("", "0", "false", "no", "off") else Path(ckpt_env).resolve()
+    state = Path(args.state).resolve()
+    log_dir = Path(args.log_dir).resolve()
+    log_dir.mkdir(parents=True, exist_ok=True)
+
+    # 上次中斷留下的 shard 檔先併回來
+    merged = merge_processed(processed_path)
+    rows = merge_csv(out_csv)
+    if ckpt_path is not None:
+        unfinished = merge_checkpoints(ckpt_path, _shard_files(ckpt_path))
+        if unfinished:
+            print(f"[INFO] {unfinished} URLs resume mid-way from {ckpt_path.name}")
+    if merged or rows:
+        print(f"[INFO] merged leftovers from the last run: {merged} processed URLs, {rows} CSV rows")
+
+    incremental = bool(os.environ.get("TA_REVIEW_DB")) and os.environ.get("TA_INCREMENTAL", "0") in ("1", "true", "yes")
+    urls = load_urls(json_path, read_processed(processed_path), args.only, include_processed=incremental)
+    shards: List[List[str]] = [[] for _ in range(n)]
+    for u in urls:
+        shards[shard_of(u, n)].append(u)
+    print(f"[INFO] {len(urls)} URLs pending -> {n} workers ({', '.join(str(len(s)) for s in shards)})")
+    print(f"[INFO] out_csv={out_csv} processed={processed_path} logs={log_dir}")
+    if not urls:
+        return
+
+    spawn = mp.get_context("spawn")     # Playwright 不能跨 fork 用
+    events = spawn.Queue()
+    procs: Dict[int, Any] = {}
+    for i, part in enumerate(shards):
+        if not part:
+            continue
+        shard_state = shard_path(state, i)
+        if not shard_state.exists() and state.exists():
+            shutil.copyfile(state, shard_state)
+        opts = {
+            "workers": n,
+            "out_csv": str(shard_path(out_csv, i)),
+            "processed": str(shard_path(processed_path, i)),
+            "checkpoint": str(shard_path(ckpt_path, i)) if ckpt_path else None,
+            "checkpoint_base": str(ckpt_path) if ckpt_path else None,
+            "state": str(shard_state),
+            "log": str(log_dir / f"{args.kind}.shard{i}.log"),
+            "debug_dir": Path(args.debug_dir).resolve() / f"shard{i}" if args.debug_dir else None,
+            "headless": args.headless,
+            "max_pages": args.max_pages,
+            "timeout_ms": args.timeout_ms,
+            "incremental": incremental,
+            "paginate": os.environ.get("TA_PAGINATE", "url"),
+            "tabs": max(1, int(os.environ.get("TA_TABS", "1"))),
+        }
+        procs[i] = spawn.Process(target=_worker, args=(args.kind, i, part, opts, events), name=f"shard{i}")
+        procs[i].start()
+
+    tty = sys.stdout.isatty()
+    progress = Progress(len(urls), n, tty)
+    progress.exited.update(i for i in range(n) if i not in procs)
+    clean: Set[int] = set()     # exit code 0 的 worker：一定有送 exit 事件
+    last = 0.0
+    try:
+        while True:
+            try:
+                progress.apply(events.get(timeout=0.5))
+            except queue.Empty:
+                pass
+            for i, proc in procs.items():
+                if i not in progress.exited and not proc.is_alive():
+                    progress.exited.add(i)
+                    if proc.exitcode == 0:
+                        clean.add(i)            # 正常結束，exit 事件可能還在 queue 裡（結束前 drain）
+                        continue
+                    # 沒送 exit 就結束：browser / 行程掛了
+                    print(f"{progress._nl()}[FAIL] w{i} exited with code {proc.exitcode}, "
+                          f"see {log_dir / f'{args.kind}.shard{i}.log'}")
+            if len(progress.exited) == n:
+                break
+            if time.monotonic() - last >= args.interval:
+                last = time.monotonic()
+                _print_progress(progress, tty)
+    except KeyboardInterrupt:
+        print("\n[INFO] interrupted, stopping workers…")
+        for proc in procs.values():
+            proc.terminate()
+    finally:
+        for proc in procs.values():
+            proc.join(timeout=30)
+        drain(events, progress, clean)
+        _print_progress(progress, tty)
+        if tty:
+            print()
+        merged = merge_processed(processed_path)
+        rows = merge_csv(out_csv)
+        if ckpt_path is not None:
+            merge_checkpoints(ckpt_path, _shard_files(ckpt_path))
+        print(f"[DONE] {progress.done} urls, {progress.failed} failed, {progress.reviews} reviews; "
+              f"merged {merged} processed URLs and {rows} CSV rows into {processed_path.name} / {out_csv.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+# tests/conftest.py
+# 模組都放在 repo 根目錄（flat layout），和 bench/ 一樣把根目錄加進 sys.path
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,109 @@
+# tests/test_app.py
+from unittest import mock
+
+import pytest
+
+app = pytest.importorskip("app")
+
+
+def test_classify_error_only_counts_verification_as_captcha():
+    from playwright.sync_api import TimeoutError as PWTimeoutError
+
+    assert app._classify_error(app.VerificationRequired("CAPTCHA")) == "captcha"
+    assert app._classify_error(RuntimeError("cannot schedule new futures after shutdown")) == "error"
+    assert app._classify_error(PWTimeoutError("slow")) == "timeout"
+
+
+@pytest.mark.parametrize("exc, status", [
+    (app.VerificationRequired("CAPTCHA"), 403),
+    (RuntimeError("pool shut down"), 500),
+])
+def test_scrape_maps_errors_to_status(exc, status):
+    client = app.app.test_client()
+    with mock.patch.object(app, "scrape_tripadvisor_reviews", side_effect=exc):
+        resp = client.post("/scrape", json={"url": "https://www.tripadvisor.com/x"})
+    assert resp.status_code == status
+
+
+class _Loc:
+    def __init__(self, page, n, on_click=None):
+        self.page, self.n, self.on_click = page, n, on_click
+
+    @property
+    def first(self):
+        return self
+
+    def count(self):
+        return self.n
+
+    def is_visible(self):
+        return self.n > 0
+
+    def is_enabled(self):
+        return True
+
+    def click(self):
+        if self.on_click:
+            self.on_click()
+
+
+class _Page:
+    """只有評論卡和 Next；點 Next 之後變成驗證頁。"""
+
+    url = "https://www.tripadvisor.com/Attraction_Review-g1-d2-Reviews-X.html"
+    NEXT = "nav[aria-label='Pagination'] a[aria-label*='Next']"
+    CARDS = "div[data-test-target='review-card'], [data-automation='reviewCard']"
+
+    def __init__(self):
+        self.verification = False
+
+    def _next(self):
+        self.verification = True
+        self.url = self.url.replace("-Reviews-", "-Reviews-or10-")
+
+    def locator(self, sel):
+        if sel == self.NEXT:
+            return _Loc(self, 1, self._next)
+        return _Loc(self, 1 if sel == self.CARDS else 0)
+
+    def get_by_role(self, *a, **kw):
+        return _Loc(self, 0)
+
+    def set_default_timeout(self, ms): pass
+    def goto(self, url, **kw): pass
+    def wait_for_load_state(self, *a, **kw): pass
+    def content(self): return "<html></html>"
+
+
+def test_verification_after_next_is_counted_as_captcha_and_discards_context():
+    page, cache = _Page(), mock.Mock()
+    cache.acquire.return_value = page
+    before = app._m_scrapes._values.get(("captcha",), 0)
+    with mock.patch.object(app, "context_cache", return_value=cache), \
+            mock.patch.object(app, "looks_like_verification", side_effect=lambda p: p.verification), \
+            mock.patch.object(app, "parse_page", return_value=[{"title": "t"}]), \
+            mock.patch.object(app, "first_card_key_js", return_value="k1"), \
+            mock.patch.object(app, "wait_cards_changed"), \
+            mock.patch.object(app, "wait_dom_quiet"), \
+            mock.patch.object(app._host_limiter, "wait_sync"):
+        with pytest.raises(app.VerificationRequired):
+            app._scrape_in_browser(None, page.url, max_pages=5, page_timeout_ms=1000, storage_state="s.json")
+    assert app._m_scrapes._values.get(("captcha",), 0) == before + 1
+    cache.discard.assert_called_once_with("s.json")
+    cache.release.assert_not_called()
+
+
+def test_run_job_keeps_results_only_in_the_job():
+    from scrape_jobs import Job
+
+    def fake_scrape(browser, url, max_pages, timeout_ms, storage_state, on_page=None, collect=True):
+        assert collect is False
+        on_page(1, [{"title": "a"}])
+        on_page(2, [{"title": "b"}])
+        return []
+
+    job = Job("https://www.tripadvisor.com/x", {"max_pages": 2, "timeout_ms": 1000, "storage_state": None})
+    with mock.patch.object(app, "_scrape_in_browser", side_effect=fake_scrape):
+        out = app._run_job(None, job)
+    assert out is job.reviews
+    assert [r["title"] for r in job.results()] == ["a", "b"]
@@ -0,0 +1,93 @@
+# tests/test_checkpoint.py
+import json
+
+from checkpoint import PageCheckpoint, checkpoint_from_env, merge_checkpoints
+
+URL = "https://www.tripadvisor.com/Attraction_Review-g1-d2-Reviews-X.html"
+OTHER = "https://www.tripadvisor.com/Attraction_Review-g1-d3-Reviews-Y.html"
+
+
+def page_url(i):
+    return URL.replace("-Reviews-", f"-Reviews-or{(i - 1) * 10}-") if i > 1 else URL
+
+
+def test_resume_after_crash_uses_last_page(tmp_path):
+    path = tmp_path / "ck.jsonl"
+    ck = PageCheckpoint(path)
+    for i in range(1, 4):
+        ck.page_done(page_url(i), "X", i, (i - 1) * 10, f"k{i}", 10)
+    # 不 close，模擬行程掛掉
+    r = PageCheckpoint(path).resume(page_url(7))
+    assert (r["page"], r["offset"], r["key"]) == (3, 20, "k3")
+
+
+def test_url_done_clears_resume(tmp_path):
+    path = tmp_path / "ck.jsonl"
+    ck = PageCheckpoint(path)
+    ck.page_done(URL, "X", 1)
+    ck.url_done(URL)
+    ck.close()
+    assert PageCheckpoint(path).resume(URL) is None
+
+
+def test_torn_tail_is_skipped_and_terminated(tmp_path):
+    path = tmp_path / "ck.jsonl"
+    ck = PageCheckpoint(path)
+    ck.page_done(URL, "X", 2)
+    ck.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"url": "https://www.tripadvisor.com/Attr')     # crash 在寫到一半
+    ck = PageCheckpoint(path)
+    assert ck.resume(URL)["page"] == 2
+    ck.page_done(OTHER, "Y", 5)
+    ck.close()
+    # 新的一筆不會黏在半行後面
+    ck = PageCheckpoint(path)
+    assert ck.resume(OTHER)["page"] == 5
+    assert ck.resume(URL)["page"] == 2
+
+
+def test_compaction_keeps_only_unfinished(tmp_path):
+    path = tmp_path / "ck.jsonl"
+    ck = PageCheckpoint(path)
+    for i in range(1, 30):
+        ck.page_done(URL, "X", i)
+        ck.page_done(OTHER, "Y", i)
+    ck.url_done(OTHER)
+    ck.close()
+    ck = PageCheckpoint(path, compact_min_lines=10)
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [(r["url"], r["page"]) for r in lines] == [(URL, 29)]
+    ck.page_done(URL, "X", 30)
+    ck.close()
+    assert PageCheckpoint(path).resume(URL)["page"] == 30
+
+
+def test_shard_reads_base_and_merge(tmp_path):
+    main = tmp_path / "ck.jsonl"
+    ck = PageCheckpoint(main)
+    ck.page_done(URL, "X", 4)
+    ck.page_done(OTHER, "Y", 2)
+    ck.close()
+
+    shard = tmp_path / "ck.shard0.jsonl"
+    sh = PageCheckpoint(shard, base=main)
+    assert sh.resume(URL)["page"] == 4
+    sh.page_done(URL, "X", 6)
+    sh.url_done(OTHER)
+    sh.close()
+
+    assert merge_checkpoints(main, [shard]) == 1
+    assert not shard.exists()
+    merged = PageCheckpoint(main)
+    assert merged.resume(URL)["page"] == 6
+    assert merged.resume(OTHER) is None
+
+
+def test_checkpoint_from_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("TA_CHECKPOINT", "0")
+    assert checkpoint_from_env("att", tmp_path / "w1.jsonl") is None
+    monkeypatch.delenv("TA_CHECKPOINT")
+    ck = checkpoint_from_env("att", tmp_path / "w1.jsonl")
+    assert ck.path == tmp_path / "w1.jsonl"
+    ck.close()
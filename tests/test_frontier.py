@@ -0,0 +1,136 @@
+# tests/test_frontier.py
+import threading
+import time
+
+import pytest
+
+from frontier import FileFrontier, Frontier, RedisFrontier, kind_of
+
+ATT = "https://www.tripadvisor.com/Attraction_Review-g1-d{}-Reviews-X.html"
+LIST = "https://www.tripadvisor.com/Attractions-g295415-Activities-oa0-Luang_Prabang.html"
+OPTS = {"visibility": 0.3, "max_attempts": 2, "retry_delay": 0.1}
+
+
+@pytest.fixture(params=["file", "redis"])
+def fr(request, tmp_path):
+    if request.param == "file":
+        f = FileFrontier(tmp_path / "frontier.db", **OPTS)
+    else:
+        fakeredis = pytest.importorskip("fakeredis")
+        f = RedisFrontier(client=fakeredis.FakeRedis(decode_responses=True), **OPTS)
+    yield f
+    f.close()
+
+
+def test_kind_of():
+    assert kind_of(ATT.format(1)) == "att"
+    assert kind_of(LIST) == "att_list"
+    assert kind_of("https://www.tripadvisor.com/Restaurant_Review-g1-d2-Reviews-Y.html") == "food"
+    assert kind_of("https://example.com/") is None
+
+
+def test_backend_missing_a_method_fails_at_construction():
+    class Partial(Frontier):
+        def add(self, urls, kind=None):
+            return 0
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_add_dedupes_canonical_urls(fr):
+    paged = ATT.format(1).replace("-Reviews-", "-Reviews-or10-") + "#REVIEWS"
+    assert fr.add([ATT.format(1), paged, "https://example.com/"]) == 1
+    assert fr.add([ATT.format(1)]) == 0
+    assert fr.stats() == {"pending": 1, "leased": 0, "done": 0, "dead": 0}
+
+
+def test_lease_is_exclusive_and_follows_kind_order(fr):
+    fr.add([ATT.format(1), LIST])
+    first = fr.lease()
+    assert first.kind == "att_list" and first.attempt == 1
+    second = fr.lease()
+    assert second.url == ATT.format(1)
+    assert fr.lease() is None
+    assert fr.stats()["leased"] == 2
+    assert fr.done(first) and fr.done(second)
+    assert not fr.done(second)
+    assert fr.stats() == {"pending": 0, "leased": 0, "done": 2, "dead": 0}
+
+
+def test_expired_lease_is_taken_over(fr):
+    fr.add([ATT.format(1)])
+    stale = fr.lease()
+    time.sleep(0.35)
+    fresh = fr.lease()
+    assert fresh.url == stale.url and fresh.attempt == 2
+    # 原本的 worker 已經失去 lease
+    assert not fr.extend(stale)
+    assert not fr.done(stale)
+    assert fr.fail(stale, "late") == "lost"
+    assert fr.done(fresh)
+
+
+def test_extend_keeps_lease_and_zero_releases(fr):
+    fr.add([ATT.format(1)])
+    lease = fr.lease()
+    time.sleep(0.2)
+    assert fr.extend(lease)
+    time.sleep(0.2)
+    assert fr.lease() is None          # 延長過，還沒到期
+    assert fr.extend(lease, 0)
+    assert fr.lease().url == lease.url
+
+
+def test_fail_retries_with_backoff_then_dead(fr):
+    fr.add([ATT.format(1)])
+    lease = fr.lease()
+    assert fr.fail(lease, "RuntimeError: boom") == "retry"
+    assert fr.lease() is None          # 還在 retry_delay 內
+    time.sleep(0.15)
+    lease = fr.lease()
+    assert lease.attempt == 2
+    assert fr.fail(lease, "RuntimeError: boom") == "dead"
+    assert fr.stats()["dead"] == 1
+    assert fr.requeue() == 1
+    assert fr.lease().attempt == 1
+
+
+def test_expired_last_attempt_goes_dead(fr):
+    fr.add([ATT.format(1)])
+    fr.lease()
+    time.sleep(0.35)
+    fr.lease()
+    time.sleep(0.35)
+    assert fr.lease() is None
+    assert fr.stats()["dead"] == 1
+
+
+def test_requeue_done_for_recrawl(fr):
+    fr.add([ATT.format(1), LIST])
+    for _ in range(2):
+        fr.done(fr.lease())
+    assert fr.requeue("done", kinds=["att"]) == 1
+    assert fr.lease().url == ATT.format(1)
+
+
+def test_concurrent_workers_never_share_a_url(fr):
+    fr.visibility = 30
+    fr.add([ATT.format(i) for i in range(200)])
+    got, lock = [], threading.Lock()
+
+    def work():
+        while True:
+            lease = fr.lease(["att"])
+            if lease is None:
+                return
+            with lock:
+                got.append(lease.url)
+            fr.done(lease)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(got) == len(set(got)) == 200
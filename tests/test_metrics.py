@@ -0,0 +1,84 @@
+# tests/test_metrics.py
+import pytest
+
+from metrics import CONTENT_TYPE, Registry, counter, counter_func, gauge, gauge_func, histogram, render
+
+
+def test_counter_renders_help_type_and_sorted_labels():
+    reg = Registry()
+    c = counter("ta_scrapes_total", "Scrapes by outcome.", ["outcome"], registry=reg)
+    c.inc(outcome="ok")
+    c.inc(2, outcome="ok")
+    c.inc(outcome="captcha")
+    assert render(reg).splitlines() == [
+        "# HELP ta_scrapes_total Scrapes by outcome.",
+        "# TYPE ta_scrapes_total counter",
+        'ta_scrapes_total{outcome="captcha"} 1',
+        'ta_scrapes_total{outcome="ok"} 3',
+    ]
+    assert render(reg).endswith("\n")
+    assert "version=0.0.4" in CONTENT_TYPE
+
+
+def test_unlabelled_counter_starts_at_zero():
+    reg = Registry()
+    counter("ta_pages_total", "Pages.", registry=reg)
+    assert "ta_pages_total 0" in render(reg).splitlines()
+
+
+def test_counter_rejects_negative_and_wrong_labels():
+    c = counter("x_total", "x", ["endpoint"], registry=Registry())
+    with pytest.raises(ValueError):
+        c.inc(-1, endpoint="a")
+    with pytest.raises(ValueError):
+        c.inc(other="a")
+
+
+def test_label_values_are_escaped():
+    reg = Registry()
+    counter("x_total", "x", ["url"], registry=reg).inc(url='a"b\\c\nd')
+    assert 'x_total{url="a\\"b\\\\c\\nd"} 1' in render(reg)
+
+
+def test_gauge_set_inc_dec():
+    reg = Registry()
+    g = gauge("ta_jobs", "Jobs.", registry=reg)
+    g.set(5)
+    g.inc(0.5)
+    g.dec(2)
+    assert "ta_jobs 3.5" in render(reg).splitlines()
+
+
+def test_histogram_buckets_are_cumulative():
+    reg = Registry()
+    h = histogram("ta_page_seconds", "Per-page latency.", ["mode"], buckets=(1, 0.5, 2), registry=reg)
+    for v in (0.2, 0.5, 1.3, 7):
+        h.observe(v, mode="url")
+    lines = render(reg).splitlines()
+    assert lines[1] == "# TYPE ta_page_seconds histogram"
+    assert lines[2:] == [
+        'ta_page_seconds_bucket{mode="url",le="0.5"} 2',
+        'ta_page_seconds_bucket{mode="url",le="1"} 2',
+        'ta_page_seconds_bucket{mode="url",le="2"} 3',
+        'ta_page_seconds_bucket{mode="url",le="+Inf"} 4',
+        'ta_page_seconds_sum{mode="url"} 9',
+        'ta_page_seconds_count{mode="url"} 4',
+    ]
+
+
+def test_func_metrics_read_at_render_and_skip_errors():
+    reg = Registry()
+    n = [1]
+    gauge_func("ta_in_flight", "In flight.", lambda: n[0], registry=reg)
+    counter_func("ta_broken_total", "Broken.", lambda: 1 / 0, registry=reg)
+    n[0] = 4
+    out = render(reg)
+    assert "# TYPE ta_in_flight gauge\nta_in_flight 4\n" in out
+    assert "ta_broken_total" not in out
+
+
+def test_duplicate_name_is_rejected():
+    reg = Registry()
+    counter("x_total", "x", registry=reg)
+    with pytest.raises(ValueError):
+        gauge("x_total", "x", registry=reg)
@@ -0,0 +1,70 @@
+# tests/test_review_extract.py
+import asyncio
+
+import pytest
+
+from review_extract import expand_reviews, expand_reviews_async
+
+
+class _Expanders:
+    def __init__(self, log, is_async):
+        self.log, self.is_async = log, is_async
+
+    def _ret(self, v):
+        if not self.is_async:
+            return v
+
+        async def f():
+            return v
+        return f()
+
+    def count(self):
+        return self._ret(2)
+
+    def nth(self, i):
+        return self
+
+    def click(self, timeout=None):
+        self.log.append("click")
+        return self._ret(None)
+
+
+class _Page:
+    def __init__(self, is_async, eval_fails=False):
+        self.log = []
+        self.is_async = is_async
+        self.eval_fails = eval_fails
+
+    def locator(self, sel):
+        return _Expanders(self.log, self.is_async)
+
+    def evaluate(self, js, arg):
+        self.log.append("eval")
+        if self.eval_fails:
+            raise RuntimeError("CSP")
+        res = {"expanded": 3}
+        if not self.is_async:
+            return res
+
+        async def f():
+            return res
+        return f()
+
+
+def _run(is_async, page, mode):
+    if is_async:
+        return asyncio.run(expand_reviews_async(page, mode))
+    return expand_reviews(page, mode)
+
+
+@pytest.mark.parametrize("is_async", [False, True])
+@pytest.mark.parametrize("mode, eval_fails, n, log", [
+    ("batch", False, 3, ["eval"]),
+    ("batch", True, 2, ["eval", "click", "click"]),
+    ("click", False, 2, ["click", "click"]),
+    ("none", False, 0, []),
+])
+def test_sync_and_async_expand_behave_the_same(is_async, mode, eval_fails, n, log):
+    page = _Page(is_async, eval_fails)
+    assert _run(is_async, page, mode) == n
+    assert page.log == log
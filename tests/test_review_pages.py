@@ -0,0 +1,101 @@
+# tests/test_review_pages.py
+from review_pages import iter_fanout_pages, iter_offset_pages, page_offset, page_url, supports_offset
+
+URL = "https://www.tripadvisor.com/Attraction_Review-g295415-d3671945-Reviews-UXO_Lao.html"
+PER_PAGE = 10
+LAST = 4        # 第 4 頁只有 3 則
+
+
+class FakeTab:
+    """卡片要等 wait_for_selector 之後才「渲染」出來；domcontentloaded 時還是空的。"""
+
+    def __init__(self, context, url=URL):
+        self.context = context
+        self.url = url
+        self._next = None
+        self.rendered = False
+        self.closed = False
+
+    def evaluate(self, js, url):
+        self._next = url
+
+    def wait_for_url(self, pred, wait_until=None, timeout=None):
+        self.url, self.rendered = self._next, False
+
+    def goto(self, url, wait_until=None, timeout=None):
+        self.url, self.rendered = url, False
+
+    def wait_for_selector(self, sel, timeout=None):
+        self.rendered = True
+
+    def close(self):
+        self.closed = True
+
+    def index(self):
+        return page_offset(self.url) // PER_PAGE + 1
+
+
+class FakeContext:
+    def __init__(self):
+        self.tabs = []
+
+    def new_page(self):
+        tab = FakeTab(self, "about:blank")
+        self.tabs.append(tab)
+        return tab
+
+
+def parse_no_wait(tab, i):
+    # 不自己等卡片的 parse_page
+    if not tab.rendered:
+        return []
+    n = 3 if tab.index() == LAST else PER_PAGE
+    return [f"p{tab.index()}r{k}" for k in range(n)]
+
+
+def first_key(tab):
+    return f"k{tab.index()}" if tab.rendered else None
+
+
+def test_page_url_roundtrip():
+    assert supports_offset(URL)
+    u = page_url(URL, 3)
+    assert "-Reviews-or20-" in u and page_offset(u) == 20
+    assert page_url(u, 1) == URL
+
+
+def test_fanout_waits_for_cards_before_parsing():
+    ctx = FakeContext()
+    page = FakeTab(ctx)
+    page.rendered = True
+    batches = list(iter_fanout_pages(page, URL, max_pages=10, per_page=PER_PAGE, tabs=2,
+                                     parse_page=parse_no_wait, first_key=first_key, total_reviews=33))
+    assert [len(b) for b in batches] == [10, 10, 10, 3]
+    assert all(t.closed for t in ctx.tabs)
+
+
+def test_fanout_resume_starts_at_page():
+    ctx = FakeContext()
+    page = FakeTab(ctx)
+    batches = list(iter_fanout_pages(page, URL, max_pages=10, per_page=PER_PAGE, tabs=2,
+                                     parse_page=parse_no_wait, first_key=first_key, total_reviews=33,
+                                     start=3, seen=["k2"]))
+    assert [b[0] for b in batches] == ["p3r0", "p4r0"]
+
+
+def test_offset_pages_resume_and_repeat_guard():
+    page = FakeTab(FakeContext())
+    page.rendered = True
+
+    def goto(p, u):
+        p.goto(u)
+        p.rendered = True
+
+    def first_key_capped(tab):
+        # offset 超出範圍：TA 導回最後一頁
+        return f"k{min(tab.index(), 2)}"
+
+    batches = list(iter_offset_pages(page, URL, max_pages=10, per_page=PER_PAGE,
+                                     parse_page=lambda p, i: [i] * PER_PAGE, first_key=first_key_capped,
+                                     goto=goto, start=2, seen=["k1"]))
+    assert [b[0] for b in batches] == [2]
@@ -0,0 +1,87 @@
+# tests/test_review_sinks.py
+import csv
+
+import pytest
+
+from review_sinks import FIELDNAMES, CsvSink, Sink
+
+
+def test_sink_without_write_fails_at_construction():
+    class NoWrite(Sink):
+        pass
+
+    with pytest.raises(TypeError):
+        NoWrite()
+
+
+def test_rows_is_per_instance():
+    class Count(Sink):
+        def write(self, batch):
+            self.rows += len(batch)
+
+    a, b = Count(), Count()
+    a.write([{}, {}])
+    assert (a.rows, b.rows) == (2, 0)
+    assert "rows" not in vars(Sink)
+
+
+def test_csv_sink_appends_without_second_header(tmp_path):
+    path = tmp_path / "r.csv"
+    with CsvSink(path) as s:
+        s.write([{"title": "a"}])
+    with CsvSink(path) as s:
+        s.write([{"title": "b", "extra": 1}])
+        assert s.rows == 1
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == FIELDNAMES
+    assert [r[FIELDNAMES.index("title")] for r in rows[1:]] == ["a", "b"]
+
+
+def _page(att, n, start=0):
+    return [{"attraction": att, "title": f"t{i}", "rating": "4", "written_date": "Written March 3, 2024"}
+            for i in range(start, start + n)]
+
+
+def test_parquet_rows_are_readable_after_close(tmp_path):
+    pytest.importorskip("pyarrow")
+    from review_sinks import ParquetSink, read_reviews
+
+    with ParquetSink(tmp_path, row_group_size=3) as s:
+        s.write(_page("A", 2))
+        s.write(_page("A", 2, 2))
+        s.write(_page("B", 1))
+    assert len(s.files) == 2
+    assert read_reviews(tmp_path).num_rows == 5
+    assert not list(tmp_path.glob(".*"))        # journal 收尾後刪掉
+
+
+def test_parquet_recovers_pages_of_a_crashed_run(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    import review_sinks
+    from review_sinks import ParquetSink, read_reviews
+
+    crashed = ParquetSink(tmp_path, row_group_size=5000)
+    crashed.write(_page("A", 3))
+    crashed.write(_page("A", 2, 3))
+    crashed._journal.write('{"attraction": "A", "tit')     # 寫到一半的行
+    crashed._journal.flush()
+    # 不 close：part 檔沒有 footer，buffer 也沒寫出
+
+    monkeypatch.setattr(review_sinks, "_pid_alive", lambda pid: False)
+    s = ParquetSink(tmp_path)
+    s.close()
+    assert s.recovered == 5
+    t = read_reviews(tmp_path)
+    assert sorted(t.column("title").to_pylist()) == [f"t{i}" for i in range(5)]
+    assert not list(tmp_path.glob(".*"))
+
+
+def test_parquet_leaves_journals_of_live_writers_alone(tmp_path):
+    pytest.importorskip("pyarrow")
+    from review_sinks import ParquetSink
+
+    live = ParquetSink(tmp_path)
+    live.write(_page("A", 2))
+    assert ParquetSink(tmp_path).recovered == 0     # 同一個行程 = 還活著
+    live.close()
@@ -0,0 +1,84 @@
+# tests/test_review_store.py
+from datetime import date
+
+import pytest
+
+from review_sinks import write_all
+from review_store import HighWaterMark, ReviewStore, canonical_url, skip_known, until_watermark
+
+URL = "https://www.tripadvisor.com/Attraction_Review-g1-d2-Reviews-X.html"
+
+
+def review(i, day):
+    return {"title": f"t{i}", "author": f"a{i}", "written_date": f"Written August {day}, 2025",
+            "text": f"text {i}", "url": URL}
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = ReviewStore(tmp_path / "reviews.db")
+    yield s
+    s.close()
+
+
+def crawl(store, pages, incremental=True):
+    """和 run_same_context 一樣的串法：until_watermark -> skip_known -> sinks，跑完才 commit。"""
+    hwm = HighWaterMark(store, URL) if incremental else None
+    pipeline = iter(pages)
+    if hwm is not None:
+        pipeline = until_watermark(pipeline, store, URL, hwm=hwm)
+    pipeline = skip_known(pipeline, store)
+    written = []
+    for batch in pipeline:
+        write_all([store], batch)
+        written.extend(batch)
+    if hwm is not None:
+        hwm.commit()
+    return written
+
+
+def test_canonical_url_drops_offset_query_fragment():
+    assert canonical_url(URL.replace("-Reviews-", "-Reviews-or20-") + "?x=1#REVIEWS") == URL
+
+
+def test_skip_known_filters_and_stops_on_known_page(store):
+    store.upsert_many([review(1, 10), review(2, 9)])
+    pages = [[review(3, 11), review(1, 10)], [review(2, 9)], [review(4, 1)]]
+    out = list(skip_known(iter(pages), store))
+    assert [[r["title"] for r in b] for b in out] == [["t3"]]
+
+
+def test_watermark_committed_when_skip_known_stops_first(store):
+    # 第 2 頁都是已知評論：skip_known 先 return，until_watermark 不會再被 resume
+    store.upsert_many([review(2, 9), review(3, 8)])
+    written = crawl(store, [[review(1, 10), review(2, 9)], [review(3, 8)]])
+    assert [r["title"] for r in written] == ["t1"]
+    mark = store.get_watermark(URL)
+    assert mark is not None
+    assert mark[1] == date(2025, 8, 10)
+
+
+def test_watermark_advances_and_stops_incremental_crawl(store):
+    crawl(store, [[review(1, 10), review(2, 9)]])
+    assert store.get_watermark(URL)[1] == date(2025, 8, 10)
+
+    # 重爬：第 1 頁有一則新的，第 2 頁整頁比 mark 舊 -> 停
+    pages = [[review(5, 12), review(1, 10)], [review(2, 9)], [review(9, 1)]]
+    written = crawl(store, pages)
+    assert [r["title"] for r in written] == ["t5"]
+    assert store.get_watermark(URL)[1] == date(2025, 8, 12)
+
+
+def test_watermark_not_committed_on_failure(store):
+    def pages():
+        yield [review(1, 10)]
+        raise RuntimeError("browser died")
+
+    with pytest.raises(RuntimeError):
+        crawl(store, pages())
+    assert store.get_watermark(URL) is None
+
+
+def test_until_watermark_standalone_commits_on_exhaustion(store):
+    list(until_watermark(iter([[review(1, 10)], [review(2, 9)]]), store, URL))
+    assert store.get_watermark(URL)[1] == date(2025, 8, 10)
@@ -0,0 +1,43 @@
+# tests/test_run_bench.py
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bench"))
+run_bench = pytest.importorskip("run_bench")
+
+PARAMS = {"attractions": 3, "reviews": 50, "max_pages": 50, "links_per_list": 30, "latency_ms": 0.0}
+
+
+def _save(path, params=PARAMS, results=None):
+    path.write_text(json.dumps({"params": params, "results": results or {"app": {"reviews": 150}}}))
+
+
+def test_load_baseline_rejects_missing_mismatched_or_partial(tmp_path):
+    path = tmp_path / "baseline.json"
+    with pytest.raises(ValueError, match="no baseline"):
+        run_bench.load_baseline(path, PARAMS, ["app"])
+    _save(path, params=dict(PARAMS, reviews=10))
+    with pytest.raises(ValueError, match="differ"):
+        run_bench.load_baseline(path, PARAMS, ["app"])
+    _save(path)
+    with pytest.raises(ValueError, match="warmup"):
+        run_bench.load_baseline(path, PARAMS, ["app", "warmup"])
+    assert run_bench.load_baseline(path, PARAMS, ["app"]) == {"app": {"reviews": 150}}
+
+
+def test_default_run_fails_before_benchmarking_without_baseline(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["run_bench.py", "--baseline", str(tmp_path / "none.json")])
+    monkeypatch.setattr(run_bench, "FixtureServer", None)    # 不應該走到啟動 server
+    with pytest.raises(SystemExit) as e:
+        run_bench.main()
+    assert e.value.code == 2
+
+
+def test_compare_flags_regressions_and_changed_output():
+    base = {"app": {"reviews": 150, "pages_per_s": 10.0, "rss_mb": 100.0}}
+    assert run_bench.compare({"app": {"reviews": 150, "pages_per_s": 9.0, "rss_mb": 110.0}}, base, 0.15) == []
+    problems = run_bench.compare({"app": {"reviews": 149, "pages_per_s": 8.0, "rss_mb": 120.0}}, base, 0.15)
+    assert len(problems) == 3
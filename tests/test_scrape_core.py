@@ -0,0 +1,19 @@
+# tests/test_scrape_core.py
+import pytest
+
+from scrape_core import ENGINES, Engine, _chain
+
+
+def test_async_chain_skips_sync_only_engines():
+    assert [e.name for e in _chain("net", is_async=True)] == ["net", "eval"]
+    assert [e.name for e in _chain("locator", is_async=True)] == ["eval"]
+    assert [e.name for e in _chain("html", is_async=False)] == ["html", "locator"]
+    assert not ENGINES["locator"].supports_async
+
+
+def test_engine_without_parse_fails_at_construction():
+    class NoParse(Engine):
+        name = "x"
+
+    with pytest.raises(TypeError):
+        NoParse()
@@ -0,0 +1,36 @@
+# tests/test_shard_runner.py
+import multiprocessing as mp
+
+from shard_runner import Progress, drain, shard_of
+
+
+def _chatty_worker(events, shard):
+    events.put(("url", shard, "u"))
+    for _ in range(500):
+        events.put(("rows", shard, 1))
+    events.put(("done", shard, "u", 500))
+    events.put(("exit", shard, None))
+
+
+def test_drain_reads_events_left_by_exited_workers():
+    ctx = mp.get_context("spawn")
+    events = ctx.Queue()
+    procs = [ctx.Process(target=_chatty_worker, args=(events, i)) for i in range(2)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert all(p.exitcode == 0 for p in procs)
+
+    progress = Progress(total=2, workers=2)
+    progress.exited.update({0, 1})      # 監看迴圈從 is_alive() 得知結束，事件一個都還沒讀
+    drain(events, progress, expect={0, 1})
+    assert progress.said_exit == {0, 1}
+    assert (progress.done, progress.reviews) == (2, 1000)
+
+
+def test_shard_of_is_stable_and_in_range():
+    urls = [f"https://www.tripadvisor.com/Attraction_Review-g1-d{i}-Reviews-X.html" for i in range(100)]
+    shards = [shard_of(u, 4) for u in urls]
+    assert shards == [shard_of(u, 4) for u in urls]
+    assert set(shards) <= {0, 1, 2, 3}
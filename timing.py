@@ -0,0 +1,217 @@
+# timing.py
+"""
+各階段計時：每個景點 / 每一頁的 goto、consent、ensure_on_reviews、scroll、expand、parse、
+pagination、write 各花多少時間，輸出成 JSON lines 的 span，並彙整成百分位數。
+
+    with timings.scope(url=target):            # 之後的 span 都帶上 url
+        with timings.span("goto"):
+            page.goto(target)
+        with timings.span("parse", page=3):
+            ...
+
+    timings.print_summary()                     # 每個 phase 的 count / p50 / p90 / p99 / max
+
+TA_TIMING_FILE=spans.jsonl 時每個 span 寫一行：
+    {"ts": 1723456789.12, "phase": "parse", "ms": 812.4, "self_ms": 301.9, "ok": true, "url": "...", "page": 3}
+
+span 可以巢狀（例如 parse 裡面包 expand）：ms 是含子 span 的總時間，self_ms 扣掉子 span，
+百分位數用 self_ms 算，各 phase 加起來不會重複計算。
+用 contextvars 記目前的 span / scope，thread 與 asyncio task 各自獨立。
+
+既有的 spans 檔也可以離線彙整：python timing.py spans.jsonl [more.jsonl ...]
+"""
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+# 列印順序；wait_cards（等評論卡出現）與 rate_limit（禮貌間隔）單獨列出，和網路 / 解析分開
+PHASES = ("goto", "consent", "ensure_on_reviews", "scroll", "wait_cards", "expand", "parse",
+          "pagination", "rate_limit", "write")
+
+_current: contextvars.ContextVar[Optional["_Span"]] = contextvars.ContextVar("timing_span", default=None)
+_attrs: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("timing_attrs", default={})
+
+
+class _Span:
+    __slots__ = ("phase", "start", "child_s")
+
+    def __init__(self, phase: str):
+        self.phase = phase
+        self.start = time.perf_counter()
+        self.child_s = 0.0
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """nearest-rank；sorted_values 需已排序。"""
+    if not sorted_values:
+        return None
+    k = max(0, math.ceil(q / 100.0 * len(sorted_values)) - 1)
+    return sorted_values[min(k, len(sorted_values) - 1)]
+
+
+class _PhaseStats:
+    __slots__ = ("count", "errors", "total_s", "samples")
+
+    def __init__(self, max_samples: int):
+        self.count = 0
+        self.errors = 0
+        self.total_s = 0.0
+        self.samples: Deque[float] = deque(maxlen=max_samples)   # 只留最近的，長駐的 app 不會無限成長
+
+    def add(self, seconds: float, ok: bool):
+        self.count += 1
+        self.errors += 0 if ok else 1
+        self.total_s += seconds
+        self.samples.append(seconds)
+
+    def summary(self) -> Dict[str, Any]:
+        xs = sorted(self.samples)
+        ms = lambda v: round(v * 1000.0, 1) if v is not None else None
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_s": round(self.total_s, 3),
+            "p50_ms": ms(percentile(xs, 50)),
+            "p90_ms": ms(percentile(xs, 90)),
+            "p99_ms": ms(percentile(xs, 99)),
+            "max_ms": ms(xs[-1] if xs else None),
+        }
+
+
+class Timings:
+    """
+    path        : JSON lines 輸出檔（None 表示只在記憶體彙整）
+    max_samples : 每個 phase 留多少筆樣本算百分位數
+    """
+
+    def __init__(self, path: Optional[str] = None, max_samples: int = 10000):
+        self.path = path
+        self.max_samples = max_samples
+        self._stats: Dict[str, _PhaseStats] = {}
+        self._lock = threading.Lock()
+        self._fh = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._fh = open(path, "a", encoding="utf-8", buffering=1)
+
+    @contextmanager
+    def scope(self, **attrs):
+        """在這個區塊裡產生的 span 都帶上 attrs（例如 url=...）。"""
+        token = _attrs.set({**_attrs.get(), **attrs})
+        try:
+            yield
+        finally:
+            _attrs.reset(token)
+
+    @contextmanager
+    def span(self, phase: str, **attrs):
+        parent = _current.get()
+        s = _Span(phase)
+        token = _current.set(s)
+        ok = True
+        try:
+            yield
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            _current.reset(token)
+            dur = time.perf_counter() - s.start
+            if parent is not None:
+                parent.child_s += dur
+            self._record(phase, dur, max(0.0, dur - s.child_s), ok, attrs)
+
+    def record(self, phase: str, seconds: float, ok: bool = True, **attrs):
+        """量好的時間直接記一筆（例如 callback 裡自己算的）。"""
+        parent = _current.get()
+        if parent is not None:
+            parent.child_s += seconds
+        self._record(phase, seconds, seconds, ok, attrs)
+
+    def _record(self, phase: str, wall_s: float, self_s: float, ok: bool, attrs: Dict[str, Any]):
+        with self._lock:
+            st = self._stats.get(phase)
+            if st is None:
+                st = self._stats[phase] = _PhaseStats(self.max_samples)
+            st.add(self_s, ok)
+            if self._fh is not None:
+                row = {"ts": round(time.time(), 3), "phase": phase, "ms": round(wall_s * 1000.0, 1),
+                       "self_ms": round(self_s * 1000.0, 1), "ok": ok, **_attrs.get(), **attrs}
+                self._fh.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {phase: st.summary() for phase, st in self._stats.items()}
+
+    def print_summary(self):
+        rows = self.summary()
+        if not rows:
+            return
+        print(f"[TIMING] {'phase':<18} {'count':>6} {'total_s':>9} {'p50_ms':>9} {'p90_ms':>9} {'p99_ms':>9} {'max_ms':>9}")
+        order = [p for p in PHASES if p in rows] + sorted(p for p in rows if p not in PHASES)
+        for p in order:
+            r = rows[p]
+            print(f"[TIMING] {p:<18} {r['count']:>6} {r['total_s']:>9} {r['p50_ms']:>9} "
+                  f"{r['p90_ms']:>9} {r['p99_ms']:>9} {r['max_ms']:>9}")
+
+    def reset(self):
+        """清掉已彙整的數字（benchmark 每個 flow 之間用）。"""
+        with self._lock:
+            self._stats.clear()
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+def timings_from_env() -> Timings:
+    """TA_TIMING_FILE：span 的 JSON lines 輸出路徑（不設就只在記憶體彙整）。"""
+    return Timings(os.environ.get("TA_TIMING_FILE") or None)
+
+
+# 行程內共用的一份（CLI、app、async crawler 都寫到這裡）
+timings = timings_from_env()
+
+
+def load_spans(paths: Iterable[str]) -> Timings:
+    """讀既有的 spans 檔，重新彙整。"""
+    t = Timings()
+    for fn in paths:
+        with open(fn, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                    self_ms = row.get("self_ms", row["ms"])
+                    t._record(row["phase"], row["ms"] / 1000.0, self_ms / 1000.0, bool(row.get("ok", True)), {})
+                except (ValueError, KeyError, TypeError):
+                    continue
+    return t
+
+
+def _summary_main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Aggregate timing spans (JSON lines) into per-phase percentiles.")
+    parser.add_argument("spans", nargs="+", help="spans.jsonl written with TA_TIMING_FILE")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    t = load_spans(args.spans)
+    if args.json:
+        print(json.dumps(t.summary(), indent=2))
+    else:
+        t.print_summary()
+
+
+if __name__ == "__main__":
+    _summary_main()
@@ -3,10 +3,12 @@ import json
 import sys
 import time
 from datetime import datetime
-from typing import List, Set
+from typing import List, Optional, Set
 
 from playwright.async_api import async_playwright, TimeoutError as PWTimeoutError
 
+from resource_block import policy_from_env
+
 START_URL_DEFAULT = (
     "https://www.tripadvisor.com/Restaurants-g295415-Luang_Prabang_Luang_Prabang_Province.html"
 )
@@ -156,11 +158,12 @@ async def find_and_click_next(page, context) -> bool:
                 continue
     return False
 
-async def run(start_url: str):
+async def run(start_url: str, headless: bool = False, channel: Optional[str] = "chrome", outfile: str = OUTFILE):
+    """headless / channel / outfile 預設同原本的手動流程；crawl_worker 用 headless Chromium 跑。"""
     async with async_playwright() as p:
         # 建議先 headful + Chrome 觀察；通過後可改 headless
         browser = await p.chromium.launch(
-            headless=False, channel="chrome",
+            headless=headless, channel=channel,
             args=["--disable-blink-features=AutomationControlled"]
         )
 
@@ -190,23 +193,9 @@ async def run(start_url: str):
             Object.defineProperty(navigator, 'languages', { get: () => ['en-US','en']});
         """)
 
-        # （可選）擋常見廣告/追蹤，減少干擾
-        AD_BLOCK = True
-        AD_DOMAINS = (
-            "doubleclick.net", "googlesyndication.com", "googletagservices.com",
-            "google-analytics.com", "googletagmanager.com", "ads.as.criteo.com",
-            "adnxs.com", "taboola.com", "rubiconproject.com", "facebook.com/tr",
-        )
-        if AD_BLOCK:
-            async def _router(route, request):
-                url = request.url
-                # 別擋驗證用網域
-                if any(x in url for x in ("captcha-delivery.com", "datadome")):
-                    return await route.continue_()
-                if any(d in url for d in AD_DOMAINS):
-                    return await route.abort()
-                return await route.continue_()
-            await context.route("**/*", _router)
+        # 擋廣告/追蹤與圖片字型（驗證用網域一律放行），TA_BLOCK_* 可調
+        block = policy_from_env()
+        await block.install_async(context)
 
         page = await context.new_page()
 
@@ -302,6 +291,7 @@ async def run(start_url: str):
             print(f"[WARN] Save storage state failed: {e}")
 
         await browser.close()
+        print(f"[INFO] resource blocking: {block.summary()}")
 
         out = {
             "source": start_url,
@@ -309,9 +299,10 @@ async def run(start_url: str):
             "count": len(all_links),
             "links": sorted(all_links),
         }
-        with open(OUTFILE, "w", encoding="utf-8") as f:
+        with open(outfile, "w", encoding="utf-8") as f:
             json.dump(out, f, ensure_ascii=False, indent=2)
-        print(f"[DONE] Saved {len(all_links)} links to {OUTFILE}")
+        print(f"[DONE] Saved {len(all_links)} links to {outfile}")
+        return out
 
 
 
@@ -0,0 +1,115 @@
+# waits.py
+"""
+條件式等待：等到「某件事發生」就返回，不再固定睡幾秒。
+
+    wait_cards(page)                     評論卡出現
+    wait_cards_changed(page, before_key) 第一張評論卡換掉（翻頁完成）
+    wait_dom_quiet(page)                 DOM 一小段時間沒有再變動（展開、lazyload 結束）
+
+每個都有 *_async 版本給 playwright.async_api。
+禮貌性的間隔不放在這裡，統一交給 rate_limit.HostRateLimiter（在發出請求之前等）。
+"""
+from typing import Optional
+
+REVIEW_CARD_SEL = "div[data-test-target='review-card'], [data-automation='reviewCard'], div[data-test-target='HR_CC_CARD']"
+
+# 與 warmup_and_scrape.first_card_key 同樣的 title|author|written 組合，一次 evaluate 取回
+FIRST_CARD_KEY_JS = r"""
+(sel) => {
+  const card = document.querySelector(sel);
+  if (!card) return null;
+  const q = (s) => card.querySelector(s);
+  const t = q("a[href*='ShowUserReviews'] span, span.yCeTE, [data-automation='reviewTitle'], " +
+              "a[data-test-target='review-title'], span[data-test-target='review-title'], h3, h4");
+  const a = q("[data-automation='memberName']");
+  const w = Array.from(card.querySelectorAll("span"))
+    .find((s) => /written/i.test((s.textContent || "").replace(/\s+/g, " ")));
+  const key = [t, a, w].map((e) => (e ? (e.textContent || "").trim() : "")).join("|").trim();
+  return key || null;
+}
+"""
+
+# wait_for_function 用；不用 eval，避免被頁面的 CSP 擋掉
+CARD_KEY_CHANGED_JS = (
+    "([sel, before]) => { const k = (" + FIRST_CARD_KEY_JS + ")(sel); return !!k && k !== before; }"
+)
+
+# root 底下 quietMs 內沒有任何 mutation 就 resolve(true)；超過 maxMs 還在變就 resolve(false)
+DOM_QUIET_JS = r"""
+([sel, quietMs, maxMs]) => new Promise((resolve) => {
+  const root = (sel && document.querySelector(sel)) || document.body || document.documentElement;
+  let timer = null, cap = null;
+  const obs = new MutationObserver(() => {
+    clearTimeout(timer);
+    timer = setTimeout(() => done(true), quietMs);
+  });
+  const done = (v) => { obs.disconnect(); clearTimeout(timer); clearTimeout(cap); resolve(v); };
+  obs.observe(root, { subtree: true, childList: true, characterData: true, attributes: true });
+  timer = setTimeout(() => done(true), quietMs);
+  cap = setTimeout(() => done(false), maxMs);
+})
+"""
+
+
+def first_card_key_js(page, sel: str = REVIEW_CARD_SEL) -> Optional[str]:
+    try:
+        return page.evaluate(FIRST_CARD_KEY_JS, sel)
+    except Exception:
+        return None
+
+
+def wait_cards(page, timeout_ms: int = 8000, sel: str = REVIEW_CARD_SEL) -> bool:
+    try:
+        page.wait_for_selector(sel, timeout=timeout_ms)
+        return True
+    except Exception:
+        return False
+
+
+def wait_cards_changed(page, before_key: Optional[str], timeout_ms: int = 8000, sel: str = REVIEW_CARD_SEL) -> bool:
+    """等到第一張卡的 key 和 before_key 不同（before_key 為 None 時只等卡片出現）。"""
+    try:
+        page.wait_for_function(CARD_KEY_CHANGED_JS, arg=[sel, before_key], timeout=timeout_ms)
+        return True
+    except Exception:
+        return False
+
+
+def wait_dom_quiet(page, root_sel: Optional[str] = None, quiet_ms: int = 150, timeout_ms: int = 2000) -> bool:
+    try:
+        return bool(page.evaluate(DOM_QUIET_JS, [root_sel, quiet_ms, timeout_ms]))
+    except Exception:
+        # 等待中剛好換頁（execution context destroyed）也當作穩定了
+        return False
+
+
+async def first_card_key_js_async(page, sel: str = REVIEW_CARD_SEL) -> Optional[str]:
+    try:
+        return await page.evaluate(FIRST_CARD_KEY_JS, sel)
+    except Exception:
+        return None
+
+
+async def wait_cards_async(page, timeout_ms: int = 8000, sel: str = REVIEW_CARD_SEL) -> bool:
+    try:
+        await page.wait_for_selector(sel, timeout=timeout_ms)
+        return True
+    except Exception:
+        return False
+
+
+async def wait_cards_changed_async(page, before_key: Optional[str], timeout_ms: int = 8000,
+                                   sel: str = REVIEW_CARD_SEL) -> bool:
+    try:
+        await page.wait_for_function(CARD_KEY_CHANGED_JS, arg=[sel, before_key], timeout=timeout_ms)
+        return True
+    except Exception:
+        return False
+
+
+async def wait_dom_quiet_async(page, root_sel: Optional[str] = None, quiet_ms: int = 150,
+                               timeout_ms: int = 2000) -> bool:
+    try:
+        return bool(await page.evaluate(DOM_QUIET_JS, [root_sel, quiet_ms, timeout_ms]))
+    except Exception:
+        return False
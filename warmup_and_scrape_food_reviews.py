@@ -1,40 +1,23 @@
 # warmup_then_scrape_same_context.py
-import re, sys, time, json, csv, os, argparse, random
+import re, sys, time, os, argparse, random
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Iterator
 from datetime import datetime
 from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
 from urllib.parse import urljoin
 
-UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-      "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36")
-
-#_bubble_re = re.compile(r"(\d+(?:\.\d+)?)\s*bubbles", re.I)
-
-def extract_rating(label: str | None) -> float | None:
-    if not label:
-        return None
-    # "4 of 5 bubbles", "4.0 of 5 bubbles"
-    m = re.search(r"(\d+(?:\.\d+)?)\s*(?:of|out of)\s*5\s*bubbles", label, re.I)
-    if not m:
-        # fallback: "4 bubbles"
-        m = re.search(r"(\d+(?:\.\d+)?)\s*bubbles", label, re.I)
-    try:
-        return float(m.group(1)) if m else None
-    except Exception:
-        return None
-
-def pick_longest_text(loc):
-    try:
-        n = loc.count()
-        best = ""
-        for i in range(min(n, 40)):
-            try:
-                t = (loc.nth(i).inner_text() or "").strip()
-                if len(t) > len(best): best = t
-            except: pass
-        return best or None
-    except: return None
+from review_capture import capture_for
+from review_extract import ATT_CARDS_SEL
+from resource_block import policy_from_env
+from review_sinks import CsvSink, JsonArraySink, ParquetSink, Sink, write_all
+from review_store import HighWaterMark, ReviewStore, skip_known, until_watermark
+from review_pages import REVIEWS_PER_PAGE, iter_fanout_pages, iter_offset_pages, page_url, supports_offset, total_review_count
+from rate_limit import HostRateLimiter
+from checkpoint import PageCheckpoint, checkpoint_from_env
+from scrape_core import looks_like_verification, new_context, parse_page
+from timing import timings
+from waits import wait_cards, wait_cards_changed, wait_dom_quiet
+from warmup_and_scrape import dedupe_reviews, with_attraction
 
 def rsleep(a=0.6, b=1.1):
     time.sleep(random.uniform(a, b))
@@ -42,22 +25,8 @@ def rsleep(a=0.6, b=1.1):
 def human_scroll(page, steps=10):
     for _ in range(steps):
         page.mouse.wheel(0, 800)           # mimic user scroll
-        # don't wait for 'networkidle' (can hang on TA)
-        page.wait_for_timeout(300)          # ~0.3s pause
-
-def looks_like_verification(page) -> bool:
-    try:
-        txt = (page.inner_text("body") or "").lower()
-    except: 
-        return False
-    if "verification required" in txt or "slide right to complete the puzzle" in txt:
-        return True
-    # DataDome iframe
-    try:
-        if page.locator("iframe[src*='captcha-delivery.com'], iframe[title*='captcha']").count():
-            return True
-    except: pass
-    return False
+        # don't wait for 'networkidle' (can hang on TA)；lazyload 一停就繼續，最多 0.3s
+        wait_dom_quiet(page, quiet_ms=100, timeout_ms=300)
 
 from urllib.parse import urljoin
 
@@ -66,7 +35,7 @@ def dismiss_overlays(page):
     try:
         # Hit ESC once (sometimes closes modals)
         page.keyboard.press("Escape")
-        page.wait_for_timeout(200)
+        wait_dom_quiet(page, quiet_ms=100, timeout_ms=500)   # modal 關掉的動畫 / 移除一停就繼續
     except Exception:
         pass
 
@@ -85,7 +54,7 @@ def dismiss_overlays(page):
             }
             """
         )
-        page.wait_for_timeout(200)
+        # el.remove() 在 evaluate 回來前就完成了，不用再等
     except Exception:
         pass
 
@@ -102,7 +71,7 @@ def ensure_on_reviews(page):
         if page.locator("#REVIEWS").count():
             page.evaluate("() => { location.hash = 'REVIEWS'; }")
             page.locator("#REVIEWS").scroll_into_view_if_needed()
-            page.wait_for_timeout(250)
+            wait_dom_quiet(page, quiet_ms=100, timeout_ms=800)   # 捲過去觸發的 lazyload
     except Exception:
         pass
 
@@ -123,8 +92,7 @@ def ensure_on_reviews(page):
 
         # make sure it’s visible and nothing is covering it
         try:
-            el.scroll_into_view_if_needed()
-            page.wait_for_timeout(120)
+            el.scroll_into_view_if_needed()     # 本身就會等元素位置穩定
             dismiss_overlays(page)
         except Exception:
             pass
@@ -152,15 +120,21 @@ def ensure_on_reviews(page):
     # 3) final fallback: force the hash and scroll
     try:
         page.evaluate("() => { location.hash = 'REVIEWS'; }")
-        page.wait_for_timeout(200)
         page.locator("#REVIEWS").scroll_into_view_if_needed()
-        page.wait_for_timeout(200)
+        wait_cards(page, timeout_ms=1500)
     except Exception:
         pass
 
 
-def parse_current_page(page, debug_dir: Optional[Path], page_idx: int, target: str) -> List[Dict[str, Any]]:
-    """解析目前頁面的所有評論卡。"""
+def parse_current_page(page, debug_dir: Optional[Path], page_idx: int, target: str, mode: str = "eval", expand: Optional[str] = None) -> List[Dict[str, Any]]:
+    """解析目前頁面的所有評論卡（engine 與退回順序見 scrape_core.parse_page）。
+
+    mode="net"     : 用 GraphQL 回應 / 內嵌 state 的評論（見 review_capture），不用展開；對不上卡片就走 eval
+    mode="eval"    : 一次 eval_on_selector_all 抓回整頁（見 review_extract），失敗才退回 locator
+    mode="html"    : 只抓一次 page.content()，在 Python 端用 lxml 解析（見 offline_parse）
+    mode="locator" : 逐卡 locator（舊做法，每張卡幾十次 IPC）
+    expand         : "Read more" 展開方式 batch / none / click（預設看 TA_EXPAND，見 review_extract）
+    """
     if debug_dir:
         debug_dir.mkdir(parents=True, exist_ok=True)
         snap = debug_dir / f"page_{page_idx:03d}.png"
@@ -170,276 +144,9 @@ def parse_current_page(page, debug_dir: Optional[Path], page_idx: int, target: s
         except Exception as e:
             print(f"[WARN] screenshot failed: {e}")
 
-    # 展開 Read more
-    try:
-        expanders = page.locator("text=/^(Read more|More|Show more|更多|もっと読む)$/i")
-        for i in range(min(expanders.count(), 20)):
-            try:
-                expanders.nth(i).click(timeout=800)
-                rsleep(0.2, 0.45)
-            except: pass
-    except: pass
-
-    # 支援 reviewText 作為卡片選擇器
-    cards_sel = "div[data-test-target='review-card'], [data-automation='reviewCard'], " \
-                "div[data-test-target='HR_CC_CARD'], div[data-test-target='reviewText'], " \
-                "[data-automation='reviewText'], span[data-automation^='reviewText_'], " \
-                "div[class*='JVaPo']"
-    cards = page.locator(cards_sel)
-    count = cards.count()
-    print(f"[INFO] Found {count} review cards on page {page_idx}")
-    out: List[Dict[str, Any]] = []
-
-    for i in range(count):
-        card = cards.nth(i)
-        # review title
-        title = None
-
-        # 1) New TA markup seen in your screenshot
-        loc = card.locator("a[href*='ShowUserReviews'], span.yCeTE").first
-        if loc.count():
-            title = (loc.text_content() or "").strip()
-            print(f"[DEBUG] Found title in new markup: {title!r}")
-
-
-        # 2) Foods 方案：直接抓 <a> 本身的文字（像你 screenshot 看到的 Beautiful setting!）
-        if not title:
-            loc2 = card.locator("a[href*='ShowUserReviews']").first
-            if loc2.count():
-                title = (loc2.text_content() or "").strip()
-                print(f"[DEBUG] Found title in <a>: {title!r}")
-                
-        # 2) Fallbacks (older markups)
-        if not title:
-            for sel in [
-                "[data-automation='reviewTitle']",
-                "a[data-test-target='review-title']",
-                "span[data-test-target='review-title']",
-                "h3, h4",
-            ]:
-                l = card.locator(sel)
-                if l.count():
-                    try:
-                        title = (l.first.text_content() or "").strip()
-                        if title:
-                            print(f"[DEBUG] Found title in fallback markup: {title!r}")
-                            break
-                    except Exception:
-                        pass
-
-        # text  —— 專抓評論內容容器，避免落到 "Written ..." 或 disclaimer
-        def _clean_review_text(s: str | None) -> str | None:
-            if not s:
-                return None
-            s = s.strip()
-            # 去掉常見尾巴
-            s = re.sub(r"\b(Read more|Show less)\b.*$", "", s, flags=re.I)
-            s = re.sub(r"^Written\s+\w+\s+\d{1,2},\s+\d{4}.*$", "", s, flags=re.I)
-            s = re.sub(r"This review is the subjective opinion.*$", "", s, flags=re.I)
-            s = re.sub(r"\s+", " ", s).strip()
-            return s or None
-
-        text = None
-
-        # 1) 目前版型：div.bgMZj（外層容器）與其內的 span.jguWG / span.yCeTE
-        #    注意：bgMZj 是雜湊 class，改用 [class*='bgMZj'] 做模糊匹配以提高容錯
-        cand_sel = (
-            ":scope div[class*='bgMZj'], "         # 內文容器
-            ":scope div[class*='bgMZj'] span, "    # 容器內的文字節點
-            ":scope span.jguWG, "
-            ":scope span.yCeTE, "
-            ":scope [data-automation='reviewText'], "
-            ":scope [data-test-target='review-text']"
-        )
-
-        # ☆☆☆ 新增：定義「回覆」區塊（各種可能）
-        responses_sel = (
-            ":scope [data-automation*='Response'], "          # e.g. managementResponse / ownerResponse
-            ":scope [data-test-target*='response'], "         # 有些頁面會用 data-test-target
-            ":scope :text('Response from'), "                 # 英文 UI
-            ":scope :text('Management response'), "
-            ":scope :text('Owner response')"
-        )
-        responses = card.locator(responses_sel)
-
-        # ☆☆☆ 新增：把位於回覆區塊內的節點排除
-        cands = card.locator(cand_sel).filter(has_not=responses)
-
-        if cands.count():
-            pieces = []
-            for k in range(min(cands.count(), 30)):
-                try:
-                    node = cands.nth(k)
-                    t = (node.text_content() or "").strip()
-                    t = _clean_review_text(t)
-                    # ☆☆☆ 再加一層保護：明顯回覆語氣就略過
-                    if t and re.match(r"^\s*(dear|親愛|尊敬|您好)\b", t, re.I):
-                        continue
-                    # 既有：略過 "Written ..."
-                    if t and not t.lower().startswith("written "):
-                        pieces.append(t)
-                except:
-                    pass
-            if pieces:
-                text = max(pieces, key=len)
-
-
-        # 2) 萬一上面沒抓到，再用語系/通用區塊兜底
-        if not text:
-            loc = card.locator(":scope span[lang]")
-            t = _clean_review_text((loc.first.text_content() or "") if loc.count() else "")
-            if t:
-                text = t
-
-        if not text:
-            loc = card.locator(":scope p, :scope q, :scope div")
-            t = _clean_review_text((loc.first.text_content() or "") if loc.count() else "")
-            if t:
-                text = t
-
-
-
-        # rating (supports SVG <title> and aria-labelledby)
-        rating = None
-        label = ""
-
-        # A) aria-label directly on any element
-        rate_el = card.locator("[aria-label*='bubbles']").first
-        if rate_el.count():
-            label = (rate_el.get_attribute("aria-label") or "").strip()
-
-        # B) TripAdvisor’s SVG with <title> and/or aria-labelledby
-        if not label:
-            svg = card.locator("svg[data-automation='bubbleRatingImage']").first
-            if svg.count():
-                # try <title> text (NOT inner_text on non-HTMLElement)
-                ttl = svg.locator("title")
-                if ttl.count():
-                    label = (ttl.first.text_content() or "").strip()
-
-                # try aria-labelledby (can contain multiple ids)
-                if not label:
-                    ref = (svg.get_attribute("aria-labelledby") or "").strip()
-                    if ref:
-                        for rid in ref.split():
-                            # look inside card first, then globally as fallback
-                            ref_loc = card.locator(f"#{rid}")
-                            if not ref_loc.count():
-                                ref_loc = page.locator(f"#{rid}")
-                            if ref_loc.count():
-                                label = (ref_loc.first.text_content() or "").strip()
-                                if label:
-                                    break
-
-                # final fallback: aria-label on the svg itself
-                if not label:
-                    label = (svg.get_attribute("aria-label") or "").strip()
-
-        # C) last resort: any svg/span with aria-label
-        if not label:
-            alt = card.locator("svg[aria-label*='bubbles'], span[aria-label*='bubbles']").first
-            if alt.count():
-                label = (alt.get_attribute("aria-label") or "").strip()
-
-        rating = extract_rating(label)
-        # Optional debug:
-        # if rating is None and label: print(f"[DEBUG] Unparsed rating label: {label!r}")
-
-
-        # dates
-        written_date = None; travel_date = None
-        try:
-            wd = card.locator("span:has-text('Written')")
-            if wd.count(): written_date = (wd.first.inner_text() or "").strip()
-        except: pass
-        try:
-            exp = card.locator(":scope :text('Date of experience')")
-            if exp.count():
-                travel_date = (exp.first.inner_text() or "").strip()
-            else:
-                blob = card.inner_text()
-                m = re.search(r"(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4}", blob, re.I)
-                if m: travel_date = m.group(0)
-        except: pass
-
-        # language
-        language = None
-        try:
-            lang_spans = card.locator("span[lang]")
-            if lang_spans.count(): language = lang_spans.first.get_attribute("lang")
-        except: pass
-
-        # author & location
-        author = None
-        location_txt = None
-
-        # ---- author ----
-        try:
-            # 正式 selector（有時存在）
-            name_loc = card.locator("[data-automation='memberName'], a[data-automation='reviewer-name']").first
-            if name_loc.count():
-                author = (name_loc.text_content() or "").strip() or None
-            else:
-                # 最後備援：卡片裡的第一個 link 當名字
-                first_link = card.get_by_role("link").first
-                if first_link.count():
-                    author = (first_link.text_content() or "").strip() or None
-        except Exception:
-            pass
-
-        # ---- location ----
-        try:
-            # 1) 舊版/部分頁面
-            loc_loc = card.locator("[data-automation='reviewerLocation'], span[data-test-target='reviewer-location']").first
-            if loc_loc.count():
-                location_txt = (loc_loc.text_content() or "").strip()
-
-            # 2) 新版：class 含 navcl 的容器
-            if not location_txt:
-                nav = card.locator(":scope div[class*='navcl']").first
-                if nav.count():
-                    # 位置通常是第一個 span；排除「貢獻數」的小徽章（常見 class IugUm）
-                    sp = nav.locator("span:not(.IugUm):not([class*='IugUm'])").first
-                    if not sp.count():
-                        sp = nav.locator("span").first
-                    t = (sp.text_content() or "").strip()
-                    # 濾掉非地點的字樣（保守）
-                    if t and not re.search(r"\b(contribution|review)\b", t, re.I):
-                        location_txt = t
-
-            # 3) 兜底：找像 "City, Country" 這種有逗號的 span
-            if not location_txt:
-                maybe = card.locator(":scope span:has-text(',')").first
-                if maybe.count():
-                    t = (maybe.text_content() or "").strip()
-                    if t and len(t.split()) <= 5:  # 避免抓到整段內文
-                        location_txt = t
-        except Exception:
-            pass
-
-
-        # contribution/helpful
-        contribution_count = None; helpful_votes = None
-        try:
-            contrib = card.locator(":scope span:has-text('contribution')")
-            if contrib.count():
-                m = re.search(r"(\d+)", contrib.first.inner_text() or "")
-                if m: contribution_count = int(m.group(1))
-        except: pass
-        try:
-            helpful = card.locator(":scope span:has-text('helpful')")
-            if helpful.count():
-                m = re.search(r"(\d+)", helpful.first.inner_text() or "")
-                if m: helpful_votes = int(m.group(1))
-        except: pass
-
-        out.append({
-            "title": title, "text": text, "rating": rating,
-            "travel_date": travel_date, "written_date": written_date,
-            "language": language, "author": author, "location": location_txt,
-            "contribution_count": contribution_count, "helpful_votes": helpful_votes,
-            "url": target
-        })
+    # 支援 reviewText 作為卡片選擇器（ATT_CARDS_SEL）
+    out = parse_page(page, target, mode=mode, profile="food", cards_sel=ATT_CARDS_SEL, expand=expand, page=page_idx)
+    print(f"[INFO] Found {len(out)} review cards on page {page_idx}")
     return out
 
 def first_card_key(page) -> str | None:
@@ -558,8 +265,7 @@ def click_next_page(page) -> bool:
         if not loc.count():
             continue
         try:
-            loc.scroll_into_view_if_needed()
-            page.wait_for_timeout(120)
+            loc.scroll_into_view_if_needed()     # 本身就會等元素位置穩定；之後換頁由 wait_cards_changed 等
         except Exception:
             pass
 
@@ -577,7 +283,7 @@ def click_next_page(page) -> bool:
             except Exception:
                 loc.click(timeout=2500, force=True)
 
-            page.wait_for_timeout(600)
+            wait_cards_changed(page, before_key, timeout_ms=6000)
             if looks_like_verification(page):
                 print("\n[ACTION] 翻頁後遇到驗證，請完成驗證再按 Enter。")
                 input(">> 按 Enter 繼續… ")
@@ -587,7 +293,7 @@ def click_next_page(page) -> bool:
                 href = (loc.get_attribute("href") or "").strip()
                 if href:
                     page.goto(urljoin(before_url, href), wait_until="domcontentloaded")
-                    page.wait_for_timeout(500)
+                    wait_cards(page, timeout_ms=6000)
 
             # 檢查內容是否真的改變
             after_key = first_card_key(page)
@@ -600,7 +306,144 @@ def click_next_page(page) -> bool:
 
     return False
 
-def run_same_context(target: str, max_pages: int, timeout_ms: int, debug_dir: Optional[Path], out_json: Optional[Path], out_csv: Optional[Path], page):
+# TA_PARSE_MODE=net|eval|html|locator（見 parse_current_page）
+PARSE_MODE = os.environ.get("TA_PARSE_MODE", "eval")
+
+
+def _wait_and_parse(page, debug_dir: Optional[Path], page_index: int, target: str) -> List[Dict[str, Any]]:
+    print(f"[INFO] parsing page {page_index} | url={page.url}")
+    with timings.span("parse", page=page_index):
+        with timings.span("wait_cards", page=page_index):
+            try:
+                page.wait_for_selector("div[data-test-target='review-card'], [data-automation='reviewCard'], div[data-test-target='review-text'], [data-automation='reviewText']", timeout=8000)
+            except PWTimeoutError:
+                print("[WARN] reviewCard not found yet; try scroll more")
+                human_scroll(page, steps=3)
+        return parse_current_page(page, debug_dir, page_index, target, mode=PARSE_MODE)
+
+
+def _check_verification(page):
+    if looks_like_verification(page):
+        print("\n[ACTION] 翻頁後遇到驗證，請完成驗證再按 Enter。")
+        input(">> 按 Enter 繼續… ")
+
+
+def _goto_review_page(page, url: str, limiter: Optional[HostRateLimiter] = None):
+    with timings.span("pagination", page_url=url):
+        if limiter:
+            limiter.wait_sync(url)
+        page.goto(url, wait_until="domcontentloaded")
+    _check_verification(page)
+
+
+def iter_review_pages(page, target: str, max_pages: int, debug_dir: Optional[Path], paginate: str = "url",
+                      tabs: int = 1, limiter: Optional[HostRateLimiter] = None, start: int = 1,
+                      seen: Optional[List[str]] = None,
+                      on_page_done: Optional[Callable[[int, Optional[str], int], None]] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    逐頁 yield 解析結果並翻頁；同一時間只持有一頁的評論。
+    paginate="url"：直接組 -Reviews-orN- 的網址 goto（預設）；"click"：點 Next（URL 不含 offset 時也會退回這個）。
+    tabs>1（url 模式）：第 2 頁起分給 tabs 個分頁同時載入，依頁序 yield；limiter 控制同 host 的請求間隔。
+    start / seen：從第 start 頁續爬，seen 是已爬過頁的第一張卡 key（見 checkpoint.py）。
+    on_page_done(page_index, first_key, rows)：下游把該頁處理完（寫出）之後才呼叫，拿來記 checkpoint。
+    """
+    if on_page_done is None:
+        yield from _iter_review_pages(page, target, max_pages, debug_dir, paginate, tabs, limiter, start, seen, None)
+        return
+    last: Dict[str, Any] = {}
+    for batch in _iter_review_pages(page, target, max_pages, debug_dir, paginate, tabs, limiter, start, seen, last):
+        yield batch
+        # 回到這裡時下游已經處理完這一頁
+        on_page_done(last["page"], last["key"], len(batch))
+
+
+def _iter_review_pages(page, target, max_pages, debug_dir, paginate, tabs, limiter, start, seen, last):
+    def parse(pg, i: int) -> List[Dict[str, Any]]:
+        if last is not None:
+            last["page"], last["key"] = i, first_card_key(pg)
+        return _wait_and_parse(pg, debug_dir, i, target)
+
+    base = page.url if supports_offset(page.url) else target
+    if paginate == "url" and supports_offset(base) and tabs > 1:
+        yield from iter_fanout_pages(
+            page, base, max_pages, REVIEWS_PER_PAGE["food"], tabs,
+            parse_page=parse,
+            first_key=first_card_key,
+            total_reviews=total_review_count(page),
+            wait_turn=limiter.wait_sync if limiter else None,
+            after_load=_check_verification,
+            is_last=no_more_next,
+            start=start,
+            seen=seen,
+        )
+        return
+    if paginate == "url" and supports_offset(base):
+        yield from iter_offset_pages(
+            page, base, max_pages, REVIEWS_PER_PAGE["food"],
+            parse_page=parse,
+            first_key=first_card_key,
+            goto=lambda pg, u: _goto_review_page(pg, u, limiter),
+            is_last=no_more_next,
+            start=start,
+            seen=seen,
+        )
+        return
+
+    page_index = 1
+    if start > 1 and supports_offset(base):
+        page_index = start
+        _goto_review_page(page, page_url(base, start, REVIEWS_PER_PAGE["food"]), limiter)
+    elif start > 1:
+        print(f"[WARN] cannot jump to page {start} without an offset URL; restart from page 1")
+    visited = set()
+    same_count = 0    # 連續沒變化次數
+
+    while page_index <= max_pages:
+        visited.add(page.url)
+        yield parse(page, page_index)
+
+        # —— 停止條件 1：UI 已看不到下一頁
+        if no_more_next(page):
+            print("[INFO] No more next page (disabled / hidden). Stop.")
+            break
+
+        # —— 嘗試翻頁
+        before_key = first_card_key(page)
+        with timings.span("pagination", page=page_index + 1):
+            if limiter:
+                limiter.wait_sync(page.url)
+            moved = click_next_page(page)
+
+        if not moved:
+            print("[INFO] Next click not effective, stop.")
+            break
+
+        # —— 停止條件 2：內容沒有變化（保守：連續兩次）
+        after_key = first_card_key(page)
+        if before_key and after_key == before_key:
+            same_count += 1
+        else:
+            same_count = 0
+        if same_count >= 2:
+            print("[INFO] Page content not changing across next attempts. Stop.")
+            break
+
+        # 也可避免 URL 迴圈
+        if page.url in visited:
+            print("[INFO] URL repeated. Stop.")
+            break
+
+        page_index += 1
+
+
+def run_same_context(target: str, max_pages: int, timeout_ms: int, debug_dir: Optional[Path], out_json: Optional[Path], out_csv: Optional[Path], page, sinks: Optional[List[Sink]] = None, store: Optional[ReviewStore] = None, incremental: bool = False, paginate: str = "url", tabs: int = 1, limiter: Optional[HostRateLimiter] = None, checkpoint: Optional[PageCheckpoint] = None) -> int:
+    """
+    爬一個景點，逐頁寫進 sinks（以及 out_json / out_csv，若有給），回傳寫出的評論數。
+    有給 store 時只寫出庫裡沒有的評論，並在整頁都是已知評論時停止翻頁。
+    incremental=True（需要 store）：整頁都比上次的 high-water mark 舊就停止。
+    paginate / tabs / limiter：見 iter_review_pages。
+    checkpoint：每寫完一頁記一筆；上次中途掛掉的景點從下一頁接著爬，正常爬完才標記完成。
+    """
     # with sync_playwright() as p:
     #     # 1) 開 headed 讓你手動過驗證
     #     browser = p.chromium.launch(headless=False, args=[
@@ -621,125 +464,108 @@ def run_same_context(target: str, max_pages: int, timeout_ms: int, debug_dir: Op
     #     page = ctx.new_page()
     #     page.set_default_timeout(timeout_ms)
 
-        print(f"[INFO] goto: {target}")
-        #page.goto(target, wait_until="domcontentloaded")
+    print(f"[INFO] goto: {target}")
+    #page.goto(target, wait_until="domcontentloaded")
+    if PARSE_MODE == "net":
+        capture_for(page)
+    with timings.span("goto"):
+        if limiter:
+            limiter.wait_sync(target)
         page.goto(target, wait_until="load", timeout=60000)
-        rsleep()
 
-        # 自動點 cookie
+    # 自動點 cookie
+    with timings.span("consent"):
         try:
             btn = page.get_by_role("button", name=re.compile(r"(Accept|Agree|I agree|OK)", re.I))
             if btn.count() and btn.first.is_visible():
-                btn.first.click(); rsleep()
+                btn.first.click(); wait_dom_quiet(page, quiet_ms=150, timeout_ms=1500)
         except: pass
 
-        # 若是驗證頁，請在視窗中手動完成
-        if looks_like_verification(page):
-            print("\n[ACTION] 視窗顯示驗證頁，請手動完成驗證。完成後請回到這個終端機按 Enter 繼續。")
-            input(">> 按 Enter 繼續… ")
+    # 若是驗證頁，請在視窗中手動完成
+    if looks_like_verification(page):
+        print("\n[ACTION] 視窗顯示驗證頁，請手動完成驗證。完成後請回到這個終端機按 Enter 繼續。")
+        input(">> 按 Enter 繼續… ")
 
-        # 確認在 Reviews 列表
+    # 確認在 Reviews 列表
+    with timings.span("ensure_on_reviews"):
         ensure_on_reviews(page)
 
-        # 防止 Lazyload：先滾幾次
+    # 防止 Lazyload：先滾幾次
+    with timings.span("scroll"):
         for _ in range(5):
             human_scroll(page, steps=2)
 
-        # 取得景點名稱
-        attraction = None
-        try:
-            h1 = page.locator("h1[data-test-target='mainH1']")
-            if h1.count():
-                main_span = h1.first.locator("span").first
-                if main_span.count():
-                    attraction = (main_span.text_content() or "").strip()
-                else:
-                    raw = h1.first.inner_text() or ""
-                    attraction = raw.split("Unclaimed")[0].strip()
+    # 取得景點名稱
+    attraction = None
+    try:
+        h1 = page.locator("h1[data-test-target='mainH1']")
+        if h1.count():
+            main_span = h1.first.locator("span").first
+            if main_span.count():
+                attraction = (main_span.text_content() or "").strip()
             else:
-                h1 = page.locator("h1")
-                if h1.count():
-                    raw = h1.first.inner_text() or ""
-                    attraction = raw.split("Unclaimed")[0].strip()
-        except Exception as e:
-            print(f"[WARN] 景點名稱擷取失敗: {e}")
-        if not attraction:
-            attraction = "(unknown)"
-
-        # 2) 同一個 page 直接開始爬
-        all_reviews: List[Dict[str, Any]] = []
-        page_index = 1
-        visited = set()
-        same_count = 0    # 連續沒變化次數
-
-        while page_index <= max_pages:
-            print(f"[INFO] parsing page {page_index} | url={page.url}")
-            visited.add(page.url)
-
-            try:
-                page.wait_for_selector("div[data-test-target='review-card'], [data-automation='reviewCard'], div[data-test-target='review-text'], [data-automation='reviewText']", timeout=8000)
-            except PWTimeoutError:
-                print("[WARN] reviewCard not found yet; try scroll more")
-                human_scroll(page, steps=3)
-
-            reviews = parse_current_page(page, debug_dir, page_index, target)
-            # 將景點名稱加到每筆 review
-            for r in reviews:
-                r["attraction"] = attraction
-            all_reviews.extend(reviews)
-
-            # —— 停止條件 1：UI 已看不到下一頁
-            if no_more_next(page):
-                print("[INFO] No more next page (disabled / hidden). Stop.")
-                break
-
-            # —— 嘗試翻頁
-            before_key = first_card_key(page)
-            moved = click_next_page(page)
-
-            if not moved:
-                print("[INFO] Next click not effective, stop.")
-                break
+                raw = h1.first.inner_text() or ""
+                attraction = raw.split("Unclaimed")[0].strip()
+        else:
+            h1 = page.locator("h1")
+            if h1.count():
+                raw = h1.first.inner_text() or ""
+                attraction = raw.split("Unclaimed")[0].strip()
+    except Exception as e:
+        print(f"[WARN] 景點名稱擷取失敗: {e}")
+    if not attraction:
+        attraction = "(unknown)"
+
+    # 2) 同一個 page 直接開始爬：parse -> 加 attraction -> 去重 -> sink（每頁 flush）
+    owned = []
+    if out_json:
+        owned.append(JsonArraySink(out_json))
+    if out_csv:
+        owned.append(CsvSink(out_csv, append=False))
+    all_sinks = list(sinks or []) + owned
+
+    start, seen, on_page_done = 1, None, None
+    if checkpoint is not None:
+        resumed = checkpoint.resume(target)
+        if resumed:
+            start, seen = resumed["page"] + 1, [resumed.get("key")]
+            print(f"[INFO] resume from checkpoint: page {start} (offset {resumed.get('offset')})")
+
+        def record(i: int, key: Optional[str], rows: int):
+            checkpoint.page_done(target, attraction, i, (i - 1) * REVIEWS_PER_PAGE["food"], key, rows)
+        on_page_done = record
+
+    pages = iter_review_pages(page, target, max_pages, debug_dir, paginate=paginate, tabs=tabs, limiter=limiter,
+                              start=start, seen=seen, on_page_done=on_page_done)
+    pipeline = dedupe_reviews(with_attraction(pages, attraction))
+    hwm = None
+    if store is not None:
+        if incremental:
+            hwm = HighWaterMark(store, target)
+            pipeline = until_watermark(pipeline, store, target, hwm=hwm)
+        pipeline = skip_known(pipeline, store)
+        all_sinks.append(store)
+    total = 0
+    try:
+        for batch in pipeline:
+            with timings.span("write", rows=len(batch)):
+                write_all(all_sinks, batch)
+            total += len(batch)
+    finally:
+        for s in owned:
+            s.close()
+    # 放在 pipeline 外面 commit：skip_known 提早停止時 until_watermark 不會跑到最後
+    if hwm is not None:
+        hwm.commit()
+    if checkpoint is not None:
+        checkpoint.url_done(target)
+
+    if out_json:
+        print(f"[DONE] Saved JSON: {out_json} ({total} rows)")
+    if out_csv:
+        print(f"[DONE] Saved CSV:  {out_csv} ({total} rows)")
+    return total
 
-            # —— 停止條件 2：內容沒有變化（保守：連續兩次）
-            after_key = first_card_key(page)
-            if before_key and after_key == before_key:
-                same_count += 1
-            else:
-                same_count = 0
-            if same_count >= 2:
-                print("[INFO] Page content not changing across next attempts. Stop.")
-                break
-
-            # 也可避免 URL 迴圈
-            if page.url in visited:
-                print("[INFO] URL repeated. Stop.")
-                break
-
-            page_index += 1
-
-        # 輸出
-        if out_json:
-            out_json.parent.mkdir(parents=True, exist_ok=True)
-            # attraction 欄位放第一
-            def move_attraction_first(d):
-                if "attraction" in d:
-                    keys = ["attraction"] + [k for k in d if k != "attraction"]
-                    return {k: d.get(k) for k in keys}
-                return d
-            out_json.write_text(json.dumps([move_attraction_first(r) for r in all_reviews], ensure_ascii=False, indent=2), encoding="utf-8")
-            print(f"[DONE] Saved JSON: {out_json} ({len(all_reviews)} rows)")
-        if out_csv:
-            out_csv.parent.mkdir(parents=True, exist_ok=True)
-            with out_csv.open("w", newline="", encoding="utf-8") as f:
-                fieldnames = ["attraction"] + [k for k in all_reviews[0].keys() if k != "attraction"] if all_reviews else ["attraction","title","text","rating","travel_date","written_date","language","author","location","contribution_count","helpful_votes","url"]
-                w = csv.DictWriter(f, fieldnames=fieldnames)
-                w.writeheader()
-                for r in all_reviews: w.writerow(r)
-            print(f"[DONE] Saved CSV:  {out_csv} ({len(all_reviews)} rows)")
-
-        
-        return all_reviews
 
 def cli():
     import json
@@ -772,36 +598,43 @@ def cli():
             for line in pf:
                 processed.add(line.strip())
 
-    # 檢查 CSV 是否存在
-    csv_exists = out_csv.exists()
-    if not csv_exists:
-        # 新建空白 CSV
-        with out_csv.open("w", newline="", encoding="utf-8") as f:
-            fieldnames = ["attraction","title","text","rating","travel_date","written_date","language","author","location","contribution_count","helpful_votes","url"]
-            w = csv.DictWriter(f, fieldnames=fieldnames)
-            w.writeheader()
+    # CSV 不存在時會自動建立並寫 header；每頁解析完就追加 + flush
+    csv_sink = CsvSink(out_csv, append=True)
+    sinks: List[Sink] = [csv_sink]
+    # TA_PARQUET_DIR=reviews_food.parquet：另外寫一份 Parquet dataset（每個景點一個檔，需要 pyarrow）
+    parquet_dir = os.environ.get("TA_PARQUET_DIR")
+    if parquet_dir:
+        sinks.append(ParquetSink(Path(parquet_dir).resolve()))
+        print(f"[INFO] parquet_dir={Path(parquet_dir).resolve()}")
+    # TA_REVIEW_DB=reviews.db：跨次執行的評論去重（SQLite），重爬時只追加新評論
+    review_db = os.environ.get("TA_REVIEW_DB")
+    store = ReviewStore(Path(review_db).resolve()) if review_db else None
+    if store is not None:
+        print(f"[INFO] review_db={store.path} ({store.count()} reviews known)")
+    # TA_INCREMENTAL=1：每個景點只爬到上次看過的最新評論為止（需要 TA_REVIEW_DB）
+    incremental = store is not None and os.environ.get("TA_INCREMENTAL", "0") in ("1", "true", "yes")
+    if incremental:
+        print("[INFO] incremental mode: stop at the high-water mark of each attraction")
+    # TA_PAGINATE=click：改回點「Next」翻頁（預設直接組 -Reviews-orN- 網址）
+    paginate = os.environ.get("TA_PAGINATE", "url")
+    # TA_TABS=4：單一景點的頁分給 4 個分頁同時載入；TA_HOST_INTERVAL 是同 host 兩次導航的最小間隔（秒）
+    tabs = max(1, int(os.environ.get("TA_TABS", "1")))
+    # TA_CHECKPOINT：頁層級的續爬紀錄（預設 checkpoint_food.jsonl，設成 0 關閉）
+    checkpoint = checkpoint_from_env("food")
+    if checkpoint is not None:
+        print(f"[INFO] checkpoint={checkpoint.path} ({len(checkpoint.pending())} unfinished)")
+    limiter = HostRateLimiter(float(os.environ.get("TA_HOST_INTERVAL", "1.0")), jitter=0.5)
+    if tabs > 1:
+        print(f"[INFO] fan-out: {tabs} tabs per attraction, >= {limiter.min_interval}s between requests per host")
 
     with sync_playwright() as p:
         # 1) 開 headed 讓你手動過驗證
         browser = p.chromium.launch(headless=False, args=[
             "--disable-blink-features=AutomationControlled"
         ])
-        ctx = browser.new_context(
-            user_agent=UA,
-            locale="en-US",
-            viewport={"width": 1366, "height": 900},
-            extra_http_headers={"Accept-Language": "en-US,en;q=0.9"},
-        )
-        # block Braze/Appboy
-        # ctx.route("**/*appboy*/*", lambda r: r.abort())
-        # ctx.route("**/*braze*/*",   lambda r: r.abort())
-        # ctx.route("**/js.appboycdn.com/*", lambda r: r.abort())
-        ctx.add_init_script("""
-            Object.defineProperty(navigator, 'webdriver', { get: () => undefined });
-            window.chrome = { runtime: {} };
-            Object.defineProperty(navigator, 'plugins', { get: () => [1,2,3,4,5] });
-            Object.defineProperty(navigator, 'languages', { get: () => ['en-US','en'] });
-        """)
+        # 擋圖片/字型/媒體與追蹤（含 Braze/Appboy），TA_BLOCK_* 可調
+        block = policy_from_env()
+        ctx = new_context(browser, block=block)
         page = ctx.new_page()
         timeout_ms = 15000
         page.set_default_timeout(timeout_ms)
@@ -809,32 +642,47 @@ def cli():
         for rel_path in urls:
             full_url = base_url + rel_path
             
-            if full_url in processed or "#REVIEWS" in full_url:
+            # 增量模式每週重爬，已處理過的景點也要再跑（只會抓到 mark 為止）
+            if (full_url in processed and not incremental) or "#REVIEWS" in full_url:
                 print(f"[SKIP] 已處理過: {full_url}")
                 continue
             print(f"[INFO] 處理 URL: {full_url}")
             
-            reviews = run_same_context(
-                target=full_url,
-                max_pages=300,
-                timeout_ms=15000,
-                debug_dir=debug_dir,
-                out_json=None,  # 不每次都寫 json
-                out_csv=None,   # 不每次都寫 csv
-                page=page
-            )
-            # 追加到 CSV
-            if reviews:
-                with out_csv.open("a", newline="", encoding="utf-8") as f:
-                    fieldnames = ["attraction"] + [k for k in reviews[0].keys() if k != "attraction"]
-                    w = csv.DictWriter(f, fieldnames=fieldnames)
-                    for r in reviews:
-                        w.writerow(r)
+            # 每個階段的耗時記成 span（TA_TIMING_FILE 設定時寫成 JSON lines），結束時印百分位數
+            with timings.scope(url=full_url):
+                n = run_same_context(
+                    target=full_url,
+                    max_pages=300,
+                    timeout_ms=15000,
+                    debug_dir=debug_dir,
+                    out_json=None,  # 不每次都寫 json
+                    out_csv=None,   # 不每次都寫 csv
+                    page=page,
+                    sinks=sinks,
+                    store=store,
+                    incremental=incremental,
+                    paginate=paginate,
+                    tabs=tabs,
+                    limiter=limiter,
+                    checkpoint=checkpoint,
+                )
+            print(f"[INFO] {n} reviews appended for {full_url}")
             # 記錄已處理 URL
-            with open(processed_path, "a", encoding="utf-8") as pf:
-                pf.write(full_url + "\n")
+            if full_url not in processed:
+                with open(processed_path, "a", encoding="utf-8") as pf:
+                    pf.write(full_url + "\n")
             
         browser.close()
+    for s in sinks:
+        s.close()
+    if checkpoint is not None:
+        checkpoint.close()
+    if store is not None:
+        print(f"[INFO] review_db: {store.rows} new, {store.updated} already known")
+        store.close()
+    print(f"[INFO] resource blocking: {block.summary()}")
+    timings.print_summary()
+    timings.close()
     print(f"[DONE] 所有 URL 處理完畢。結果已追加到 {out_csv}")
 
 